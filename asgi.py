@@ -0,0 +1,4 @@
+from youreka.asyncapi import create_asgi_app
+
+# Async read API: uvicorn asgi:app --workers 2
+app = create_asgi_app("ProdConfig")
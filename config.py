@@ -20,8 +20,142 @@ class BaseConfig:
     # Email reminder settings (stub)
     REMINDER_DAYS = 7  # look ahead this many days for reminders
 
+    # Scraping: polite crawl scheduler (per-host limits)
+    SCRAPER_USER_AGENT = os.environ.get(
+        "SCRAPER_USER_AGENT", "YourekaGrantPortalBot/1.0 (+https://youreka.ca)"
+    )
+    CRAWL_RATE_PER_SECOND = 0.5  # sustained requests per second per host
+    CRAWL_BURST = 2              # short burst allowance per host
+    CRAWL_TIMEOUT = 20
+    CRAWL_ROBOTS_TTL = 6 * 3600  # seconds to cache robots.txt
+    CRAWL_MAX_RETRIES = 3        # retries on 429 / 503
+    CRAWL_MAX_BACKOFF = 300      # cap for Retry-After / exponential backoff
+    SCRAPE_REFRESH_HOURS = 7 * 24  # re-fetch known program pages older than this
+
+    # Source link health check (`flask check-links`)
+    LINKCHECK_CONCURRENCY = 20      # links in flight overall
+    LINKCHECK_PER_HOST = 2          # connections per host
+    LINKCHECK_TIMEOUT = 15          # seconds per link, redirects included
+    LINKCHECK_MAX_AGE_HOURS = 7 * 24
+    LINKCHECK_RETRY_HOURS = 24      # failing links are re-checked sooner
+
+    # Regions/organizations are cached per process; this often each checks
+    # the write counter in reference_versions
+    REFERENCE_CHECK_SECONDS = 5
+
+    # /api/suggest: in-memory typeahead index, synced from the change log
+    SUGGEST_SYNC_SECONDS = 30
+
+    # Hot/cold split (`flask archive-grants`, daily after expire-grants)
+    ARCHIVE_AFTER_DAYS = 30      # archive grants this long past their deadline
+    ARCHIVE_SEARCH_LIMIT = 200   # archived matches shown with ?archived=1
+
+    # Admission control (youreka/ratelimit.py): per-client token buckets by
+    # endpoint class, and a cap on concurrent expensive requests per process
+    ADMISSION_ENABLED = True
+    RATE_LIMITS = {                  # class -> (requests per minute, burst)
+        "list": (30, 10),
+        "detail": (120, 30),
+        "write": (20, 5),            # POSTs: region status, saved searches
+        "api": (120, 30),            # /api and calendar feeds
+    }
+    RATE_LIMIT_EXEMPT = []           # client IPs never rate limited (monitoring)
+    RATE_LIMIT_TRUSTED_PROXIES = int(os.environ.get("RATE_LIMIT_TRUSTED_PROXIES", "0"))  # 1 behind Render / nginx
+    RATE_LIMIT_MAX_CLIENTS = 50000   # in-process buckets kept
+    RATE_LIMIT_STORAGE = os.environ.get("RATE_LIMIT_STORAGE")  # e.g. "sqlite:////tmp/youreka-ratelimit.db"
+    EXPENSIVE_ENDPOINTS = ["grants.index", "grants.pipeline"]
+    EXPENSIVE_CONCURRENCY = 4        # at once per process
+    EXPENSIVE_QUEUE_SECONDS = 0.5    # wait for a slot before answering 503
+
+    # Scrape run metrics: one JSON line per run (also stored in scrape_runs)
+    SCRAPE_RUN_LOG = os.environ.get(
+        "SCRAPE_RUN_LOG", os.path.join(BASE_DIR, "logs", "scrape_runs.jsonl")
+    )
+
+    # Instrumentation (opt-in): request timing, SQL counts, /metrics
+    INSTRUMENTATION_ENABLED = os.environ.get("INSTRUMENTATION_ENABLED", "0") == "1"
+    SLOW_QUERY_MS = 100
+    PROFILE_ENDPOINTS = []       # e.g. ["grants.index", "grants.grant_detail"]
+    PROFILE_SAMPLE_RATE = 0.1    # fraction of matching requests to profile
+    PROFILE_DIR = os.path.join(BASE_DIR, "logs", "profiles")
+
     # Session
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
+    # Don't re-send the session cookie on every request (keeps pages cacheable)
+    SESSION_REFRESH_EACH_REQUEST = False
+
+    # Shared (proxy/CDN) cache lifetime for public pages, in seconds
+    PUBLIC_CACHE_MAX_AGE = 120
+
+    # Static snapshot (`flask build-static`): grant pages and these list
+    # presets, per language, for nginx / a CDN to serve
+    STATIC_SITE_DIR = os.environ.get("STATIC_SITE_DIR", os.path.join(BASE_DIR, "static_site"))
+    STATIC_PRESETS = [
+        "province=ON", "province=BC", "province=QC", "province=AB",
+        "ngo_only=true", "language=FR", "language=Bilingual",
+    ]
+
+    # Offline catalogue: the list page keeps /api/catalogue in the browser,
+    # syncs it from the change log and filters it there (youreka/offline.py)
+    OFFLINE_CATALOGUE_ENABLED = True
+
+    # Async read API (youreka/asyncapi.py, `uvicorn asgi:app`) for many
+    # concurrent API clients; pool is per uvicorn worker
+    ASYNC_API_PREFIX = "/api/v2"
+    ASYNC_API_POOL_SIZE = int(os.environ.get("ASYNC_API_POOL_SIZE", "20"))
+    ASYNC_API_MAX_OVERFLOW = int(os.environ.get("ASYNC_API_MAX_OVERFLOW", "20"))
+    ASYNC_API_POOL_TIMEOUT = 10      # seconds to wait for a pooled connection
+    ASYNC_API_PAGE_SIZE = 100
+    ASYNC_API_MAX_PAGE_SIZE = 500
+
+    # Stream the grant list (header first, cards from a server-side cursor)
+    STREAM_LIST_PAGE = True
+
+    # Near-duplicate detection (MinHash/LSH) across scraped and imported grants
+    DEDUP_ENABLED = True
+    DEDUP_THRESHOLD = 0.75       # minimum Jaccard similarity of name/description shingles
+    DEDUP_COLLAPSE_LIST = True   # list page shows one grant per cluster
+
+    # Region recommendations (youreka/recommendations.py)
+    RECOMMENDATIONS_ENABLED = True
+    RECOMMENDATIONS_PER_REGION = 20
+    RECOMMENDATIONS_BUFFER = 20     # extra stored per region for incremental refresh
+    RECOMMENDATION_WEIGHTS = None   # e.g. {"category": 2.0}; see DEFAULT_WEIGHTS
+
+    # Saved searches: new matching grants are queued at ingest and mailed
+    # in digests by `flask send-search-notifications`
+    SAVED_SEARCHES_ENABLED = True
+    SEARCH_DIGEST_BATCH_SIZE = 500
+    PORTAL_BASE_URL = os.environ.get("PORTAL_BASE_URL", "http://localhost:5000")  # for links in emails
+
+    # Region status history (grant_status_events, `flask snapshot-statuses`)
+    STATUS_HISTORY_ENABLED = True
+
+    # Change log and sync API (/api/changes, /api/changes/stream)
+    CHANGE_LOG_ENABLED = True
+    CHANGES_PAGE_SIZE = 500
+    CHANGES_SETTLE_SECONDS = 2          # hold back events this young (late commits)
+    CHANGES_RETENTION_DAYS = 90         # older events are pruned by `flask expire-grants`
+    CHANGES_EXPIRE_LOOKBACK_DAYS = 30
+    # /api/changes/stream holds a worker per client: only turn it on with
+    # threaded or gevent gunicorn workers (e.g. --worker-class gthread --threads 32)
+    CHANGES_STREAM_ENABLED = os.environ.get("CHANGES_STREAM_ENABLED", "0") == "1"
+    CHANGES_STREAM_POLL_SECONDS = 2
+    CHANGES_STREAM_HEARTBEAT_SECONDS = 15
+    CHANGES_STREAM_MAX_SECONDS = 300    # SSE clients reconnect with Last-Event-ID
+
+    # Deadline calendar API and iCalendar feeds
+    CALENDAR_PAST_DAYS = 30         # feeds keep recently passed deadlines
+    CALENDAR_DEFAULT_DAYS = 90      # /calendar/deadlines.json range without ?end=
+    CALENDAR_MAX_DAYS = 366
+    CALENDAR_API_LIMIT = 1000
+    CALENDAR_EVENT_CACHE_SIZE = 10000  # rendered VEVENTs kept per process
+    CALENDAR_FEED_CACHE_SIZE = 64      # whole feeds kept per process, by ETag
+
+    # On-the-fly gzip / brotli for HTML and JSON responses
+    COMPRESSION_ENABLED = True
+    COMPRESSION_MIN_SIZE = 500  # bytes; smaller bodies are sent as-is
+    COMPRESSION_LEVEL = 6
 
 
 # Local development: use SQLite file
@@ -40,3 +174,7 @@ class ProdConfig(BaseConfig):
     SQLALCHEMY_DATABASE_URI = db_url or (
         "sqlite:///" + os.path.join(BASE_DIR, "grants.db")
     )
+
+    # Render's proxy adds one X-Forwarded-For hop; without it every visitor
+    # would share the proxy's rate-limit buckets
+    RATE_LIMIT_TRUSTED_PROXIES = int(os.environ.get("RATE_LIMIT_TRUSTED_PROXIES", "1"))
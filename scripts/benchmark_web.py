@@ -0,0 +1,240 @@
+"""
+Load-testing benchmark for the web tier.
+
+Builds a synthetic catalogue (one SQLite database per size), then drives the
+list page with representative filter combinations, detail GETs and status
+POSTs, and reports p50/p95/p99 latency and requests/sec per scenario.
+
+Usage:
+    python -m scripts.benchmark_web --sizes 1000,10000 --requests 200
+    python -m scripts.benchmark_web --sizes 100000 --json bench/100k.json
+
+By default requests go through the Flask test client (in-process, no network).
+To measure a real server, build the catalogue, start gunicorn against it and
+pass --base-url:
+    python -m scripts.benchmark_web --sizes 10000 --keep --workdir /tmp/bench
+    DATABASE_URL=sqlite:////tmp/bench/bench-10000.db gunicorn app:app -w 4 &
+    python -m scripts.benchmark_web --sizes 10000 --workdir /tmp/bench \\
+        --reuse --base-url http://127.0.0.1:8000
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import config as app_config
+from flask import url_for
+from youreka import create_app
+from youreka.models import Grant, Region
+from youreka.synthetic import generate_catalogue
+
+STATUSES = ["Not Started", "In Progress", "Submitted", "Rejected", "Awarded"]
+
+
+# ---------------------------------------------------------
+# Synthetic catalogue
+# ---------------------------------------------------------
+def build_catalogue(n_grants, seed=42):
+    """Top up the current database to ``n_grants`` grants with synthetic rows."""
+    missing = n_grants - Grant.query.count()
+    if missing > 0:
+        # Derived data (dedup, recommendations) isn't what this measures
+        generate_catalogue(missing, seed=seed, finalize=False)
+
+
+# ---------------------------------------------------------
+# Scenarios
+# ---------------------------------------------------------
+def build_requests(app, n_requests, seed):
+    """Return a list of (scenario, method, path, form) tuples."""
+    rng = random.Random(seed)
+    with app.app_context():
+        grant_ids = [g.id for g in Grant.query.with_entities(Grant.id)]
+        region_ids = [r.id for r in Region.query.with_entities(Region.id)]
+    cutoff = (date.today() + timedelta(days=60)).isoformat()
+
+    list_filters = [
+        ("list_all", {}),
+        ("list_province", {"province": "ON"}),
+        ("list_province_partial", {"province": "Brit"}),
+        ("list_category", {"category": "Education"}),
+        ("list_amount", {"min_amount": 5000, "max_amount": 50000}),
+        ("list_region", {"region_id": region_ids[0]}),
+        ("list_combo", {"language": "FR", "team_scope": "Regional", "ngo_only": "true"}),
+        ("list_deadline", {"deadline_before": cutoff}),
+    ]
+
+    plan = []
+    with app.test_request_context():
+        for name, params in list_filters:
+            path = url_for("grants.index", **params)
+            plan.extend((name, "GET", path, None) for _ in range(max(1, n_requests // 10)))
+
+        for _ in range(n_requests):
+            grant_id = rng.choice(grant_ids)
+            region_id = rng.choice(region_ids)
+            path = url_for("grants.grant_detail", grant_id=grant_id, region_id=region_id)
+            plan.append(("detail", "GET", path, None))
+
+        for _ in range(max(1, n_requests // 4)):
+            grant_id = rng.choice(grant_ids)
+            region_id = rng.choice(region_ids)
+            path = url_for("grants.grant_detail", grant_id=grant_id)
+            form = {"region_id": region_id, "status": rng.choice(STATUSES), "notes": "benchmark"}
+            plan.append(("status_post", "POST", path, form))
+    return plan
+
+
+def run_plan(app, plan, concurrency, base_url=None):
+    """Execute the plan and return {scenario: [latency_seconds, ...]} plus wall time."""
+    if base_url:
+        import requests
+
+        session = requests.Session()
+
+        def do(item):
+            name, method, path, form = item
+            started = time.perf_counter()
+            resp = session.request(method, base_url.rstrip("/") + path, data=form, allow_redirects=False)
+            resp.content
+            return name, time.perf_counter() - started, resp.status_code
+    else:
+        def do(item):
+            name, method, path, form = item
+            client = app.test_client()
+            started = time.perf_counter()
+            resp = client.open(path, method=method, data=form)
+            resp.get_data()
+            return name, time.perf_counter() - started, resp.status_code
+
+    results = {}
+    failures = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for name, elapsed, status in pool.map(do, plan):
+            results.setdefault(name, []).append(elapsed)
+            if status >= 400:
+                failures += 1
+    return results, time.perf_counter() - started, failures
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(results):
+    summary = {}
+    for name, values in results.items():
+        total = sum(values)
+        summary[name] = {
+            "requests": len(values),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+            "mean_ms": round(statistics.mean(values) * 1000, 2),
+            # Serial throughput of this scenario alone
+            "rps": round(len(values) / total, 1) if total else None,
+        }
+    return summary
+
+
+def make_app(db_uri):
+    # create_app() looks config classes up by name on the config module
+    app_config.BenchConfig = type(
+        "BenchConfig",
+        (app_config.BaseConfig,),
+        # Measure the app, not the per-client rate limits
+        {"SQLALCHEMY_DATABASE_URI": db_uri, "ADMISSION_ENABLED": False},
+    )
+    return create_app("BenchConfig")
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000", help="Comma-separated catalogue sizes.")
+    parser.add_argument("--requests", type=int, default=200, help="Detail GETs per size (other scenarios scale from it).")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=None, help="Where to keep benchmark databases.")
+    parser.add_argument("--keep", action="store_true", help="Keep generated databases.")
+    parser.add_argument("--reuse", action="store_true", help="Reuse existing databases in --workdir.")
+    parser.add_argument("--base-url", default=None, help="Benchmark a running server instead of the test client.")
+    parser.add_argument("--json", dest="json_path", default=None, help="Write results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="youreka-bench-")
+    os.makedirs(workdir, exist_ok=True)
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "concurrency": args.concurrency,
+        "mode": "server" if args.base_url else "test_client",
+        "sizes": {},
+    }
+
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        db_path = os.path.join(workdir, f"bench-{size}.db")
+        if os.path.exists(db_path) and not args.reuse:
+            os.remove(db_path)
+
+        app = make_app("sqlite:///" + db_path)
+        started = time.perf_counter()
+        with app.app_context():
+            build_catalogue(size, seed=args.seed)
+            n_grants = Grant.query.count()
+        build_seconds = time.perf_counter() - started
+
+        plan = build_requests(app, args.requests, args.seed)
+        random.Random(args.seed).shuffle(plan)
+        results, wall, failures = run_plan(app, plan, args.concurrency, args.base_url)
+        summary = summarize(results)
+
+        report["sizes"][size] = {
+            "grants": n_grants,
+            "build_seconds": round(build_seconds, 2),
+            "total_requests": len(plan),
+            "failures": failures,
+            "overall_rps": round(len(plan) / wall, 1),
+            "scenarios": summary,
+        }
+
+        print(f"\n=== {n_grants} grants (built in {build_seconds:.1f}s), "
+              f"{len(plan)} requests, {len(plan) / wall:.1f} req/s overall, {failures} failures ===")
+        print(f"{'scenario':<24}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+        for name, row in sorted(summary.items()):
+            print(f"{name:<24}{row['requests']:>6}{row['p50_ms']:>10}{row['p95_ms']:>10}"
+                  f"{row['p99_ms']:>10}{row['rps']:>10}")
+
+    if args.json_path:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json_path)), exist_ok=True)
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.json_path}")
+
+    if not (args.keep or args.workdir):
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,6 +5,7 @@ from datetime import datetime
 
 from youreka import create_app
 from youreka.models import Grant
+from youreka.seed_grants import GRANT_CSV_FIELDS
 
 OUTPUT_PATH = os.path.join("data", "grants.csv")
 
@@ -15,33 +16,7 @@ def main():
 
         os.makedirs("data", exist_ok=True)
 
-        fieldnames = [
-            "id",
-            "organization_id",
-            "name_en",
-            "name_fr",
-            "description_en",
-            "description_fr",
-            "eligibility_en",
-            "eligibility_fr",
-            "category",
-            "region_scope",
-            "country",
-            "province_state",
-            "funding_min",
-            "funding_max",
-            "currency",
-            "deadline_date",
-            "ongoing_flag",
-            "language",
-            "team_scope",
-            "individual_type",
-            "is_ngo_only",
-            "source_url",
-            "external_id",
-            "created_at",
-            "updated_at",
-        ]
+        fieldnames = GRANT_CSV_FIELDS
 
         with open(OUTPUT_PATH, "w", newline="", encoding="utf-8") as f:
             writer = csv.DictWriter(f, fieldnames=fieldnames)
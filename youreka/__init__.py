@@ -1,14 +1,40 @@
-from flask import Flask, request, session, g
+import time
+import click
+from flask import Flask
 from .extensions import db, babel
-from .models import Region
+from .models import Region, ScrapeRun
 from .grants import bp as grants_bp
-from .email_utils import send_deadline_reminders
+from .calendar import bp as calendar_bp
+from .api import bp as api_bp
+from .archive import archive_counts, archive_grants
+from .changes import init_change_log, prune_events, record_expirations
+from .status_history import init_status_history, snapshot_statuses
+from .reference import init_reference_cache
+from .email_utils import send_deadline_reminders, send_search_digests
+from .instrumentation import init_instrumentation
+from .ratelimit import init_rate_limits
+from .locale import get_locale, init_locale_routing, localized_prefix
+from .http_cache import init_http_cache
+from .assets import build_assets, init_assets
+from .offline import init_offline
+from .static_site import build_static
+from .compression import init_compression
+from .streaming import init_streaming
 from .scraping.tasks import run_scrape
 import config as app_config
 from youreka.scraping.otf import scrape_otf
 from flask_babel import gettext as _, gettext, ngettext
 from .scraping.gov import scrape_ontario
+from .scraping.scheduler import get_scheduler
+from .scraping.metrics import compare_runs
+from .scraping.linkcheck import check_links, check_urls_sync, is_broken
+from .schema import ensure_schema
 from .seed_grants import seed_grants_if_empty
+from .synthetic import generate_catalogue
+from .importer import DEFAULT_ORGANIZATION, import_grants_csv
+from .dedup import cluster_sizes, dangling_clusters, rebuild_clusters
+from .migrate import CHUNK_SIZE as MIGRATE_CHUNK_SIZE, Migration, MigrationError
+from .recommendations import refresh_all as refresh_recommendations
 
 
 def create_app(config_name="DevConfig"):
@@ -32,60 +58,57 @@ def create_app(config_name="DevConfig"):
     )
 
 
-    # ---------------------------------------------------------
-    # Locale selector
-    # ---------------------------------------------------------
-    def select_locale():
-        # 1. URL override
-        lang = request.args.get("lang")
-        if lang in app.config["LANGUAGES"]:
-            session["lang"] = lang
-            session.permanent = True
-            return lang
-
-        # 2. If visiting "/" with NO lang= param → reset to English
-        if "lang" not in request.args:
-            session["lang"] = "en"
-            return "en"
-
-        # 3. Session fallback
-        lang = session.get("lang")
-        if lang in app.config["LANGUAGES"]:
-            return lang
-
-        # 4. Default
-        return app.config["BABEL_DEFAULT_LOCALE"]
-
-
     # ---------------------------------------------------------
     # Initialize DB + Babel
     # ---------------------------------------------------------
     db.init_app(app)
-    babel.init_app(app, locale_selector=select_locale)
+    babel.init_app(app, locale_selector=get_locale)
 
     # DO NOT add jinja2.ext.i18n — Flask-Babel already handles it
 
-    @app.before_request
-    def before_request():
-        g.lang = select_locale()
+    # ---------------------------------------------------------
+    # Admission control first: shed excess requests before any other work
+    # ---------------------------------------------------------
+    init_rate_limits(app)
 
-    @app.context_processor
-    def inject_lang():
-        return {"current_lang": session.get("lang", "en")}
+    # ---------------------------------------------------------
+    # Locale routing (/en/..., /fr/...), HTTP caching, assets, offline, streaming
+    # ---------------------------------------------------------
+    init_locale_routing(app)
+    # Compression registers first so its after_request hook runs last
+    init_compression(app)
+    init_http_cache(app)
+    init_assets(app)
+    init_offline(app)
+    init_streaming(app)
 
     # ---------------------------------------------------------
     # Blueprints
     # ---------------------------------------------------------
-    app.register_blueprint(grants_bp, url_prefix="/")
+    app.register_blueprint(grants_bp, url_prefix=localized_prefix(app))
+    app.register_blueprint(calendar_bp, url_prefix=localized_prefix(app) + "/calendar")
+    app.register_blueprint(api_bp, url_prefix="/api")
+
+    # Grant / status writes are appended to change_events (sync API)
+    init_change_log(app)
+    # Region status edits are appended to grant_status_events
+    init_status_history(app)
+    init_reference_cache(app)
 
     # ---------------------------------------------------------
     # DB setup
     # ---------------------------------------------------------
     with app.app_context():
         db.create_all()
+        ensure_schema()
         seed_regions_if_empty()
         seed_grants_if_empty()
 
+    # ---------------------------------------------------------
+    # Instrumentation (opt-in)
+    # ---------------------------------------------------------
+    init_instrumentation(app)
+
     register_cli(app)
     return app
 
@@ -114,15 +137,248 @@ def register_cli(app):
         with app.app_context():
             send_deadline_reminders()
 
+    @app.cli.command("send-search-notifications")
+    @click.option("--batch-size", default=None, type=int,
+                  help="Notifications per batch (default: SEARCH_DIGEST_BATCH_SIZE).")
+    def send_search_notifications_cmd(batch_size):
+        """Email digests of new grants matching saved searches (run from cron)."""
+        emails, sent = send_search_digests(batch_size)
+        print(f"Sent {sent} notifications in {emails} digests.")
+
     @app.cli.command("scrape-grants")
     def scrape_grants_cmd():
         with app.app_context():
             run_scrape()
+        get_scheduler().report()
 
     @app.cli.command("scrape-otf")
     def scrape_otf_cmd():
         scrape_otf()
+        get_scheduler().report()
 
     @app.cli.command("scrape-ontario")
     def scrape_ontario_cmd():
         scrape_ontario()
+        get_scheduler().report()
+
+    @app.cli.command("scrape-runs")
+    @click.option("--source", default=None, help="Only show runs for this source (otf, ontario, esdc).")
+    @click.option("--limit", default=20, show_default=True)
+    def scrape_runs_cmd(source, limit):
+        query = ScrapeRun.query
+        if source:
+            query = query.filter_by(source=source)
+        for run in query.order_by(ScrapeRun.id.desc()).limit(limit):
+            print(
+                f"{run.id:>5}  {run.started_at:%Y-%m-%d %H:%M}  {run.source:<10} {run.status:<8} "
+                f"{run.duration_seconds or 0:>8.2f}s  {run.pages_fetched:>4} pages  "
+                f"{run.errors:>3} errors  {run.grants_created:>4} created"
+            )
+
+    @app.cli.command("compare-scrape-runs")
+    @click.argument("run_id", type=int)
+    @click.argument("baseline_id", type=int, required=False)
+    def compare_scrape_runs_cmd(run_id, baseline_id):
+        """Compare RUN_ID against BASELINE_ID (default: previous run of the same source)."""
+        run = db.session.get(ScrapeRun, run_id)
+        if not run:
+            raise click.ClickException(f"Scrape run {run_id} not found.")
+        if baseline_id:
+            base = db.session.get(ScrapeRun, baseline_id)
+        else:
+            base = (
+                ScrapeRun.query.filter(ScrapeRun.source == run.source, ScrapeRun.id < run.id)
+                .order_by(ScrapeRun.id.desc())
+                .first()
+            )
+        if not base:
+            raise click.ClickException("No baseline run to compare against.")
+        for line in compare_runs(base, run):
+            print(line)
+
+    @app.cli.command("check-links")
+    @click.option("--all", "recheck_all", is_flag=True, help="Check every link, not only those due.")
+    @click.option("--limit", default=None, type=int, help="Check at most this many grants.")
+    @click.option("--url", "urls", multiple=True, help="Just check these URLs (nothing is stored).")
+    def check_links_cmd(recheck_all, limit, urls):
+        """Check grant source_url links concurrently and record their status."""
+        if urls:
+            for result in check_urls_sync(urls).values():
+                state = "BROKEN" if is_broken(result) else "ok"
+                target = f" -> {result.final_url}" if result.final_url else ""
+                print(f"  {state:6} {result.status or result.error}  {result.url}{target} ({result.seconds}s)")
+            return
+        stats = check_links(recheck_all=recheck_all, limit=limit, verbose=True)
+        print(
+            f"Checked {stats['urls']} links ({stats['grants']} grants, {stats['hosts']} hosts) "
+            f"in {stats['seconds']}s: {stats['ok']} ok ({stats['redirected']} redirected), "
+            f"{stats['broken']} broken"
+        )
+
+    @app.cli.command("generate-catalogue")
+    @click.option("--grants", "n_grants", default=10000, show_default=True)
+    @click.option("--organizations", "n_organizations", default=None, type=int,
+                  help="Default: one per 50 grants.")
+    @click.option("--regions", "n_regions", default=0, show_default=True,
+                  help="Extra synthetic regions on top of the seeded ones.")
+    @click.option("--status-rate", default=0.4, show_default=True,
+                  help="Share of grants that get GrantStatus rows (1-3 regions each).")
+    @click.option("--seed", default=42, show_default=True)
+    @click.option("--csv", "csv_path", default=None, help="Also write grants in data/grants.csv layout.")
+    @click.option("--no-db", is_flag=True, help="Only write the CSV.")
+    @click.option("--skip-finalize", is_flag=True,
+                  help="Skip post-ingest steps (dedup, recommendations); run dedup-grants later.")
+    def generate_catalogue_cmd(n_grants, n_organizations, n_regions, status_rate, seed, csv_path, no_db,
+                               skip_finalize):
+        """Generate a synthetic bilingual catalogue for performance testing."""
+        if no_db and not csv_path:
+            raise click.ClickException("--no-db needs --csv.")
+        counts = generate_catalogue(
+            n_grants,
+            n_organizations=n_organizations,
+            n_regions=n_regions,
+            status_rate=status_rate,
+            seed=seed,
+            csv_path=csv_path,
+            write_db=not no_db,
+            finalize=not skip_finalize,
+        )
+        print(
+            f"Generated {counts['grants']} grants, {counts['organizations']} organizations, "
+            f"{counts['regions']} regions, {counts['statuses']} statuses in {counts['seconds']}s"
+        )
+
+    @app.cli.command("import-grants")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--organization", default=DEFAULT_ORGANIZATION, show_default=True,
+                  help="Organization the imported grants belong to.")
+    @click.option("--skip-existing", is_flag=True, help="Don't update grants whose external_id already exists.")
+    @click.option("--chunk-size", default=5000, show_default=True)
+    @click.option("--skip-finalize", is_flag=True,
+                  help="Skip post-ingest steps (duplicate detection); run dedup-grants later.")
+    def import_grants_cmd(path, organization, skip_existing, chunk_size, skip_finalize):
+        """Stream a grants CSV (data/grants.csv layout) into the database."""
+        stats = import_grants_csv(
+            path,
+            organization_name=organization,
+            update_existing=not skip_existing,
+            chunk_size=chunk_size,
+            finalize=not skip_finalize,
+        )
+        for error in stats["errors"]:
+            print(f"  rejected {error}")
+        print(
+            f"Imported {stats['read']} rows in {stats['seconds']}s ({stats['rows_per_second']:,} rows/s): "
+            f"{stats['inserted']} inserted, {stats['updated']} updated, {stats['rejected']} rejected"
+        )
+
+    @app.cli.command("dedup-grants")
+    @click.option("--threshold", default=None, type=float,
+                  help="Minimum estimated similarity (default: DEDUP_THRESHOLD).")
+    def dedup_grants_cmd(threshold):
+        """Recompute near-duplicate clusters for the whole catalogue."""
+        started = time.perf_counter()
+        stats = rebuild_clusters(threshold=threshold, verbose=True)
+        db.session.commit()
+        print(
+            f"Clustered {stats['grants']} grants in {time.perf_counter() - started:.1f}s: "
+            f"{stats['compared']} candidate pairs, {stats['matches']} matches"
+        )
+        for cluster_id, size in cluster_sizes(limit=10):
+            print(f"  cluster {cluster_id}: {size} grants")
+
+    @app.cli.command("refresh-recommendations")
+    def refresh_recommendations_cmd():
+        """Rescore every (region, grant) pair and store the top grants per region (run daily)."""
+        started = time.perf_counter()
+        stats = refresh_recommendations()
+        print(
+            f"Scored {stats['grants']} grants for {stats['regions']} regions in "
+            f"{time.perf_counter() - started:.1f}s; stored {stats['stored']} recommendations"
+        )
+
+    @app.cli.command("expire-grants")
+    def expire_grants_cmd():
+        """Log "expire" changes for passed deadlines and prune old change events (run daily)."""
+        expired = record_expirations()
+        pruned = prune_events()
+        db.session.commit()
+        print(f"Recorded {expired} expired grants; pruned {pruned} old change events.")
+
+    @app.cli.command("archive-grants")
+    @click.option("--dry-run", is_flag=True, help="Only count the grants due for the archive.")
+    @click.option("--after-days", type=int, default=None, help="Override ARCHIVE_AFTER_DAYS.")
+    def archive_grants_cmd(dry_run, after_days):
+        """Move grants long past their deadline to the archive table (run daily)."""
+        moved = archive_grants(after_days=after_days, dry_run=dry_run)
+        live, archived = archive_counts()
+        verb = "Would archive" if dry_run else "Archived"
+        print(f"{verb} {moved} grants. Live: {live}, archived: {archived}.")
+        dangling = dangling_clusters()
+        if dangling:
+            print(f"Warning: {dangling} live grants point at a cluster without a live root; run dedup-grants.")
+
+    @app.cli.command("snapshot-statuses")
+    def snapshot_statuses_cmd():
+        """Store today's per-region pipeline totals (run weekly or daily)."""
+        rows = snapshot_statuses()
+        db.session.commit()
+        print(f"Stored {rows} pipeline totals.")
+
+    @app.cli.command("build-assets")
+    def build_assets_cmd():
+        """Fingerprint, minify and precompress static files into static/dist/."""
+        manifest = build_assets(app)
+        for source, hashed in sorted(manifest.items()):
+            print(f"  {source} -> {hashed}")
+        print(f"Built {len(manifest)} assets.")
+
+    @app.cli.command("build-static")
+    @click.option("--out", "out_dir", default=None, help="Output directory (default: STATIC_SITE_DIR).")
+    @click.option("--full", is_flag=True, help="Render every page, not only the changed ones.")
+    def build_static_cmd(out_dir, full):
+        """Pre-render grant pages and list presets for nginx / a CDN (run after scrapes)."""
+        stats = build_static(app, out_dir=out_dir, full=full, verbose=True)
+        print(
+            f"Rendered {stats['rendered']} pages ({stats['bytes'] / 1e6:.1f} MB) in {stats['seconds']}s; "
+            f"{stats['unchanged']} unchanged, {stats['removed']} removed, {stats['failed']} failed. "
+            f"{stats['pages']} pages in the manifest."
+        )
+
+    @app.cli.command("migrate-db")
+    @click.argument("target_uri")
+    @click.option("--source", "source_uri", default=None,
+                  help="Database to copy from (default: this app's SQLALCHEMY_DATABASE_URI).")
+    @click.option("--chunk-size", default=MIGRATE_CHUNK_SIZE, show_default=True)
+    @click.option("--workers", default=4, show_default=True, help="Tables copied at the same time.")
+    @click.option("--table", "tables", multiple=True, help="Only copy these tables (repeatable).")
+    @click.option("--reset", is_flag=True, help="Empty the target and start over instead of resuming.")
+    @click.option("--verify-only", is_flag=True, help="Only compare row counts and checksums.")
+    @click.option("--no-verify", is_flag=True, help="Skip the final comparison.")
+    def migrate_db_cmd(target_uri, source_uri, chunk_size, workers, tables, reset, verify_only, no_verify):
+        """Copy every table to TARGET_URI in key-ordered chunks (resumable), then verify."""
+        migration = Migration(
+            source_uri or app.config["SQLALCHEMY_DATABASE_URI"],
+            target_uri,
+            chunk_size=chunk_size,
+            workers=workers,
+            tables=set(tables),
+        )
+        try:
+            if not verify_only:
+                started = time.perf_counter()
+                migration.prepare(reset=reset)
+                copied = migration.copy()
+                print(f"Copied {sum(copied.values())} rows in {len(copied)} tables "
+                      f"in {time.perf_counter() - started:.1f}s.")
+            if verify_only or not no_verify:
+                mismatches = migration.verify()
+                if mismatches:
+                    raise click.ClickException(
+                        f"{len(mismatches)} tables differ: {', '.join(name for name, _s, _t in mismatches)}"
+                    )
+                print("Source and target match.")
+        except MigrationError as exc:
+            raise click.ClickException(str(exc))
+        finally:
+            migration.close()
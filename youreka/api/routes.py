@@ -0,0 +1,219 @@
+"""
+Catalogue sync API.
+
+    GET /api/changes                  -> {"cursor": <latest>} to start from
+    GET /api/changes?since=<cursor>   -> changes after cursor, oldest first
+    GET /api/changes/stream           -> the same as server-sent events
+    GET /api/suggest?q=<prefix>       -> typeahead for the list page filters
+    GET /api/catalogue[?since=<cursor>] -> compact grant bundle for offline filtering
+
+A consumer does one full fetch, keeps the cursor, and from then on only
+reads what changed. A 410 means the cursor fell out of the retained log
+(CHANGES_RETENTION_DAYS) and the consumer has to resync.
+"""
+
+import json
+import time
+
+from flask import Response, current_app, jsonify, request, stream_with_context
+from sqlalchemy.orm import joinedload
+
+from . import bp
+from ..changes import GRANT, GRANT_STATUS, CursorExpired, events_since, latest_cursor
+from ..extensions import db
+from ..models import Grant, GrantStatus
+from ..offline import delta_bundle, full_bundle
+from ..suggest import KINDS, suggest
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def grant_payload(grant):
+    return {
+        "id": grant.id,
+        "name_en": grant.name_en,
+        "name_fr": grant.name_fr,
+        "description_en": grant.description_en,
+        "description_fr": grant.description_fr,
+        "organization": grant.organization.name if grant.organization else None,
+        "category": grant.category,
+        "province": grant.province,
+        "region_scope": grant.region_scope,
+        "team_scope": grant.team_scope,
+        "individual_type": grant.individual_type,
+        "language": grant.language,
+        "is_ngo_only": grant.is_ngo_only,
+        "funding_min": grant.funding_min,
+        "funding_max": grant.funding_max,
+        "currency": grant.currency,
+        "deadline_date": _iso(grant.deadline_date),
+        "ongoing_flag": grant.ongoing_flag,
+        "source_url": grant.source_url,
+        "cluster_id": grant.cluster_id,
+        "updated_at": _iso(grant.updated_at),
+    }
+
+
+def status_payload(status):
+    return {
+        "id": status.id,
+        "grant_id": status.grant_id,
+        "region_id": status.region_id,
+        "status": status.status,
+        "notes": status.notes,
+        "last_updated": _iso(status.last_updated),
+    }
+
+
+def _changes(rows):
+    """Events with the current state of their row (None once deleted)."""
+    grant_ids = {r.entity_id for r in rows if r.entity == GRANT and r.action != "delete"}
+    status_ids = {r.entity_id for r in rows if r.entity == GRANT_STATUS and r.action != "delete"}
+    grants = {
+        g.id: grant_payload(g)
+        for g in Grant.query.options(joinedload(Grant.organization)).filter(Grant.id.in_(grant_ids))
+    } if grant_ids else {}
+    statuses = {
+        s.id: status_payload(s) for s in GrantStatus.query.filter(GrantStatus.id.in_(status_ids))
+    } if status_ids else {}
+
+    changes = []
+    for row in rows:
+        data = (grants if row.entity == GRANT else statuses).get(row.entity_id)
+        changes.append({
+            "cursor": row.id,
+            "entity": row.entity,
+            "id": row.entity_id,
+            "action": row.action,
+            "grant_id": row.grant_id,
+            "region_id": row.region_id,
+            "at": _iso(row.created_at),
+            "data": data,
+        })
+    return changes
+
+
+def _limit():
+    default = current_app.config.get("CHANGES_PAGE_SIZE", 500)
+    return max(1, min(request.args.get("limit", default, type=int), default))
+
+
+def _expired():
+    return jsonify(error="cursor expired, resync the full catalogue", cursor=latest_cursor()), 410
+
+
+@bp.route("/changes")
+def changes():
+    since = request.args.get("since", type=int)
+    if since is None:
+        return jsonify(changes=[], cursor=latest_cursor(), has_more=False)
+
+    try:
+        rows, has_more = events_since(since, _limit())
+    except CursorExpired:
+        return _expired()
+
+    cursor = rows[-1].id if rows else since
+    etag = f"changes-{since}-{cursor}-{int(has_more)}"
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(changes=_changes(rows), cursor=cursor, has_more=has_more)
+    response.set_etag(etag)
+    return response
+
+
+@bp.route("/changes/stream")
+def changes_stream():
+    """
+    Server-sent events: one "change" event per change, with the cursor as
+    the event id so EventSource resumes from Last-Event-ID on reconnect.
+    The stream ends after CHANGES_STREAM_MAX_SECONDS; clients reconnect.
+
+    Each open stream holds a worker, so it is refused (and EventSource
+    gives up) unless CHANGES_STREAM_ENABLED says the app runs on threaded
+    or gevent workers; poll /api/changes instead.
+    """
+    if not current_app.config.get("CHANGES_STREAM_ENABLED"):
+        response = jsonify(error="streaming is off on this server; poll /api/changes?since=<cursor>")
+        response.status_code = 503
+        response.headers["Cache-Control"] = "no-store"
+        return response
+
+    cursor = request.headers.get("Last-Event-ID", type=int)
+    if cursor is None:
+        cursor = request.args.get("since", type=int)
+    if cursor is None:
+        cursor = latest_cursor()
+
+    config = current_app.config
+    poll = config.get("CHANGES_STREAM_POLL_SECONDS", 2)
+    heartbeat = config.get("CHANGES_STREAM_HEARTBEAT_SECONDS", 15)
+    max_seconds = config.get("CHANGES_STREAM_MAX_SECONDS", 300)
+    limit = _limit()
+
+    def events(cursor):
+        yield f"retry: {int(poll * 1000)}\n\n"
+        started = last_sent = time.monotonic()
+        while time.monotonic() - started < max_seconds:
+            try:
+                rows, has_more = events_since(cursor, limit)
+            except CursorExpired:
+                yield f"event: expired\ndata: {json.dumps({'cursor': latest_cursor()})}\n\n"
+                return
+            if rows:
+                for change in _changes(rows):
+                    yield f"id: {change['cursor']}\nevent: change\ndata: {json.dumps(change)}\n\n"
+                cursor = rows[-1].id
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= heartbeat:
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+            # End the read transaction so the next poll sees new commits
+            db.session.rollback()
+            if not has_more:
+                time.sleep(poll)
+
+    response = Response(stream_with_context(events(cursor)), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # nginx: don't buffer the stream
+    return response
+
+
+@bp.route("/suggest")
+def suggest_terms():
+    """
+    Typeahead over grant/organization names, categories and provinces
+    (EN and FR), from the in-memory index. ``kind`` (repeatable) narrows it
+    to some of them; ``value`` is what to put in the matching filter.
+    """
+    kinds = tuple(k for k in request.args.getlist("kind") if k in KINDS) or KINDS
+    limit = max(1, min(request.args.get("limit", 10, type=int), 50))
+    q = (request.args.get("q") or "")[:100]
+    response = jsonify(q=q, suggestions=suggest(q, kinds, limit))
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config.get("SUGGEST_SYNC_SECONDS", 30)
+    return response
+
+
+@bp.route("/catalogue")
+def catalogue():
+    """
+    Every live grant in one compact bundle (see youreka/offline.py), or
+    with ``since`` only what changed after that cursor.
+    """
+    since = request.args.get("since", type=int)
+    if since is None:
+        text = full_bundle()
+    else:
+        try:
+            text = delta_bundle(since)
+        except CursorExpired:
+            return _expired()
+    response = Response(text, mimetype="application/json")
+    response.add_etag()
+    response.make_conditional(request)
+    response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,148 @@
+"""
+Hot/cold split of the grants table.
+
+Every scrape cycle adds programs whose deadline then passes, and the list
+page, dedup, recommendations and saved-search matching all work on the
+grants table. `flask archive-grants` (run daily, after expire-grants)
+moves grants whose deadline passed more than ARCHIVE_AFTER_DAYS ago, and
+that aren't ongoing, into archived_grants, so the live table holds only
+the hot set as years of cycles accumulate.
+
+- Rows keep their id. The grant page and revision history still open an
+  archived grant, and ``?archived=1`` adds archived matches to the list.
+- Grants a region tracks (grant_statuses) stay live, so status history
+  and pipelines keep their joins.
+- Derived rows (LSH buckets, recommendations, queued notifications) are
+  dropped with the grant; revisions and change events are kept.
+- A scraper or CSV import that sees an archived program again (next
+  cycle, same external_id) restores it before updating it, as does a
+  region starting to track it. A program that comes back still past its
+  deadline stays archived, so scrape and archive runs don't keep moving
+  it back and forth.
+- Near-duplicate clusters are fixed up both ways: a cluster losing a
+  member to the archive is re-rooted on its lowest live id (or dissolved),
+  and a restored grant comes back unclustered and is matched again.
+"""
+
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, exists, func, insert, literal, or_, select
+from sqlalchemy.orm import aliased
+
+from .changes import log_grant_events
+from .dedup import assign_clusters, recluster
+from .extensions import db
+from .models import (
+    Grant,
+    GrantLSHBucket,
+    GrantStatus,
+    RegionRecommendation,
+    SearchNotification,
+    archived_grants,
+)
+
+BATCH_SIZE = 1000
+
+# Archived rows loaded as (read-only) Grant objects
+ArchivedGrant = aliased(Grant, archived_grants, name="archived_grant", adapt_on_names=True)
+
+_COLUMNS = [column.name for column in Grant.__table__.columns]
+
+
+def archivable(today=None, after_days=None):
+    """Select of the ids of grants due to move to the archive."""
+    today = today or date.today()
+    if after_days is None:
+        after_days = current_app.config.get("ARCHIVE_AFTER_DAYS", 30)
+    grants = Grant.__table__
+    tracked = exists().where(GrantStatus.__table__.c.grant_id == grants.c.id)
+    return select(grants.c.id).where(
+        grants.c.deadline_date < today - timedelta(days=after_days),
+        or_(grants.c.ongoing_flag.is_(None), grants.c.ongoing_flag.is_(False)),
+        ~tracked,
+    )
+
+
+def _archive(conn, ids, now):
+    grants = Grant.__table__
+    clusters = conn.execute(
+        select(grants.c.cluster_id).distinct().where(grants.c.id.in_(ids), grants.c.cluster_id.isnot(None))
+    ).scalars().all()
+    conn.execute(
+        insert(archived_grants).from_select(
+            _COLUMNS + ["archived_at"],
+            select(*grants.c, literal(now)).where(grants.c.id.in_(ids)),
+        )
+    )
+    for table in (GrantLSHBucket.__table__, RegionRecommendation.__table__, SearchNotification.__table__):
+        conn.execute(delete(table).where(table.c.grant_id.in_(ids)))
+    conn.execute(delete(grants).where(grants.c.id.in_(ids)))
+    log_grant_events(conn, ids, "archive")
+    # Their duplicates stay live: re-root or dissolve the clusters they left
+    recluster(clusters)
+
+
+def archive_grants(today=None, after_days=None, batch_size=BATCH_SIZE, dry_run=False):
+    """
+    Move due grants to archived_grants in batches, committing after each.
+    Returns the number of grants archived (or due, with ``dry_run``).
+    """
+    due = archivable(today, after_days).order_by(Grant.__table__.c.id)
+    if dry_run:
+        return len(db.session.execute(due).all())
+
+    moved = 0
+    while True:
+        ids = db.session.execute(due.limit(batch_size)).scalars().all()
+        if not ids:
+            return moved
+        _archive(db.session.connection(), ids, datetime.utcnow())
+        db.session.commit()
+        moved += len(ids)
+
+
+def reopened(deadline_date, ongoing_flag, today=None):
+    """Whether a program seen again with these values belongs in the live table."""
+    today = today or date.today()
+    return deadline_date is None or deadline_date >= today or bool(ongoing_flag)
+
+
+def restore_grants(condition, conn=None):
+    """
+    Move archived grants matching ``condition`` (on archived_grants)
+    back to the live table. Doesn't commit. Returns their ids.
+    """
+    conn = conn or db.session.connection()
+    ids = conn.execute(select(archived_grants.c.id).where(condition)).scalars().all()
+    if not ids:
+        return []
+    # The cluster it was in may have been re-rooted or dissolved since:
+    # it comes back unclustered and is matched again
+    columns = [
+        literal(None).label(name) if name == "cluster_id" else archived_grants.c[name]
+        for name in _COLUMNS
+    ]
+    conn.execute(
+        insert(Grant.__table__).from_select(
+            _COLUMNS,
+            select(*columns).where(archived_grants.c.id.in_(ids)),
+        )
+    )
+    conn.execute(delete(archived_grants).where(archived_grants.c.id.in_(ids)))
+    log_grant_events(conn, ids, "restore")
+    if current_app.config.get("DEDUP_ENABLED", True):
+        assign_clusters(ids)
+    return ids
+
+
+def archived_grant(grant_id):
+    """The archived grant with ``grant_id`` as a Grant object (don't modify it), or None."""
+    return db.session.query(ArchivedGrant).filter(ArchivedGrant.id == grant_id).first()
+
+
+def archive_counts():
+    """(live, archived) grant counts."""
+    live = db.session.query(Grant.id).count()
+    cold = db.session.execute(select(func.count()).select_from(archived_grants)).scalar()
+    return live, cold
@@ -0,0 +1,140 @@
+"""
+Fingerprinted, precompressed static assets.
+
+`flask build-assets` copies every file under youreka/static/ into
+youreka/static/dist/ with a content hash in its name (styles.3f2a9c1b.css),
+minifies CSS, writes .gz / .br variants next to compressible files and
+records the mapping in dist/manifest.json.
+
+Templates call ``asset_url("css/styles.css")``: it returns the fingerprinted
+/assets/... URL when a build exists and falls back to the normal static URL
+otherwise. /assets/ serves the best precompressed variant the client accepts
+with a one-year immutable Cache-Control, so repeat visits fetch nothing.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+from flask import current_app, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # optional: only .gz variants are built without it
+    brotli = None
+
+DIST_DIRNAME = "dist"
+MANIFEST_NAME = "manifest.json"
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".html", ".ico"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def minify_css(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{}:;,>])\s*", r"\1", css)
+    css = css.replace(";}", "}")
+    return css.strip()
+
+
+def _dist_dir(app):
+    return os.path.join(app.static_folder, DIST_DIRNAME)
+
+
+def write_precompressed(path, data, brotli_quality=11):
+    """Write ``path``.gz (and ``path``.br with brotli) next to ``path``."""
+    # mtime=0 keeps the .gz output reproducible
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(data, quality=brotli_quality))
+
+
+def build_assets(app):
+    """Build fingerprinted + precompressed assets. Returns the manifest dict."""
+    static_dir = app.static_folder
+    dist_dir = _dist_dir(app)
+    shutil.rmtree(dist_dir, ignore_errors=True)
+
+    manifest = {}
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != dist_dir]
+        for name in sorted(files):
+            src = os.path.join(root, name)
+            rel = os.path.relpath(src, static_dir).replace(os.sep, "/")
+            base, ext = os.path.splitext(rel)
+
+            with open(src, "rb") as f:
+                data = f.read()
+            if ext == ".css":
+                data = minify_css(data.decode("utf-8")).encode("utf-8")
+
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            hashed = f"{base}.{digest}{ext}"
+            out = os.path.join(dist_dir, hashed)
+            os.makedirs(os.path.dirname(out), exist_ok=True)
+            with open(out, "wb") as f:
+                f.write(data)
+
+            if ext in COMPRESSIBLE:
+                write_precompressed(out, data)
+
+            manifest[rel] = hashed
+
+    with open(os.path.join(dist_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def _load_manifest(app):
+    path = os.path.join(_dist_dir(app), MANIFEST_NAME)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    cached = app.extensions.get("asset_manifest")
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    app.extensions["asset_manifest"] = (mtime, manifest)
+    return manifest
+
+
+def asset_url(filename):
+    """url_for('static', ...) replacement that prefers the fingerprinted build."""
+    hashed = _load_manifest(current_app).get(filename)
+    if hashed:
+        return url_for("serve_asset", filename=hashed)
+    return url_for("static", filename=filename)
+
+
+def _accepts(encoding):
+    return request.accept_encodings[encoding] > 0
+
+
+def init_assets(app):
+    app.add_template_global(asset_url)
+
+    @app.route("/assets/<path:filename>")
+    def serve_asset(filename):
+        dist_dir = _dist_dir(app)
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+        served, encoding = filename, None
+        for enc, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if _accepts(enc) and os.path.exists(os.path.join(dist_dir, filename + suffix)):
+                served, encoding = filename + suffix, enc
+                break
+
+        response = send_from_directory(dist_dir, served, mimetype=mimetype, max_age=31536000)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        response.vary.add("Accept-Encoding")
+        response.headers["Cache-Control"] = IMMUTABLE
+        return response
@@ -0,0 +1,307 @@
+"""
+Async read-only JSON API, served by an ASGI server next to the Flask app.
+
+The Flask app runs on gunicorn sync workers: a slow client or a slow query
+holds a whole worker. This tier answers reads on an event loop instead, so
+one process serves thousands of open API connections while the database
+sees at most ASYNC_API_POOL_SIZE + ASYNC_API_MAX_OVERFLOW of them (SQLAlchemy
+asyncio with asyncpg on Postgres, aiosqlite in dev).
+
+    GET <prefix>/grants?<list filters>&limit=&offset=  -> grants, as on the list page
+    GET <prefix>/grants/<id>                           -> one grant (archived too) + statuses
+    GET <prefix>/facets?<list filters>                 -> value counts per filter field
+    GET <prefix>/regions                               -> active regions
+    GET <prefix>/regions/<id>/statuses?status=         -> a region's tracked grants
+
+Filters are youreka/grants/filters.py's apply_filters / collapse_duplicates
+on select() statements, so results match the list page. Clients are rate
+limited with RATE_LIMITS["api"] (see youreka/ratelimit.py).
+
+Run it with ``uvicorn asgi:app`` and route ASYNC_API_PREFIX (default
+/api/v2) to it; the Flask app keeps every other URL.
+"""
+
+import asyncio
+import json
+import os
+import re
+from datetime import date, datetime
+from urllib.parse import parse_qsl
+
+from flask import Config
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import selectinload
+from werkzeug.datastructures import MultiDict
+
+import config as app_config
+
+from .api.routes import grant_payload, status_payload
+from .archive import ArchivedGrant
+from .grants.filters import PROVINCE_NAMES, apply_filters, collapse_duplicates
+from .migrate import normalize_uri
+from .models import STATUSES, Grant, GrantStatus, Region
+from .ratelimit import MemoryBuckets, make_buckets
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+FACETS = ("category", "province", "language", "team_scope", "individual_type")
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+def async_uri(uri):
+    """The async driver's form of a SQLALCHEMY_DATABASE_URI."""
+    uri = normalize_uri(uri)
+    scheme, sep, rest = uri.partition("://")
+    driver = ASYNC_DRIVERS.get(scheme.split("+")[0])
+    if driver is None:
+        raise ValueError(f"No async driver for {scheme} databases")
+    return f"{driver}{sep}{rest}"
+
+
+def load_config(config_name="ProdConfig"):
+    """The Flask app's settings (config.py + instance/config.py), without the app."""
+    config = Config(app_config.BASE_DIR)
+    config.from_object(getattr(app_config, config_name))
+    config.from_pyfile(os.path.join(app_config.BASE_DIR, "instance", "config.py"), silent=True)
+    return config
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Can't serialize {type(value).__name__}")
+
+
+def _int_arg(args, name, default, low, high):
+    value = args.get(name, default, type=int)
+    return max(low, min(value, high))
+
+
+class AsyncAPI:
+    def __init__(self, config):
+        self.config = config
+        self.prefix = config.get("ASYNC_API_PREFIX", "/api/v2").rstrip("/")
+        uri = async_uri(config["SQLALCHEMY_DATABASE_URI"])
+        pool = {}
+        if not uri.startswith("sqlite"):
+            pool = {
+                "pool_size": config.get("ASYNC_API_POOL_SIZE", 20),
+                "max_overflow": config.get("ASYNC_API_MAX_OVERFLOW", 20),
+                "pool_timeout": config.get("ASYNC_API_POOL_TIMEOUT", 10),
+                "pool_pre_ping": True,
+            }
+        self.engine = create_async_engine(uri, **pool)
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        limit = (config.get("RATE_LIMITS") or {}).get("api")
+        self.rate = (limit[0] / 60.0, limit[1]) if limit and config.get("ADMISSION_ENABLED", True) else None
+        self.buckets = make_buckets(config) if self.rate else None
+        self.routes = [
+            (re.compile(r"/grants"), self.grants),
+            (re.compile(r"/grants/(\d+)"), self.grant),
+            (re.compile(r"/facets"), self.facets),
+            (re.compile(r"/regions"), self.regions),
+            (re.compile(r"/regions/(\d+)/statuses"), self.region_statuses),
+        ]
+
+    # ---------------------------------------------------------
+    # ASGI
+    # ---------------------------------------------------------
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        headers = {"cache-control": "no-store"}
+        try:
+            status, body = 200, await self._dispatch(scope)
+            headers["cache-control"] = f"public, max-age={self.config.get('PUBLIC_CACHE_MAX_AGE', 120)}"
+        except HTTPError as exc:
+            status, body = exc.status, {"error": exc.message}
+            headers.update(exc.headers)
+
+        payload = json.dumps(body, default=_json_default, separators=(",", ":")).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(payload)).encode()),
+                *((k.encode(), v.encode()) for k, v in headers.items()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else payload})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _client(self, scope):
+        hops = self.config.get("RATE_LIMIT_TRUSTED_PROXIES", 0)
+        if hops:
+            forwarded = dict(scope.get("headers") or []).get(b"x-forwarded-for", b"").decode("latin-1")
+            addresses = [a.strip() for a in forwarded.split(",") if a.strip()]
+            if len(addresses) >= hops:
+                return addresses[-hops]
+        return (scope.get("client") or ("unknown",))[0]
+
+    async def _dispatch(self, scope):
+        if scope["method"] not in ("GET", "HEAD"):
+            raise HTTPError(405, "read-only API", {"allow": "GET, HEAD"})
+        path = scope["path"]
+        if not path.startswith(self.prefix + "/"):
+            raise HTTPError(404, "not found")
+        path = path[len(self.prefix):].rstrip("/")
+
+        for pattern, handler in self.routes:
+            match = pattern.fullmatch(path)
+            if match:
+                break
+        else:
+            raise HTTPError(404, "not found")
+
+        client = self._client(scope)
+        if self.rate and client not in set(self.config.get("RATE_LIMIT_EXEMPT") or ()):
+            key = f"api:{client}"
+            if isinstance(self.buckets, MemoryBuckets):
+                wait = self.buckets.take(key, *self.rate)
+            else:
+                # SQLite buckets wait on a file lock; keep that off the event loop
+                wait = await asyncio.to_thread(self.buckets.take, key, *self.rate)
+            if wait:
+                seconds = max(1, int(wait + 0.999))
+                raise HTTPError(429, "too many requests", {"retry-after": str(seconds)})
+
+        args = MultiDict(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True))
+        return await handler(args, *(int(group) for group in match.groups()))
+
+    # ---------------------------------------------------------
+    # Queries
+    # ---------------------------------------------------------
+    def _filtered(self, args, columns=None):
+        query = apply_filters(select(*columns) if columns else select(Grant), args)
+        if self.config.get("DEDUP_COLLAPSE_LIST"):
+            query = collapse_duplicates(query, args)
+        return query
+
+    async def grants(self, args):
+        page_size = self.config.get("ASYNC_API_PAGE_SIZE", 100)
+        limit = _int_arg(args, "limit", page_size, 1, self.config.get("ASYNC_API_MAX_PAGE_SIZE", 500))
+        offset = _int_arg(args, "offset", 0, 0, 10 ** 9)
+        query = (
+            self._filtered(args)
+            .options(selectinload(Grant.organization))
+            .order_by(Grant.deadline_date.is_(None), Grant.deadline_date.asc(), Grant.id)
+            .limit(limit + 1)
+            .offset(offset)
+        )
+        async with self.sessions() as session:
+            grants = (await session.scalars(query)).all()
+        return {
+            "grants": [grant_payload(grant) for grant in grants[:limit]],
+            "offset": offset,
+            "next_offset": offset + limit if len(grants) > limit else None,
+        }
+
+    async def grant(self, args, grant_id):
+        async with self.sessions() as session:
+            grant = await session.scalar(
+                select(Grant).options(selectinload(Grant.organization)).where(Grant.id == grant_id)
+            )
+            archived = grant is None
+            if archived:
+                grant = await session.scalar(
+                    select(ArchivedGrant)
+                    .options(selectinload(ArchivedGrant.organization))
+                    .where(ArchivedGrant.id == grant_id)
+                )
+            if grant is None:
+                raise HTTPError(404, "grant not found")
+            statuses = (
+                await session.scalars(
+                    select(GrantStatus).where(GrantStatus.grant_id == grant_id).order_by(GrantStatus.region_id)
+                )
+            ).all()
+        return {
+            "grant": grant_payload(grant),
+            "archived": archived,
+            "statuses": [status_payload(status) for status in statuses],
+        }
+
+    async def _facet(self, args, field):
+        # Counts for a field ignore that field's own filter, so a client
+        # can show what picking another value would give
+        others = MultiDict((k, v) for k, v in args.items(multi=True) if k != field)
+        column = getattr(Grant, field)
+        query = (
+            self._filtered(others, [column, func.count()])
+            .where(column.isnot(None))
+            .group_by(column)
+            .order_by(func.count().desc(), column)
+        )
+        async with self.sessions() as session:
+            rows = (await session.execute(query)).all()
+        return field, [{"value": value, "grants": count} for value, count in rows]
+
+    async def facets(self, args):
+        # One pooled connection per facet, queried at the same time
+        results = await asyncio.gather(*(self._facet(args, field) for field in FACETS))
+        return {"facets": dict(results), "provinces": PROVINCE_NAMES}
+
+    async def regions(self, args):
+        async with self.sessions() as session:
+            regions = (
+                await session.scalars(select(Region).where(Region.is_active.is_(True)).order_by(Region.id))
+            ).all()
+        return {"regions": [
+            {"id": r.id, "name_en": r.name_en, "name_fr": r.name_fr, "province": r.province, "city": r.city}
+            for r in regions
+        ]}
+
+    async def region_statuses(self, args, region_id):
+        status = args.get("status")
+        if status and status not in STATUSES:
+            raise HTTPError(400, f"status must be one of {', '.join(STATUSES)}")
+        limit = _int_arg(args, "limit", self.config.get("ASYNC_API_PAGE_SIZE", 100), 1,
+                         self.config.get("ASYNC_API_MAX_PAGE_SIZE", 500))
+        offset = _int_arg(args, "offset", 0, 0, 10 ** 9)
+        query = (
+            select(GrantStatus, Grant.name_en, Grant.deadline_date)
+            .join(Grant, Grant.id == GrantStatus.grant_id)
+            .where(GrantStatus.region_id == region_id)
+            .order_by(Grant.deadline_date.is_(None), Grant.deadline_date.asc(), GrantStatus.id)
+            .limit(limit + 1)
+            .offset(offset)
+        )
+        if status:
+            query = query.where(GrantStatus.status == status)
+        async with self.sessions() as session:
+            if await session.get(Region, region_id) is None:
+                raise HTTPError(404, "region not found")
+            rows = (await session.execute(query)).all()
+        return {
+            "statuses": [
+                {**status_payload(row[0]), "grant_name": row[1], "deadline_date": row[2]}
+                for row in rows[:limit]
+            ],
+            "offset": offset,
+            "next_offset": offset + limit if len(rows) > limit else None,
+        }
+
+
+def create_asgi_app(config_name="ProdConfig"):
+    return AsyncAPI(load_config(config_name))
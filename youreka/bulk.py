@@ -0,0 +1,75 @@
+"""
+Bulk-loading helpers shared by the data generator and CSV importer.
+
+On Postgres rows are streamed with COPY (much faster than INSERTs);
+on other databases (SQLite in dev) they go through a single executemany.
+"""
+
+import csv
+import io
+
+from sqlalchemy import func, select, text
+
+
+def is_postgres(conn):
+    return conn.dialect.name == "postgresql"
+
+
+def _copy_value(value):
+    if value is None:
+        return r"\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (bytes, memoryview)):
+        return "\\x" + bytes(value).hex()  # bytea hex input
+    return value
+
+
+def copy_rows(conn, table_name, columns, rows):
+    """COPY ``rows`` (sequence of dicts) into ``table_name`` on Postgres."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow([_copy_value(row.get(c)) for c in columns])
+    buf.seek(0)
+
+    raw = conn.connection.dbapi_connection
+    with raw.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buf,
+        )
+
+
+def bulk_insert(conn, table, rows):
+    """Insert a list of dicts into a Core ``Table`` as fast as the backend allows."""
+    if not rows:
+        return 0
+    if is_postgres(conn):
+        columns = list(rows[0].keys())
+        copy_rows(conn, table.name, columns, rows)
+    else:
+        conn.execute(table.insert(), rows)
+    return len(rows)
+
+
+def next_id(conn, table):
+    """Next free primary key value, for callers that assign ids themselves."""
+    return (conn.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+
+
+def fix_sequence(conn, table):
+    """After inserting explicit ids on Postgres, move the id sequence past them."""
+    if not is_postgres(conn):
+        return
+    conn.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+        f"COALESCE((SELECT MAX(id) FROM {table.name}), 0) + 1, false)"
+    ))
+
+
+def fast_sqlite_pragmas(conn):
+    """Trade durability for speed during one-off bulk loads on SQLite."""
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql("PRAGMA synchronous = OFF")
+        conn.exec_driver_sql("PRAGMA temp_store = MEMORY")
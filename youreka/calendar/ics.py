@@ -0,0 +1,116 @@
+"""
+Minimal iCalendar (RFC 5545) writer for deadline feeds.
+
+Each grant becomes one all-day VEVENT. Rendered events are kept in a
+process-local LRU keyed by everything that appears in them (grant id,
+updated_at, language, region status), so rebuilding a feed after a
+change only re-renders the grants that actually changed.
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from threading import Lock
+
+PRODID = "-//Youreka Canada//Grant Portal//EN"
+UID_DOMAIN = "grants.youreka.ca"
+
+
+def escape_text(value):
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def fold(line):
+    """Fold a content line at 75 octets (continuation lines start with a space)."""
+    data = line.encode("utf-8")
+    if len(data) <= 75:
+        return line
+    parts, limit = [], 75
+    while data:
+        cut = min(limit, len(data))
+        # Don't split a multi-byte UTF-8 sequence
+        while cut < len(data) and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(data[:cut].decode("utf-8"))
+        data = data[cut:]
+        limit = 74
+    return "\r\n ".join(parts)
+
+
+def _stamp(dt):
+    return (dt or datetime.utcnow()).strftime("%Y%m%dT%H%M%SZ")
+
+
+def render_event(uid, day, summary, description, url, stamp):
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{uid}",
+        f"DTSTAMP:{_stamp(stamp)}",
+        f"DTSTART;VALUE=DATE:{day:%Y%m%d}",
+        f"DTEND;VALUE=DATE:{day + timedelta(days=1):%Y%m%d}",
+        f"SUMMARY:{escape_text(summary)}",
+        "TRANSP:TRANSPARENT",
+    ]
+    if description:
+        lines.append(f"DESCRIPTION:{escape_text(description)}")
+    if url:
+        lines.append(f"URL:{url}")
+    lines.append("END:VEVENT")
+    return "\r\n".join(fold(line) for line in lines) + "\r\n"
+
+
+def render_calendar(name, events, ttl_minutes):
+    header = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{escape_text(name)}",
+        # Hint for clients that honour it (Outlook, Apple Calendar)
+        f"REFRESH-INTERVAL;VALUE=DURATION:PT{ttl_minutes}M",
+        f"X-PUBLISHED-TTL:PT{ttl_minutes}M",
+    ]
+    head = "\r\n".join(fold(line) for line in header) + "\r\n"
+    return head + "".join(events) + "END:VCALENDAR\r\n"
+
+
+class LRUCache:
+    """Small thread-safe LRU used for rendered events and whole feeds."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,267 @@
+"""
+Deadline calendar: a date-range JSON API and subscribable iCalendar feeds.
+
+Feeds are polled every few minutes by calendar clients, so each request
+first computes a cheap aggregate stamp (row count + latest updated_at of
+the matching grants, plus region status changes) and answers
+304 Not Modified when the client's ETag still matches. Changed feeds are
+rebuilt from cached per-grant events, so only changed grants re-render.
+"""
+
+import hashlib
+from datetime import date, timedelta
+
+from flask import Response, current_app, g, jsonify, request, url_for
+from flask_babel import gettext as _
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+
+from . import bp
+from .ics import LRUCache, render_calendar, render_event, UID_DOMAIN
+from ..grants.filters import apply_filters
+from ..http_cache import public_cache
+from ..models import Grant, GrantStatus
+from ..reference import get_region_or_404, reference_version
+
+# Query params that are not grant filters (kept out of feed URLs/stamps)
+NON_FILTER_ARGS = {"start", "end", "lang"}
+
+
+def _caches():
+    caches = current_app.extensions.get("calendar_caches")
+    if caches is None:
+        caches = {
+            "events": LRUCache(current_app.config.get("CALENDAR_EVENT_CACHE_SIZE", 10000)),
+            "feeds": LRUCache(current_app.config.get("CALENDAR_FEED_CACHE_SIZE", 64)),
+        }
+        current_app.extensions["calendar_caches"] = caches
+    return caches
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def _filter_args():
+    return sorted(
+        (k, v) for k, v in request.args.items(multi=True) if v and k not in NON_FILTER_ARGS
+    )
+
+
+def _lang():
+    return g.get("lang") or current_app.config["BABEL_DEFAULT_LOCALE"]
+
+
+def _name(grant, lang):
+    return (grant.name_fr if lang == "fr" and grant.name_fr else None) or grant.name_en
+
+
+def _etag(*parts):
+    # Events show the organization name, which can change without the grant
+    raw = "|".join(str(p) for p in (*parts, reference_version("organizations")))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:24]
+
+
+def _grant_stamp(query):
+    """(count, latest updated_at) of the grants matched by query."""
+    return query.order_by(None).with_entities(
+        func.count(Grant.id), func.max(Grant.updated_at)
+    ).one()
+
+
+def _not_modified(etag):
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def _window_start():
+    return date.today() - timedelta(days=current_app.config.get("CALENDAR_PAST_DAYS", 30))
+
+
+def _funding(grant):
+    if grant.funding_min and grant.funding_max and grant.funding_min != grant.funding_max:
+        return f"{grant.funding_min:,.0f}–{grant.funding_max:,.0f} {grant.currency or 'CAD'}"
+    amount = grant.funding_max or grant.funding_min
+    return f"{amount:,.0f} {grant.currency or 'CAD'}" if amount else None
+
+
+def _event(grant, lang, status=None):
+    status_key = (status.status, status.last_updated) if status is not None else None
+    key = (
+        grant.id, grant.updated_at, lang, status_key, request.host_url,
+        reference_version("organizations"),
+    )
+    cache = _caches()["events"]
+    event = cache.get(key)
+    if event is not None:
+        return event
+
+    details = []
+    if grant.organization:
+        details.append(grant.organization.name)
+    funding = _funding(grant)
+    if funding:
+        details.append(_("Funding: %(amount)s", amount=funding))
+    if status is not None:
+        details.append(_("Status: %(status)s", status=status.status or _("Not Started")))
+    url = url_for("grants.grant_detail", grant_id=grant.id, _external=True)
+    details.append(url)
+
+    event = render_event(
+        uid=f"grant-{grant.id}@{UID_DOMAIN}",
+        day=grant.deadline_date,
+        summary=_("Deadline: %(name)s", name=_name(grant, lang)),
+        description="\n".join(details),
+        url=url,
+        stamp=grant.updated_at,
+    )
+    cache.set(key, event)
+    return event
+
+
+def _feed_response(etag, name, build_events):
+    not_modified = _not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+
+    feeds = _caches()["feeds"]
+    body = feeds.get(etag)
+    if body is None:
+        ttl = max(1, current_app.config.get("PUBLIC_CACHE_MAX_AGE", 120) // 60)
+        body = render_calendar(name, build_events(), ttl)
+        feeds.set(etag, body)
+
+    response = Response(body, mimetype="text/calendar")
+    response.set_etag(etag)
+    return response
+
+
+def _feed_query(query):
+    return query.filter(
+        Grant.deadline_date.isnot(None),
+        Grant.deadline_date >= _window_start(),
+    )
+
+
+@bp.route("/deadlines.json")
+@public_cache()
+def deadlines_api():
+    """Grants with a deadline in [start, end], filtered like the list page."""
+    start = _parse_date(request.args.get("start")) or date.today()
+    default_days = current_app.config.get("CALENDAR_DEFAULT_DAYS", 90)
+    end = _parse_date(request.args.get("end")) or start + timedelta(days=default_days)
+    max_days = current_app.config.get("CALENDAR_MAX_DAYS", 366)
+    if end < start or (end - start).days > max_days:
+        return jsonify(error=f"end must be within {max_days} days after start"), 400
+
+    query = apply_filters(Grant.query, request.args).filter(
+        Grant.deadline_date.between(start, end)
+    )
+    lang = _lang()
+    count, latest = _grant_stamp(query)
+    etag = _etag("json", lang, start, end, count, latest, _filter_args())
+    not_modified = _not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+
+    limit = current_app.config.get("CALENDAR_API_LIMIT", 1000)
+    grants = (
+        query.options(joinedload(Grant.organization))
+        .order_by(Grant.deadline_date.asc(), Grant.id.asc())
+        .limit(limit)
+        .all()
+    )
+    response = jsonify(
+        start=start.isoformat(),
+        end=end.isoformat(),
+        total=count,
+        truncated=count > len(grants),
+        deadlines=[
+            {
+                "id": grant.id,
+                "name": _name(grant, lang),
+                "name_en": grant.name_en,
+                "name_fr": grant.name_fr,
+                "deadline_date": grant.deadline_date.isoformat(),
+                "organization": grant.organization.name if grant.organization else None,
+                "province": grant.province,
+                "category": grant.category,
+                "funding_min": grant.funding_min,
+                "funding_max": grant.funding_max,
+                "currency": grant.currency,
+                "url": url_for("grants.grant_detail", grant_id=grant.id, _external=True),
+            }
+            for grant in grants
+        ],
+    )
+    response.set_etag(etag)
+    return response
+
+
+@bp.route("/deadlines.ics")
+@public_cache()
+def filter_feed():
+    """iCalendar feed for any list-page filter combination."""
+    query = _feed_query(apply_filters(Grant.query, request.args))
+    lang = _lang()
+    count, latest = _grant_stamp(query)
+    etag = _etag("ics", lang, _window_start(), count, latest, _filter_args(), request.host_url)
+
+    def build_events():
+        grants = query.options(joinedload(Grant.organization)).order_by(
+            Grant.deadline_date.asc(), Grant.id.asc()
+        )
+        return [_event(grant, lang) for grant in grants.yield_per(500)]
+
+    return _feed_response(etag, _("Youreka grant deadlines"), build_events)
+
+
+@bp.route("/region/<int:region_id>.ics")
+@public_cache()
+def region_feed(region_id):
+    """iCalendar feed of the grants a region tracks (has a status row for)."""
+    region = get_region_or_404(region_id)
+    lang = _lang()
+
+    statuses = GrantStatus.query.filter(GrantStatus.region_id == region.id)
+    query = _feed_query(
+        Grant.query.join(GrantStatus, GrantStatus.grant_id == Grant.id).filter(
+            GrantStatus.region_id == region.id
+        )
+    )
+    count, latest = _grant_stamp(query)
+    status_count, status_latest = statuses.with_entities(
+        func.count(GrantStatus.id), func.max(GrantStatus.last_updated)
+    ).one()
+    etag = _etag(
+        "region", region.id, lang, _window_start(), count, latest,
+        status_count, status_latest, request.host_url,
+    )
+
+    def build_events():
+        rows = (
+            query.add_entity(GrantStatus)
+            .options(joinedload(Grant.organization))
+            .order_by(Grant.deadline_date.asc(), Grant.id.asc())
+        )
+        return [_event(grant, lang, status) for grant, status in rows.yield_per(500)]
+
+    region_name = region.name_fr if lang == "fr" and region.name_fr else region.name_en
+    return _feed_response(
+        etag, _("Youreka grant deadlines – %(region)s", region=region_name), build_events
+    )
+
+
+@bp.app_template_global()
+def calendar_feed_url(args=None, region_id=None):
+    """Feed URL for the current filters (or a region), for "Subscribe" links."""
+    if region_id:
+        return url_for("calendar.region_feed", region_id=region_id, _external=True)
+    params = {k: v for k, v in (args or {}).items() if v and k not in NON_FILTER_ARGS}
+    return url_for("calendar.filter_feed", _external=True, **params)
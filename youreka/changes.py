@@ -0,0 +1,247 @@
+"""
+Change log for catalogue sync.
+
+Every insert, update and delete of a Grant or GrantStatus is appended to
+change_events in the same transaction, and grants whose deadline passes
+get an "expire" event from the daily `flask expire-grants` job. The event
+id is a monotonic cursor: consumers keep the last one they saw and ask
+for what came after it (/api/changes?since=<cursor>, or the SSE stream),
+so a sync reads only the changes instead of the whole catalogue.
+
+ORM writes are picked up by a session listener. Paths that write with
+Core (CSV import, archive) call log_grant_writes() / log_grant_events()
+themselves.
+
+Events are queued on the session and only inserted when it commits.
+A transaction that stays open for minutes (a scraper flushes grants
+between rate-limited fetches and commits at the end) would otherwise hold
+low event ids that become visible after higher ids committed in the
+meantime, and a consumer already past them would never see its events.
+Written at commit, ids follow commit order; CHANGES_SETTLE_SECONDS only
+covers the moment between the insert and the COMMIT itself.
+"""
+
+from datetime import date, datetime, timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy import case, delete, event, exists, func, insert, literal, select
+
+from .extensions import db
+from .models import ChangeEvent, Grant, GrantStatus
+
+GRANT = "grant"
+GRANT_STATUS = "grant_status"
+ACTIONS = ("insert", "update", "delete", "expire", "archive", "restore")
+
+
+class CursorExpired(Exception):
+    """The requested cursor is older than the retained part of the log."""
+
+
+def _enabled():
+    return has_app_context() and current_app.config.get("CHANGE_LOG_ENABLED", True)
+
+
+def _event_row(obj, action, now):
+    if isinstance(obj, Grant):
+        return {
+            "entity": GRANT, "entity_id": obj.id, "action": action,
+            "grant_id": obj.id, "region_id": None, "created_at": now,
+        }
+    return {
+        "entity": GRANT_STATUS, "entity_id": obj.id, "action": action,
+        "grant_id": obj.grant_id, "region_id": obj.region_id, "created_at": now,
+    }
+
+
+def _pending(session):
+    """Events waiting for ``session`` to commit: row dicts, or callables(conn, now)."""
+    return session.info.setdefault("change_events", [])
+
+
+def _record_flush(session, flush_context):
+    if not _enabled():
+        return
+    rows = _pending(session)
+    for obj in session.new:
+        if isinstance(obj, (Grant, GrantStatus)):
+            rows.append(_event_row(obj, "insert", None))
+    for obj in session.dirty:
+        if isinstance(obj, (Grant, GrantStatus)) and session.is_modified(obj, include_collections=False):
+            rows.append(_event_row(obj, "update", None))
+    for obj in session.deleted:
+        if isinstance(obj, (Grant, GrantStatus)):
+            rows.append(_event_row(obj, "delete", None))
+
+
+def _write_pending(session):
+    # Flush first: objects still dirty now would otherwise be flushed by
+    # commit() after this listener, and their events lost
+    session.flush()
+    pending = session.info.pop("change_events", None)
+    if not pending:
+        return
+    conn, now = session.connection(), datetime.utcnow()
+    rows = []
+    for item in pending + [None]:
+        if isinstance(item, dict):
+            rows.append({**item, "created_at": now})
+            continue
+        if rows:
+            conn.execute(insert(ChangeEvent.__table__), rows)
+            rows = []
+        if item is not None:
+            item(conn, now)
+
+
+def _discard_pending(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop("change_events", None)
+
+
+def log_grant_writes(conn, stamp):
+    """
+    Record events, at commit, for grants written with Core whose
+    updated_at is ``stamp``: "insert" if created_at is also ``stamp``,
+    else "update". Returns the number of grants.
+    """
+    if not _enabled():
+        return 0
+    grants = Grant.__table__
+    written = select(grants.c.id).where(grants.c.updated_at == stamp)
+
+    def write(conn, now):
+        conn.execute(
+            insert(ChangeEvent.__table__).from_select(
+                ["entity", "entity_id", "action", "grant_id", "created_at"],
+                select(
+                    literal(GRANT),
+                    grants.c.id,
+                    case((grants.c.created_at == stamp, "insert"), else_="update"),
+                    grants.c.id,
+                    literal(now),
+                )
+                .where(grants.c.updated_at == stamp)
+                .order_by(grants.c.id),
+            )
+        )
+
+    _pending(db.session).append(write)
+    return conn.execute(select(func.count()).select_from(written.subquery())).scalar()
+
+
+def log_grant_events(conn, grant_ids, action):
+    """Record ``action``, at commit, for grants moved with Core (see youreka/archive.py)."""
+    if not _enabled() or not grant_ids:
+        return 0
+    _pending(db.session).extend(
+        {"entity": GRANT, "entity_id": i, "action": action, "grant_id": i, "region_id": None}
+        for i in grant_ids
+    )
+    return len(grant_ids)
+
+
+def log_bulk_inserts(conn, first_grant_id, first_status_id):
+    """
+    Record "insert" events on ``conn`` for grants and statuses with ids
+    from ``first_grant_id`` / ``first_status_id`` on. For bulk loads on
+    their own connection (the synthetic catalogue): call it last, just
+    before that transaction commits. Returns the number of events.
+    """
+    if not _enabled():
+        return 0
+    grants, statuses = Grant.__table__, GrantStatus.__table__
+    events = ChangeEvent.__table__
+    columns = ["entity", "entity_id", "action", "grant_id", "region_id", "created_at"]
+    now = literal(datetime.utcnow())
+    written = conn.execute(
+        insert(events).from_select(
+            columns,
+            select(literal(GRANT), grants.c.id, literal("insert"), grants.c.id, literal(None), now)
+            .where(grants.c.id >= first_grant_id)
+            .order_by(grants.c.id),
+        )
+    ).rowcount
+    written += conn.execute(
+        insert(events).from_select(
+            columns,
+            select(
+                literal(GRANT_STATUS), statuses.c.id, literal("insert"),
+                statuses.c.grant_id, statuses.c.region_id, now,
+            )
+            .where(statuses.c.id >= first_status_id)
+            .order_by(statuses.c.id),
+        )
+    ).rowcount
+    return written
+
+
+def record_expirations(today=None, lookback_days=None):
+    """
+    Add an "expire" event for each grant whose deadline has passed and
+    that has no expire event since its last update. Only deadlines within
+    the lookback window are considered. Returns the number of events.
+    """
+    today = today or date.today()
+    if lookback_days is None:
+        lookback_days = current_app.config.get("CHANGES_EXPIRE_LOOKBACK_DAYS", 30)
+    grants = Grant.__table__
+    events = ChangeEvent.__table__
+    already = exists().where(
+        events.c.entity == GRANT,
+        events.c.entity_id == grants.c.id,
+        events.c.action == "expire",
+        events.c.created_at >= grants.c.updated_at,
+    )
+    due = select(grants.c.id).where(
+        grants.c.deadline_date < today,
+        grants.c.deadline_date >= today - timedelta(days=lookback_days),
+        ~already,
+    )
+    conn = db.session.connection()
+    ids = conn.execute(due.order_by(grants.c.id)).scalars().all()
+    return log_grant_events(conn, ids, "expire")
+
+
+def prune_events(retention_days=None):
+    """Delete events older than the retention window. Returns rows deleted."""
+    if retention_days is None:
+        retention_days = current_app.config.get("CHANGES_RETENTION_DAYS", 90)
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    result = db.session.execute(delete(ChangeEvent.__table__).where(ChangeEvent.created_at < cutoff))
+    return result.rowcount
+
+
+def latest_cursor():
+    return db.session.execute(select(func.max(ChangeEvent.id))).scalar() or 0
+
+
+def events_since(cursor, limit):
+    """
+    Up to ``limit`` events after ``cursor``, oldest first, plus whether more
+    are waiting. Events are inserted at commit (see the module docstring);
+    the ones younger than CHANGES_SETTLE_SECONDS are still held back so a
+    commit that got a lower id but finished a moment later isn't skipped.
+    """
+    oldest = db.session.execute(select(func.min(ChangeEvent.id))).scalar()
+    if oldest is not None and cursor < oldest - 1:
+        raise CursorExpired(cursor)
+
+    settle = current_app.config.get("CHANGES_SETTLE_SECONDS", 2)
+    rows = (
+        ChangeEvent.query.filter(
+            ChangeEvent.id > cursor,
+            ChangeEvent.created_at <= datetime.utcnow() - timedelta(seconds=settle),
+        )
+        .order_by(ChangeEvent.id)
+        .limit(limit + 1)
+        .all()
+    )
+    return rows[:limit], len(rows) > limit
+
+
+def init_change_log(app):
+    if not event.contains(db.session, "after_flush", _record_flush):
+        event.listen(db.session, "after_flush", _record_flush)
+        event.listen(db.session, "before_commit", _write_pending)
+        event.listen(db.session, "after_soft_rollback", _discard_pending)
@@ -0,0 +1,118 @@
+"""
+On-the-fly gzip / brotli compression for dynamic responses.
+
+Works for normal and streamed responses: streamed chunks are compressed
+and flushed one by one, so the client still receives the page
+progressively. Responses that already carry a Content-Encoding (the
+precompressed /assets/ files) are left alone.
+"""
+
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only without it
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    "text/html",
+    "text/css",
+    "text/plain",
+    "text/calendar",
+    "text/event-stream",
+    "application/json",
+    "application/javascript",
+    "image/svg+xml",
+}
+
+
+def _choose_encoding():
+    if brotli is not None and request.accept_encodings["br"] > 0:
+        return "br"
+    if request.accept_encodings["gzip"] > 0:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding, level):
+        self.encoding = encoding
+        if encoding == "br":
+            # Low quality keeps on-the-fly brotli cheap
+            self.obj = brotli.Compressor(quality=min(level, 5))
+        else:
+            self.obj = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 = gzip container
+
+    def compress(self, data):
+        if self.encoding == "br":
+            return self.obj.process(data)
+        return self.obj.compress(data)
+
+    def flush(self):
+        if self.encoding == "br":
+            return self.obj.flush()
+        return self.obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == "br":
+            return self.obj.finish()
+        return self.obj.flush(zlib.Z_FINISH)
+
+
+def _compress_stream(chunks, compressor):
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            if not chunk:
+                continue
+            # Flush after every chunk so progressive rendering still works
+            yield compressor.compress(chunk) + compressor.flush()
+        yield compressor.finish()
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+
+def init_compression(app):
+    if not app.config.get("COMPRESSION_ENABLED", True):
+        return
+    min_size = app.config.get("COMPRESSION_MIN_SIZE", 500)
+    level = app.config.get("COMPRESSION_LEVEL", 6)
+
+    @app.after_request
+    def compress_response(response):
+        if (
+            request.method == "HEAD"
+            or response.status_code < 200
+            or response.status_code in (204, 304)
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        ):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = _choose_encoding()
+        if encoding is None:
+            return response
+
+        compressor = _Compressor(encoding, level)
+        if response.is_streamed:
+            response.response = _compress_stream(response.response, compressor)
+            response.headers.pop("Content-Length", None)
+        else:
+            data = response.get_data()
+            if len(data) < min_size:
+                return response
+            response.set_data(compressor.compress(data) + compressor.finish())
+
+        response.headers["Content-Encoding"] = encoding
+        # A strong validator of the uncompressed body no longer matches
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,396 @@
+"""
+Near-duplicate grant detection with MinHash + locality-sensitive hashing.
+
+The same program is often stored several times (OTF page, Ontario
+government listing, CSV import) under different external_ids. Each grant
+gets a MinHash signature of its normalized name/description word
+shingles; the signature is cut into bands and every band is hashed into
+a bucket (grant_lsh_buckets). Only grants sharing a bucket are compared,
+so finding the duplicates of a new grant costs a few indexed lookups
+instead of a scan of the whole table. Candidates are then verified with
+the exact Jaccard similarity of their shingle sets.
+
+Matching grants share a ``cluster_id`` (the lowest grant id in the
+cluster); a grant without duplicates has none. The list page shows one
+grant per cluster. When a re-ingested grant stops matching its cluster,
+the members left behind are re-verified against each other and split
+(or unclustered) as needed.
+
+    flask --app app dedup-grants            # (re)build all clusters
+"""
+
+import hashlib
+import random
+import re
+import struct
+import unicodedata
+import zlib
+from collections import Counter
+
+from sqlalchemy import bindparam, delete, func, select, update
+from sqlalchemy.orm import aliased
+
+from .bulk import bulk_insert
+from .extensions import db
+from .models import Grant, GrantLSHBucket
+
+NUM_PERM = 64
+BANDS = 16           # 16 bands x 4 rows: candidates from ~0.5 similarity
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3     # words per shingle
+DEFAULT_THRESHOLD = 0.75
+CHUNK_SIZE = 500
+# Buckets shared by more grants than this are boilerplate (same template
+# text everywhere) rather than evidence of duplication; they are skipped
+# so one hot bucket can't make a chunk quadratic.
+MAX_BUCKET_SIZE = 200
+SHINGLE_CACHE_SIZE = 50000  # grants whose shingles are kept across chunks
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_rng = random.Random(1)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+STOPWORDS = {
+    "a", "an", "and", "for", "in", "of", "on", "or", "the", "to", "with",
+    "au", "aux", "de", "des", "du", "en", "et", "la", "le", "les", "pour", "un", "une",
+}
+
+
+def normalize_text(text):
+    """Lower-case, strip accents and punctuation, drop stopwords."""
+    # NFKD splits accents off their letters; the ASCII encode drops them
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode().lower()
+    return [w for w in re.findall(r"[a-z0-9]+", text) if w not in STOPWORDS]
+
+
+def shingles(words, size=SHINGLE_SIZE):
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def grant_shingles(name_en, name_fr=None, description_en=None, description_fr=None):
+    """
+    Shingles a grant is compared on (English preferred, French as fallback):
+    word 3-grams of name + description, plus the name's words on their own
+    so that "Youth ... Grant" vs "Family ... Grant" with the same boilerplate
+    description don't look identical.
+    """
+    name = normalize_text(name_en or name_fr)
+    words = name + normalize_text(description_en or description_fr)
+    return shingles(words) | {f"name:{w}" for w in name}
+
+
+def minhash(shingle_set):
+    """MinHash signature (NUM_PERM 32-bit ints) of a set of strings."""
+    if not shingle_set:
+        return None
+    hashes = [zlib.crc32(s.encode("utf-8")) for s in shingle_set]
+    return [
+        min(((a * h + b) % _PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def band_buckets(signature):
+    """One bucket key per band; the band number is hashed in, so keys are global."""
+    keys = []
+    for band in range(BANDS):
+        chunk = signature[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(struct.pack(f"<I{ROWS}I", band, *chunk), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, "big") >> 1)  # fits a signed BIGINT
+    return keys
+
+
+def jaccard(a, b):
+    """Exact Jaccard similarity of two shingle sets (used to verify candidates)."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class _Clusters:
+    """Union-find whose root is always the smallest id."""
+
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        parent = self.parent.setdefault(x, x)
+        if parent != x:
+            parent = self.parent[x] = self.find(parent)
+        return parent
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _assign_chunk(conn, ids, threshold, stats, shingle_cache):
+    grants = Grant.__table__
+    buckets = GrantLSHBucket.__table__
+
+    text_columns = (
+        grants.c.name_en, grants.c.name_fr, grants.c.description_en, grants.c.description_fr,
+    )
+    rows = conn.execute(select(grants.c.id, *text_columns).where(grants.c.id.in_(ids))).all()
+
+    shingle_sets, keys = {}, {}
+    for row in rows:
+        shingle_sets[row.id] = shingle_cache[row.id] = grant_shingles(*row[1:])
+        sig = minhash(shingle_sets[row.id])
+        if sig is not None:
+            keys[row.id] = band_buckets(sig)
+
+    conn.execute(delete(buckets).where(buckets.c.grant_id.in_(ids)))
+    bulk_insert(conn, buckets, [
+        {"bucket": key, "grant_id": grant_id}
+        for grant_id, grant_keys in keys.items()
+        for key in set(grant_keys)
+    ])
+
+    # Everything sharing a bucket with this chunk
+    all_keys = list({k for grant_keys in keys.values() for k in grant_keys})
+    members = {}
+    for key_chunk in _chunks(all_keys, 5000):
+        for bucket, grant_id in conn.execute(
+            select(buckets.c.bucket, buckets.c.grant_id).where(buckets.c.bucket.in_(key_chunk))
+        ):
+            members.setdefault(bucket, set()).add(grant_id)
+
+    hot = {k for k, ids_in_bucket in members.items() if len(ids_in_bucket) > MAX_BUCKET_SIZE}
+    stats["hot_buckets"] += len(hot)
+    candidates = {
+        grant_id: set().union(*(members[k] for k in grant_keys if k in members and k not in hot))
+        - {grant_id}
+        for grant_id, grant_keys in keys.items()
+    }
+    others = set().union(*candidates.values()) - set(shingle_sets) if candidates else set()
+
+    # Candidates outside the chunk: current cluster, and text to verify
+    # against unless an earlier chunk of this run already shingled it
+    current = {}
+    for id_chunk in _chunks(sorted(others), 1000):
+        for row in conn.execute(
+            select(grants.c.id, grants.c.cluster_id).where(grants.c.id.in_(id_chunk))
+        ):
+            current[row.id] = row.cluster_id
+    missing = sorted(i for i in others if i not in shingle_cache)
+    for id_chunk in _chunks(missing, 1000):
+        for row in conn.execute(select(grants.c.id, *text_columns).where(grants.c.id.in_(id_chunk))):
+            shingle_cache[row.id] = grant_shingles(*row[1:])
+    for other in others:
+        shingle_sets[other] = shingle_cache.get(other)
+
+    clusters = _Clusters()
+    for grant_id in ids:
+        clusters.find(grant_id)
+    # Existing clusters stay together; a match with one member joins them all.
+    # Clusters rooted at a chunk grant are left out: that grant is being
+    # re-checked and may have left (see _recluster below).
+    chunk_ids = set(ids)
+    for other, cluster_id in current.items():
+        if cluster_id and cluster_id not in chunk_ids:
+            clusters.union(other, cluster_id)
+    for grant_id, cands in candidates.items():
+        for other in cands:
+            if other in clusters.parent and clusters.find(other) == clusters.find(grant_id):
+                continue  # already joined through another match
+            stats["compared"] += 1
+            if jaccard(shingle_sets[grant_id], shingle_sets.get(other)) >= threshold:
+                stats["matches"] += 1
+                clusters.union(grant_id, other)
+
+    # Write back cluster ids for the chunk (none for grants that matched
+    # nothing), then re-point any existing cluster that was merged into a
+    # smaller one. updated_at is kept as-is: clustering is not a content change.
+    previous = dict(conn.execute(select(grants.c.id, grants.c.cluster_id).where(grants.c.id.in_(ids))).all())
+    sizes = Counter(clusters.find(node) for node in clusters.parent)
+    assigned = {
+        grant_id: clusters.find(grant_id) if sizes[clusters.find(grant_id)] > 1 else None
+        for grant_id in ids
+    }
+    conn.execute(
+        update(grants)
+        .where(grants.c.id == bindparam("b_id"))
+        .values(cluster_id=bindparam("cluster_id"), updated_at=grants.c.updated_at),
+        [{"b_id": grant_id, "cluster_id": cluster_id} for grant_id, cluster_id in assigned.items()],
+    )
+
+    # Existing clusters that joined a smaller root, and unclustered grants matched now
+    moved_clusters, moved_grants = {}, {}
+    # Clusters to re-check pairwise afterwards (see _recluster)
+    affected = set()
+    for grant_id in ids:
+        if clusters.find(grant_id) != grant_id:
+            moved_clusters[grant_id] = clusters.find(grant_id)
+    for other, cluster_id in current.items():
+        root = clusters.find(other)
+        if cluster_id in chunk_ids:
+            if root != cluster_id:
+                affected.update((cluster_id, root))
+            continue
+        if cluster_id is None and sizes[root] > 1:
+            moved_grants[other] = root
+        elif cluster_id is not None and cluster_id != root:
+            moved_clusters[cluster_id] = root
+
+    if moved_clusters:
+        conn.execute(
+            update(grants)
+            .where(grants.c.cluster_id == bindparam("old"))
+            .values(cluster_id=bindparam("root"), updated_at=grants.c.updated_at),
+            [{"old": old, "root": root} for old, root in moved_clusters.items()],
+        )
+    if moved_grants:
+        conn.execute(
+            update(grants)
+            .where(grants.c.id == bindparam("b_id"))
+            .values(cluster_id=bindparam("root"), updated_at=grants.c.updated_at),
+            [{"b_id": grant_id, "root": root} for grant_id, root in moved_grants.items()],
+        )
+
+    # A chunk grant that left its cluster may have been what held it
+    # together (or its root): re-check the old and new clusters involved
+    for grant_id, cluster_id in previous.items():
+        if cluster_id is not None and assigned[grant_id] != cluster_id:
+            affected.add(cluster_id)
+            if assigned[grant_id] is not None:
+                affected.add(assigned[grant_id])
+    if affected:
+        _recluster(conn, sorted(affected), threshold, stats, shingle_cache)
+
+
+def _recluster(conn, cluster_ids, threshold, stats, shingle_cache):
+    """Re-verify the members of ``cluster_ids`` pairwise and regroup them into connected parts."""
+    grants = Grant.__table__
+    text_columns = (
+        grants.c.name_en, grants.c.name_fr, grants.c.description_en, grants.c.description_fr,
+    )
+    rows = conn.execute(
+        select(grants.c.id, grants.c.cluster_id, *text_columns)
+        .where(grants.c.cluster_id.in_(cluster_ids))
+        .order_by(grants.c.id)
+    ).all()
+    members = [row.id for row in rows]
+    current = {row.id: row.cluster_id for row in rows}
+    for row in rows:
+        if row.id not in shingle_cache:
+            shingle_cache[row.id] = grant_shingles(*row[2:])
+
+    clusters = _Clusters()
+    for i, grant_id in enumerate(members):
+        clusters.find(grant_id)
+        for other in members[:i]:
+            if clusters.find(other) == clusters.find(grant_id):
+                continue
+            stats["compared"] += 1
+            if jaccard(shingle_cache[grant_id], shingle_cache[other]) >= threshold:
+                clusters.union(grant_id, other)
+
+    sizes = Counter(clusters.find(grant_id) for grant_id in members)
+    changes = []
+    for grant_id in members:
+        root = clusters.find(grant_id)
+        new = root if sizes[root] > 1 else None
+        if new != current[grant_id]:
+            changes.append({"b_id": grant_id, "cluster_id": new})
+    if changes:
+        conn.execute(
+            update(grants)
+            .where(grants.c.id == bindparam("b_id"))
+            .values(cluster_id=bindparam("cluster_id"), updated_at=grants.c.updated_at),
+            changes,
+        )
+
+
+def assign_clusters(grant_ids, threshold=None, chunk_size=CHUNK_SIZE):
+    """
+    (Re)compute LSH buckets for ``grant_ids`` and attach them to the clusters
+    of their near-duplicates. Runs in the current session's transaction;
+    the caller commits. Returns counts of comparisons and matches.
+    """
+    from flask import current_app
+
+    if threshold is None:
+        threshold = current_app.config.get("DEDUP_THRESHOLD", DEFAULT_THRESHOLD)
+    stats = {"grants": 0, "compared": 0, "matches": 0, "hot_buckets": 0}
+    conn = db.session.connection()
+    shingle_cache = {}
+    for chunk in _chunks(sorted(set(grant_ids)), chunk_size):
+        if len(shingle_cache) > SHINGLE_CACHE_SIZE:
+            shingle_cache.clear()
+        _assign_chunk(conn, chunk, threshold, stats, shingle_cache)
+        stats["grants"] += len(chunk)
+    return stats
+
+
+def recluster(cluster_ids, threshold=None):
+    """
+    Re-verify clusters that lost members (e.g. to the archive): they are
+    re-rooted on their lowest live id, split, or dissolved. Runs in the
+    current session's transaction; the caller commits.
+    """
+    from flask import current_app
+
+    cluster_ids = sorted(set(cluster_ids) - {None})
+    stats = {"grants": 0, "compared": 0, "matches": 0, "hot_buckets": 0}
+    if not cluster_ids:
+        return stats
+    if threshold is None:
+        threshold = current_app.config.get("DEDUP_THRESHOLD", DEFAULT_THRESHOLD)
+    conn = db.session.connection()
+    for chunk in _chunks(cluster_ids, 1000):
+        _recluster(conn, chunk, threshold, stats, {})
+    return stats
+
+
+def dangling_clusters():
+    """Live grants whose cluster_id isn't a live grant (should always be 0)."""
+    roots = aliased(Grant)
+    return (
+        db.session.query(func.count(Grant.id))
+        .outerjoin(roots, roots.id == Grant.cluster_id)
+        .filter(Grant.cluster_id.isnot(None), roots.id.is_(None))
+        .scalar()
+    )
+
+
+def rebuild_clusters(threshold=None, chunk_size=CHUNK_SIZE, verbose=False):
+    """Drop all buckets and clusters and recompute them for every grant."""
+    grants = Grant.__table__
+    conn = db.session.connection()
+    conn.execute(delete(GrantLSHBucket.__table__))
+    conn.execute(
+        update(grants).values(cluster_id=None, updated_at=grants.c.updated_at)
+    )
+    ids = [row[0] for row in conn.execute(select(grants.c.id).order_by(grants.c.id))]
+
+    stats = {"grants": 0, "compared": 0, "matches": 0, "hot_buckets": 0}
+    for chunk in _chunks(ids, chunk_size * 20):
+        chunk_stats = assign_clusters(chunk, threshold=threshold, chunk_size=chunk_size)
+        for key in stats:
+            stats[key] += chunk_stats[key]
+        if verbose:
+            print(f"  {stats['grants']:>10} grants, {stats['matches']} matches")
+    return stats
+
+
+def cluster_sizes(limit=20):
+    """Largest clusters as (cluster_id, size) pairs, for reporting."""
+    return (
+        db.session.query(Grant.cluster_id, db.func.count(Grant.id))
+        .filter(Grant.cluster_id.isnot(None))
+        .group_by(Grant.cluster_id)
+        .having(db.func.count(Grant.id) > 1)
+        .order_by(db.func.count(Grant.id).desc())
+        .limit(limit)
+        .all()
+    )
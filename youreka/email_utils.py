@@ -1,7 +1,7 @@
-from datetime import date, timedelta
-from flask import current_app
+from datetime import date, datetime, timedelta
+from flask import current_app, url_for
 from .extensions import db
-from .models import Grant, GrantStatus, Region
+from .models import Grant, GrantStatus, Region, SavedSearch, SearchNotification
 
 
 def get_upcoming_deadlines(days_ahead=7):
@@ -38,6 +38,59 @@ def send_deadline_reminders():
     print("Stub: integrate with email service here.")
 
 
-# This helper can be wired into a cron job by running:
+def send_search_digests(batch_size=None):
+    """
+    Stub: send one digest per email address with the new grants matching
+    their saved searches, then mark those notifications as sent.
+    Works through the queue in batches so a big ingest doesn't hold
+    thousands of rows in memory. Returns (emails, notifications) sent.
+    """
+    batch_size = batch_size or current_app.config.get("SEARCH_DIGEST_BATCH_SIZE", 500)
+    base_url = current_app.config.get("PORTAL_BASE_URL", "http://localhost:5000")
+    emails = sent = 0
+
+    while True:
+        batch = (
+            SearchNotification.query.join(SavedSearch)
+            .filter(SearchNotification.sent_at.is_(None), SavedSearch.is_active.is_(True))
+            .order_by(SavedSearch.email, SearchNotification.saved_search_id, SearchNotification.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+
+        digests = {}
+        for notice in batch:
+            digests.setdefault(notice.saved_search.email, []).append(notice)
+
+        now = datetime.utcnow()
+        with current_app.test_request_context(base_url=base_url):
+            for email, notices in digests.items():
+                print(f"To: {email} — {len(notices)} new matching grant(s)")
+                for notice in notices:
+                    search = notice.saved_search
+                    link = url_for(
+                        "grants.grant_detail", grant_id=notice.grant_id, lang_code=search.lang, _external=True
+                    )
+                    print(f"  [{search.name or search.query_string or 'all grants'}] {notice.grant.name_en} {link}")
+                    notice.sent_at = now
+                    search.last_notified_at = now
+                for search in {notice.saved_search for notice in notices}:
+                    unsubscribe = url_for(
+                        "grants.unsubscribe_search", token=search.token, lang_code=search.lang, _external=True
+                    )
+                    print(f"  Unsubscribe from \"{search.name or search.query_string or 'all grants'}\": {unsubscribe}")
+                emails += 1
+        sent += len(batch)
+        db.session.commit()
+
+    if sent:
+        print("Stub: integrate with email service here.")
+    return emails, sent
+
+
+# These helpers can be wired into a cron job by running:
 #   flask send-reminders
-# See __init__.py where the CLI command is registered.
+#   flask send-search-notifications
+# See __init__.py where the CLI commands are registered.
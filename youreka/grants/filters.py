@@ -0,0 +1,188 @@
+"""
+Grant search filters shared by the list page, the deadline API, the
+calendar feeds and saved searches.
+
+parse_filters() normalizes query params once; apply_filters() turns them
+into SQL (on a Grant query or a select(), so the async API shares them)
+and grant_matches() evaluates them against a single grant.
+"""
+
+from datetime import date
+
+from sqlalchemy import func, select
+
+from ..models import Grant, GrantStatus
+
+# Province abbreviations (as used on Region.province) -> Grant.province names
+PROVINCE_NAMES = {
+    "ON": "Ontario",
+    "BC": "British Columbia",
+    "AB": "Alberta",
+    "QC": "Quebec",
+    "MB": "Manitoba",
+    "SK": "Saskatchewan",
+    "NS": "Nova Scotia",
+    "NB": "New Brunswick",
+    "PE": "Prince Edward Island",
+    "NL": "Newfoundland and Labrador",
+}
+
+
+def parse_filters(args):
+    """
+    Normalize list-page query params into a filter dict.
+    - Empty / 'Any' values are ignored (left out of the dict)
+    - Province supports 'ON' or 'Ontario' etc. (case-insensitive, partial)
+    - 'Grant type = both' is treated as 'any'
+
+    `args` is a MultiDict of query params (request.args for the list page,
+    the feed URL's params for calendar feeds, a saved search's query).
+    """
+    filters = {}
+
+    region_id = args.get("region_id", default=None, type=int)
+    if region_id:
+        filters["region_id"] = region_id
+
+    province = (args.get("province") or "").strip()
+    if province:
+        # Map common province abbreviations to full names
+        full = PROVINCE_NAMES.get(province.upper())
+        if full:
+            filters["province"] = full.lower()
+        else:
+            # Fallback: partial match (typing "Ont" will match "Ontario")
+            filters["province_contains"] = province.lower()
+
+    if args.get("ngo_only") == "true":
+        filters["ngo_only"] = True
+
+    min_amount = args.get("min_amount", type=float)
+    if min_amount is not None:
+        filters["min_amount"] = min_amount
+    max_amount = args.get("max_amount", type=float)
+    if max_amount is not None:
+        filters["max_amount"] = max_amount
+
+    for field in ("category", "language", "team_scope", "individual_type"):
+        value = (args.get(field) or "").strip()
+        if value:
+            filters[field] = value
+    # Treat "both" as "any" so we don't accidentally filter out everything
+    if filters.get("individual_type") == "both":
+        del filters["individual_type"]
+
+    deadline_before = (args.get("deadline_before") or "").strip()
+    if deadline_before:
+        try:
+            year, month, day = map(int, deadline_before.split("-"))
+            filters["deadline_before"] = date(year, month, day)
+        except ValueError:
+            # Ignore bad date input
+            pass
+
+    return filters
+
+
+def apply_filters(query, args, model=Grant):
+    """
+    Apply the list-page filters in ``args`` (see parse_filters) to a Grant
+    query. ``model`` is the Grant entity queried (e.g. archive.ArchivedGrant).
+    """
+    filters = parse_filters(args)
+
+    if "region_id" in filters:
+        # Only show grants that have a status row for that region
+        query = query.join(GrantStatus, GrantStatus.grant_id == model.id).filter(
+            GrantStatus.region_id == filters["region_id"]
+        )
+
+    if "province" in filters:
+        # Exact match on full name, case-insensitive
+        query = query.filter(func.lower(model.province) == filters["province"])
+    elif "province_contains" in filters:
+        query = query.filter(func.lower(model.province).like(f"%{filters['province_contains']}%"))
+
+    if filters.get("ngo_only"):
+        query = query.filter(model.is_ngo_only.is_(True))
+
+    if "min_amount" in filters:
+        # Only apply to grants where funding_max is set
+        query = query.filter(
+            model.funding_max.isnot(None),
+            model.funding_max >= filters["min_amount"],
+        )
+
+    if "max_amount" in filters:
+        query = query.filter(
+            model.funding_min.isnot(None),
+            model.funding_min <= filters["max_amount"],
+        )
+
+    for field in ("category", "language", "team_scope", "individual_type"):
+        if field in filters:
+            query = query.filter(getattr(model, field) == filters[field])
+
+    if "deadline_before" in filters:
+        query = query.filter(
+            model.deadline_date.isnot(None),
+            model.deadline_date <= filters["deadline_before"],
+        )
+
+    return query
+
+
+def grant_matches(grant, filters, region_ids=()):
+    """
+    Python twin of apply_filters for a single grant: does ``grant`` pass
+    the parsed ``filters``? ``region_ids`` are the regions with a status
+    row for the grant. Keep in sync with apply_filters.
+    """
+    if "region_id" in filters and filters["region_id"] not in region_ids:
+        return False
+
+    province = (grant.province or "").lower()
+    if "province" in filters and province != filters["province"]:
+        return False
+    if "province_contains" in filters and (
+        not grant.province or filters["province_contains"] not in province
+    ):
+        return False
+
+    if filters.get("ngo_only") and grant.is_ngo_only is not True:
+        return False
+
+    if "min_amount" in filters and (
+        grant.funding_max is None or grant.funding_max < filters["min_amount"]
+    ):
+        return False
+    if "max_amount" in filters and (
+        grant.funding_min is None or grant.funding_min > filters["max_amount"]
+    ):
+        return False
+
+    for field in ("category", "language", "team_scope", "individual_type"):
+        if field in filters and getattr(grant, field) != filters[field]:
+            return False
+
+    if "deadline_before" in filters and (
+        grant.deadline_date is None or grant.deadline_date > filters["deadline_before"]
+    ):
+        return False
+
+    return True
+
+
+def collapse_duplicates(query, args):
+    """
+    Keep one grant per near-duplicate cluster (the lowest id among the
+    grants that pass the filters). ``?show_duplicates=1`` turns it off.
+    Works on Grant queries and select() statements alike.
+    """
+    if args.get("show_duplicates"):
+        return query
+    representatives = (
+        apply_filters(select(func.min(Grant.id)).select_from(Grant), args)
+        .group_by(func.coalesce(Grant.cluster_id, Grant.id))
+    )
+    return query.filter(Grant.id.in_(representatives.scalar_subquery()))
@@ -1,138 +1,74 @@
 from . import bp
-from datetime import date
-from flask import render_template, request, redirect, url_for, flash
+from datetime import date, datetime, timedelta
+import re
+from flask import abort, current_app, g, render_template, request, redirect, url_for, flash
 from flask_babel import gettext as _
+from ..archive import ArchivedGrant, archived_grant, restore_grants
 from ..extensions import db
-from ..models import Grant, GrantStatus, Region
-from sqlalchemy import func
-
-def _apply_filters(query):
-    """
-    Apply multi-filter search logic based on query params.
-    - Empty / 'Any' values are ignored
-    - Province supports 'ON' or 'Ontario' etc. (case-insensitive, partial)
-    - 'Grant type = both' is treated as 'any'
-    """
-    args = request.args
-
-    # ---- Normalize inputs ----
-    region_id = args.get("region_id", default=None, type=int)
-
-    province_raw = (args.get("province") or "").strip()
-    province = province_raw or None
-
-    ngo_only = args.get("ngo_only")  # "true" or None
-    min_amount = args.get("min_amount", type=float)
-    max_amount = args.get("max_amount", type=float)
-
-    category = (args.get("category") or "").strip() or None
-
-    language = (args.get("language") or "").strip() or None
-    if language == "":
-        language = None
-
-    team_scope = (args.get("team_scope") or "").strip() or None
-
-    individual_type = (args.get("individual_type") or "").strip() or None
-    # Treat "both" as "any" so we don't accidentally filter out everything
-    if individual_type == "both":
-        individual_type = None
-
-    deadline_before_raw = (args.get("deadline_before") or "").strip() or None
-
-    # ---- Apply filters only when values are meaningful ----
-
-    if region_id:
-        # Only show grants that have a status row for that region
-        query = query.join(GrantStatus, GrantStatus.grant_id == Grant.id).filter(
-            GrantStatus.region_id == region_id
-        )
-
-    if province:
-        # Map common province abbreviations to full names
-        prov_map = {
-            "ON": "Ontario",
-            "BC": "British Columbia",
-            "AB": "Alberta",
-            "QC": "Quebec",
-            "MB": "Manitoba",
-            "SK": "Saskatchewan",
-            "NS": "Nova Scotia",
-            "NB": "New Brunswick",
-            "PE": "Prince Edward Island",
-            "NL": "Newfoundland and Labrador",
-        }
-        abbrev = province.upper()
-        full = prov_map.get(abbrev)
-
-        if full:
-            # Exact match on full name, case-insensitive
-            query = query.filter(func.lower(Grant.province) == full.lower())
-        else:
-            # Fallback: partial match (typing "Ont" will match "Ontario")
-            like_pattern = f"%{province.lower()}%"
-            query = query.filter(func.lower(Grant.province).like(like_pattern))
-
-    if ngo_only == "true":
-        query = query.filter(Grant.is_ngo_only.is_(True))
-
-    if min_amount is not None:
-        # Only apply to grants where funding_max is set
-        query = query.filter(
-            Grant.funding_max.isnot(None),
-            Grant.funding_max >= min_amount,
-        )
-
-    if max_amount is not None:
-        query = query.filter(
-            Grant.funding_min.isnot(None),
-            Grant.funding_min <= max_amount,
-        )
-
-    if category:
-        query = query.filter(Grant.category == category)
-
-    if language:
-        query = query.filter(Grant.language == language)
-
-    if team_scope:
-        query = query.filter(Grant.team_scope == team_scope)
-
-    if individual_type:
-        query = query.filter(Grant.individual_type == individual_type)
-
-    if deadline_before_raw:
-        try:
-            year, month, day = map(int, deadline_before_raw.split("-"))
-            cutoff = date(year, month, day)
-            query = query.filter(
-                Grant.deadline_date.isnot(None),
-                Grant.deadline_date <= cutoff,
-            )
-        except ValueError:
-            # Ignore bad date input
-            pass
-
-    return query
+from ..http_cache import private_cache, public_cache
+from ..streaming import stream_page
+from ..models import STATUSES, Grant, GrantStatus, SavedSearch, archived_grants
+from ..recommendations import recommendations_for
+from ..reference import active_regions, get_region, get_region_or_404
+from ..revisions import grant_version, grant_versions
+from ..saved_searches import create_saved_search, queue_matches
+from ..status_history import grant_history, region_movements, region_timeline, transition_counts
+from .filters import apply_filters, collapse_duplicates
+from sqlalchemy.orm import joinedload, selectinload
+from urllib.parse import parse_qsl
+from werkzeug.datastructures import MultiDict
+
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
 
 @bp.route("/")
+@public_cache()
 def index():
     # Base query
     query = Grant.query
 
     # Apply filters
-    query = _apply_filters(query)
+    query = apply_filters(query, request.args)
+    if current_app.config.get("DEDUP_COLLAPSE_LIST"):
+        query = collapse_duplicates(query, request.args)
 
     # Sort by deadline (nulls last)
-    grants = query.order_by(Grant.deadline_date.is_(None), Grant.deadline_date.asc()).all()
+    query = query.options(joinedload(Grant.organization)).order_by(
+        Grant.deadline_date.is_(None), Grant.deadline_date.asc()
+    )
 
-    regions = Region.query.filter_by(is_active=True).all()
+    # Archived grants only on request (?archived=1), after the live ones
+    archived = None
+    if request.args.get("archived"):
+        archived = (
+            apply_filters(db.session.query(ArchivedGrant), request.args, model=ArchivedGrant)
+            .options(selectinload(ArchivedGrant.organization))
+            .order_by(ArchivedGrant.deadline_date.desc())
+            .limit(current_app.config.get("ARCHIVE_SEARCH_LIMIT", 200))
+        )
+
+    regions = active_regions()
 
     current_date = date.today()
 
+    if current_app.config.get("STREAM_LIST_PAGE"):
+        # Header + filters go out immediately; cards stream from a
+        # server-side cursor and the result count is filled in at the end.
+        return stream_page(
+            "grants/list.html",
+            grants=query.yield_per(200),
+            grant_count=None,
+            archived=archived,
+            regions=regions,
+            current_date=current_date,
+            filters=request.args,
+        )
+
+    grants = query.all()
     return render_template(
         "grants/list.html",
         grants=grants,
+        grant_count=len(grants),
+        archived=archived.all() if archived is not None else None,
         regions=regions,
         current_date=current_date,
         filters=request.args,
@@ -140,9 +76,19 @@ def index():
 
 
 @bp.route("/grant/<int:grant_id>", methods=["GET", "POST"])
+@public_cache()
 def grant_detail(grant_id):
-    grant = Grant.query.get_or_404(grant_id)
-    regions = Region.query.filter_by(is_active=True).all()
+    grant = db.session.get(Grant, grant_id)
+    is_archived = False
+    if grant is None:
+        # Tracking an archived grant brings it back into the live table
+        if request.method == "POST" and restore_grants(archived_grants.c.id == grant_id):
+            grant = db.session.get(Grant, grant_id)
+        else:
+            grant, is_archived = archived_grant(grant_id), True
+        if grant is None:
+            abort(404)
+    regions = active_regions()
 
     # Region-specific status handling
     selected_region_id = request.args.get("region_id", type=int)
@@ -150,7 +96,10 @@ def grant_detail(grant_id):
     status_record = None
 
     if selected_region_id:
-        region = Region.query.get(selected_region_id)
+        # A region's status is edited here (and redirected back to), so a
+        # shared cache must not serve the pre-edit page
+        private_cache()
+        region = get_region(selected_region_id)
         if region:
             status_record = GrantStatus.query.filter_by(
                 grant_id=grant.id, region_id=region.id
@@ -166,14 +115,20 @@ def grant_detail(grant_id):
             return redirect(
                 url_for("grants.grant_detail", grant_id=grant.id, region_id=selected_region_id)
             )
+        if status not in STATUSES:
+            flash(_("Please choose a valid status."), "warning")
+            return redirect(
+                url_for("grants.grant_detail", grant_id=grant.id, region_id=region_id)
+            )
 
-        region = Region.query.get_or_404(region_id)
+        region = get_region_or_404(region_id)
 
         status_record = GrantStatus.query.filter_by(
             grant_id=grant.id, region_id=region.id
         ).first()
 
-        if not status_record:
+        tracked = status_record is None
+        if tracked:
             status_record = GrantStatus(
                 grant_id=grant.id,
                 region_id=region.id,
@@ -182,6 +137,9 @@ def grant_detail(grant_id):
 
         status_record.status = status
         status_record.notes = notes
+        if tracked and current_app.config.get("SAVED_SEARCHES_ENABLED", True):
+            # Saved searches filtered on this region can match the grant now
+            queue_matches([grant.id], region_id=region.id)
         db.session.commit()
         flash(_("Status updated successfully."), "success")
 
@@ -189,6 +147,19 @@ def grant_detail(grant_id):
             url_for("grants.grant_detail", grant_id=grant.id, region_id=region.id)
         )
 
+    # Same program listed by other sources (near-duplicate cluster)
+    duplicates = []
+    if grant.cluster_id is not None:
+        duplicates = (
+            Grant.query.options(joinedload(Grant.organization))
+            .filter(Grant.cluster_id == grant.cluster_id, Grant.id != grant.id)
+            .order_by(Grant.id)
+            .all()
+        )
+
+    # Status edits for the selected region, newest first
+    history = grant_history(grant.id, region.id) if region else []
+
     # If no region selected, just show generic view
     return render_template(
         "grants/detail.html",
@@ -196,4 +167,95 @@ def grant_detail(grant_id):
         regions=regions,
         selected_region=region,
         status_record=status_record,
+        status_history=history,
+        statuses=STATUSES,
+        duplicates=duplicates,
+        is_archived=is_archived,
+    )
+
+
+@bp.route("/grant/<int:grant_id>/history")
+@public_cache()
+def revision_history(grant_id):
+    """Every scraped version of a grant; ?rev=N shows one version in full."""
+    grant = db.session.get(Grant, grant_id) or archived_grant(grant_id)
+    if grant is None:
+        abort(404)
+    versions = grant_versions(grant.id)
+    selected = request.args.get("rev", type=int)
+    version = grant_version(grant.id, selected) if selected else None
+    if selected and version is None:
+        return redirect(url_for("grants.revision_history", grant_id=grant.id))
+    return render_template(
+        "grants/history.html",
+        grant=grant,
+        versions=list(reversed(versions)),
+        selected=selected,
+        version=version,
+    )
+
+
+@bp.route("/region/<int:region_id>/recommended")
+@public_cache()
+def recommended(region_id):
+    region = get_region_or_404(region_id)
+    regions = active_regions()
+    return render_template(
+        "grants/recommended.html",
+        region=region,
+        regions=regions,
+        recommendations=recommendations_for(region.id),
+        current_date=date.today(),
+    )
+
+
+@bp.route("/region/<int:region_id>/pipeline")
+@public_cache()
+def pipeline(region_id):
+    """Week-over-week status totals and this week's movements for a region."""
+    region = get_region_or_404(region_id)
+    regions = active_regions()
+    weeks = min(request.args.get("weeks", 12, type=int), 104)
+    days = min(request.args.get("days", 7, type=int), 90)
+    since = datetime.utcnow() - timedelta(days=days)
+    movements = region_movements(region.id, since=since)
+    return render_template(
+        "grants/pipeline.html",
+        region=region,
+        regions=regions,
+        statuses=STATUSES,
+        timeline=region_timeline(region.id, weeks=weeks),
+        movements=movements,
+        transitions=transition_counts(region.id, since=since),
+        days=days,
     )
+
+
+@bp.route("/searches", methods=["POST"])
+def save_search():
+    """Save the list page's current filters; new matches are emailed."""
+    query = request.form.get("query", "")
+    email = (request.form.get("email") or "").strip().lower()
+    back = url_for("grants.index") + (f"?{query}" if query else "")
+
+    if not EMAIL_RE.match(email):
+        flash(_("Please enter a valid email address."), "warning")
+        return redirect(back)
+
+    create_saved_search(
+        email,
+        MultiDict(parse_qsl(query)),
+        name=(request.form.get("name") or "").strip()[:200] or None,
+        lang=g.get("lang") or current_app.config["BABEL_DEFAULT_LOCALE"],
+    )
+    flash(_("Search saved. We'll email you when new matching grants are added."), "success")
+    return redirect(back)
+
+
+@bp.route("/searches/<token>/unsubscribe")
+def unsubscribe_search(token):
+    search = SavedSearch.query.filter_by(token=token).first_or_404()
+    search.is_active = False
+    db.session.commit()
+    flash(_("You will no longer receive emails for this search."), "success")
+    return redirect(url_for("grants.index"))
@@ -0,0 +1,70 @@
+"""
+HTTP caching helpers for public pages.
+
+- ``public_cache`` marks a view's GET responses as shareable
+  (Cache-Control: public, max-age=...), unless the response turned out
+  to be personal (flash message shown, session changed), or the view
+  called ``private_cache()`` for this request.
+- ``CacheFriendlySessionInterface`` stops Flask from adding
+  ``Vary: Cookie`` to every response that merely *looked* at the session.
+"""
+
+from functools import wraps
+
+from flask import current_app, g, request, session
+from flask.sessions import SecureCookieSessionInterface
+
+
+def public_cache(max_age=None):
+    """Allow proxies/CDNs to cache this view's anonymous GET responses."""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            g.public_cache_max_age = (
+                max_age if max_age is not None else current_app.config["PUBLIC_CACHE_MAX_AGE"]
+            )
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
+
+def private_cache():
+    """Keep this response out of shared caches, e.g. a view of editable state."""
+    g.private_cache = True
+
+
+class CacheFriendlySessionInterface(SecureCookieSessionInterface):
+    """
+    Only vary on Cookie when the session shaped the response: it was
+    modified (e.g. flashes consumed) or a view set ``g.session_used``.
+    """
+
+    def save_session(self, app, session, response):
+        super().save_session(app, session, response)
+        if not session.modified and not g.get("session_used"):
+            # Lower-case on purpose: HeaderSet.remove compares the stored
+            # names lower-cased against the argument as given.
+            response.vary.discard("cookie")
+
+
+def init_http_cache(app):
+    app.session_interface = CacheFriendlySessionInterface()
+
+    @app.after_request
+    def set_cache_headers(response):
+        max_age = g.get("public_cache_max_age")
+        if max_age is None or request.method not in ("GET", "HEAD"):
+            return response
+
+        personal = (
+            session.modified or g.get("session_used") or g.get("private_cache")
+            or "Set-Cookie" in response.headers
+        )
+        if response.status_code not in (200, 304) or personal:
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        return response
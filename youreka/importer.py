@@ -0,0 +1,272 @@
+"""
+High-speed CSV import for grant catalogues.
+
+The file is streamed in chunks; each chunk is validated and normalized,
+bulk-loaded into a temporary staging table (COPY on Postgres, executemany
+on SQLite) and merged into `grants` with two set-based statements:
+an INSERT ... SELECT for new external_ids and (optionally) an
+UPDATE ... FROM for existing ones.
+
+    flask --app app import-grants partner_catalogue.csv --organization "Partner X"
+"""
+
+import csv
+import time
+from datetime import date, datetime
+
+from sqlalchemy import Column, MetaData, Table, exists, insert, literal, or_, select, update
+
+from .archive import restore_grants
+from .bulk import bulk_insert
+from .changes import log_grant_writes
+from .extensions import db
+from .ingest import finalize_ingest
+from .models import Grant, archived_grants
+from .reference import get_or_create_organization
+
+DEFAULT_ORGANIZATION = "Imported Grants"
+CHUNK_SIZE = 5000
+
+# Grant columns filled from the CSV (plus organization_id)
+IMPORT_COLUMNS = [
+    "organization_id",
+    "name_en",
+    "name_fr",
+    "description_en",
+    "description_fr",
+    "eligibility_en",
+    "eligibility_fr",
+    "category",
+    "region_scope",
+    "country",
+    "province",
+    "funding_min",
+    "funding_max",
+    "currency",
+    "deadline_date",
+    "ongoing_flag",
+    "language",
+    "team_scope",
+    "individual_type",
+    "is_ngo_only",
+    "source_url",
+    "external_id",
+]
+
+
+class RowError(ValueError):
+    """A CSV row that cannot be imported."""
+
+
+# ---------------------------------------------------------
+# Normalization
+# ---------------------------------------------------------
+def to_float(val):
+    val = (val or "").strip().replace(",", "").replace("$", "")
+    if not val:
+        return None
+    try:
+        return float(val)
+    except ValueError:
+        raise RowError(f"not a number: {val!r}")
+
+
+def to_bool(val):
+    val = (val or "").strip()
+    if val == "":
+        return False
+    if val.lower() in ("true", "t", "yes", "y"):
+        return True
+    if val.lower() in ("false", "f", "no", "n"):
+        return False
+    try:
+        return bool(int(val))
+    except Exception:
+        return False
+
+
+def to_date(val):
+    val = (val or "").strip()
+    if not val:
+        return None
+    try:
+        return datetime.strptime(val.split(" ")[0], "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def _text(row, *keys, default=None):
+    for key in keys:
+        value = (row.get(key) or "").strip()
+        if value:
+            return value
+    return default
+
+
+def normalize_row(row, organization_id):
+    """Map one CSV dict (data/grants.csv layout) onto grant columns."""
+    source_url = _text(row, "source_url")
+    if not source_url:
+        raise RowError("missing source_url")
+
+    return {
+        # Don't trust CSV organization ids: everything belongs to the import org
+        "organization_id": organization_id,
+        "name_en": _text(row, "name_en", "name", default="Untitled")[:255],
+        "name_fr": _text(row, "name_fr"),
+        "description_en": _text(row, "description_en", "description"),
+        "description_fr": _text(row, "description_fr"),
+        "eligibility_en": _text(row, "eligibility_en"),
+        "eligibility_fr": _text(row, "eligibility_fr"),
+        "category": _text(row, "category"),
+        "region_scope": _text(row, "region_scope"),
+        "country": _text(row, "country", default="Canada"),
+        "province": _text(row, "province_state", "province"),
+        "funding_min": to_float(row.get("funding_min")),
+        "funding_max": to_float(row.get("funding_max")),
+        "currency": _text(row, "currency", default="CAD"),
+        "deadline_date": to_date(row.get("deadline_date")),
+        "ongoing_flag": to_bool(row.get("ongoing_flag")),
+        "language": _text(row, "language", default="EN"),
+        "team_scope": _text(row, "team_scope"),
+        "individual_type": _text(row, "individual_type"),
+        "is_ngo_only": to_bool(row.get("is_ngo_only")),
+        "source_url": source_url[:255],
+        # De-dupe: prefer external_id if present, else source_url
+        "external_id": _text(row, "external_id", default=source_url)[:255],
+    }
+
+
+def normalize_batch(rows, organization_id, stats):
+    """Normalize a list of CSV dicts; later duplicates in the batch win."""
+    batch = {}
+    for line_no, row in rows:
+        try:
+            clean = normalize_row(row, organization_id)
+        except RowError as e:
+            stats["rejected"] += 1
+            if len(stats["errors"]) < 20:
+                stats["errors"].append(f"line {line_no}: {e}")
+            continue
+        batch[clean["external_id"]] = clean
+    return list(batch.values())
+
+
+# ---------------------------------------------------------
+# Staging + merge
+# ---------------------------------------------------------
+def _staging_table():
+    grants = Grant.__table__
+    columns = [Column(name, grants.c[name].type) for name in IMPORT_COLUMNS]
+    return Table("grants_import_staging", MetaData(), *columns, prefixes=["TEMPORARY"])
+
+
+def _merge(conn, staging, update_existing, now):
+    grants = Grant.__table__
+    # Rows still past their deadline leave the archived grant where it is
+    # (see archive.reopened)
+    reopened = or_(
+        staging.c.deadline_date.is_(None),
+        staging.c.deadline_date >= date.today(),
+        staging.c.ongoing_flag.is_(True),
+    )
+    archived = archived_grants.c.external_id.in_(select(staging.c.external_id).where(reopened))
+    is_new = ~exists().where(grants.c.external_id == staging.c.external_id)
+
+    updated = 0
+    if update_existing:
+        # Programs back for another cycle come out of the archive first
+        restore_grants(archived, conn)
+        values = {name: staging.c[name] for name in IMPORT_COLUMNS if name != "external_id"}
+        # Rows the file doesn't change keep their updated_at, so a re-import
+        # logs no changes and finalize_ingest skips them
+        changed = or_(*(grants.c[name].is_distinct_from(column) for name, column in values.items()))
+        values["updated_at"] = now
+        result = conn.execute(
+            update(grants)
+            .where(grants.c.external_id == staging.c.external_id, changed)
+            .values(**values)
+        )
+        updated = result.rowcount
+
+    columns = [staging.c[name] for name in IMPORT_COLUMNS]
+    result = conn.execute(
+        insert(grants).from_select(
+            IMPORT_COLUMNS + ["created_at", "updated_at"],
+            select(*columns, literal(now), literal(now)).where(
+                is_new, ~exists().where(archived_grants.c.external_id == staging.c.external_id)
+            ),
+        )
+    )
+    return result.rowcount, updated
+
+
+def _chunks(reader, size):
+    chunk = []
+    # Header is line 1
+    for line_no, row in enumerate(reader, start=2):
+        chunk.append((line_no, row))
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def get_import_organization(name=DEFAULT_ORGANIZATION):
+    return get_or_create_organization(name, type="Unknown", ngo_only=False, country="Canada")
+
+
+def import_grants_csv(path, organization_name=DEFAULT_ORGANIZATION, update_existing=True,
+                      chunk_size=CHUNK_SIZE, verbose=True, finalize=True):
+    """
+    Import grants from a CSV file. Returns a stats dict with
+    read / inserted / updated / rejected counts and rows_per_second.
+    With ``finalize`` the post-ingest steps (dedup) run on every inserted
+    or updated grant afterwards.
+    """
+    org = get_import_organization(organization_name)
+    stats = {"read": 0, "inserted": 0, "updated": 0, "rejected": 0, "errors": []}
+    started = time.perf_counter()
+    staging = _staging_table()
+
+    # Run on the session's connection so the whole import is one transaction
+    conn = db.session.connection()
+    try:
+        with open(path, newline="", encoding="utf-8") as f:
+            staging.create(conn, checkfirst=True)
+            conn.execute(staging.delete())
+            reader = csv.DictReader(f)
+            now = datetime.utcnow()
+
+            for chunk in _chunks(reader, chunk_size):
+                stats["read"] += len(chunk)
+                rows = normalize_batch(chunk, org.id, stats)
+
+                bulk_insert(conn, staging, rows)
+                inserted, updated = _merge(conn, staging, update_existing, now)
+                conn.execute(staging.delete())
+
+                stats["inserted"] += inserted
+                stats["updated"] += updated
+                if verbose:
+                    elapsed = time.perf_counter() - started
+                    print(f"  {stats['read']:>10} rows read ({stats['read'] / elapsed:,.0f} rows/s)")
+
+            staging.drop(conn)
+            # Every row this import inserted or updated carries updated_at == now
+            log_grant_writes(conn, now)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = round(elapsed, 2)
+    stats["rows_per_second"] = round(stats["read"] / elapsed) if elapsed else 0
+
+    if finalize and stats["read"]:
+        # Every row this import inserted or updated carries updated_at == now
+        touched = [row[0] for row in db.session.query(Grant.id).filter(Grant.updated_at == now)]
+        stats["finalize"] = finalize_ingest(touched, verbose=verbose)
+    return stats
@@ -0,0 +1,46 @@
+"""
+Post-ingest hook shared by every path that writes grants (scrapers,
+CSV import, catalogue generator unless --skip-finalize).
+
+Callers pass the ids of grants they inserted or changed after their own
+commit; finalize_ingest runs the derived-data steps for just those rows
+and commits.
+"""
+
+from flask import current_app
+
+from .dedup import assign_clusters
+from .extensions import db
+from .recommendations import refresh_grants
+from .saved_searches import queue_matches
+
+
+def finalize_ingest(grant_ids, verbose=False):
+    """Run post-ingest steps for new/changed grants. Returns per-step stats."""
+    grant_ids = list(grant_ids)
+    if not grant_ids:
+        return {}
+
+    stats = {}
+    if current_app.config.get("DEDUP_ENABLED", True):
+        stats["dedup"] = assign_clusters(grant_ids)
+    db.session.commit()
+
+    # After dedup: only canonical grants of a cluster are recommended
+    if current_app.config.get("RECOMMENDATIONS_ENABLED", True):
+        stats["recommendations"] = refresh_grants(grant_ids)
+
+    if current_app.config.get("SAVED_SEARCHES_ENABLED", True):
+        stats["saved_searches"] = queue_matches(grant_ids)
+        db.session.commit()
+
+    if verbose and "dedup" in stats:
+        d = stats["dedup"]
+        print(f"  dedup: {d['grants']} grants, {d['compared']} candidate pairs, {d['matches']} matches")
+    if verbose and "recommendations" in stats:
+        r = stats["recommendations"]
+        print(f"  recommendations: {r['stored']} stored for {r['regions']} regions")
+    if verbose and "saved_searches" in stats:
+        s = stats["saved_searches"]
+        print(f"  saved searches: {s['candidates']} candidates checked, {s['queued']} notifications queued")
+    return stats
@@ -0,0 +1,238 @@
+"""
+Opt-in request / SQL / template instrumentation.
+
+Enable with INSTRUMENTATION_ENABLED = True (or env INSTRUMENTATION_ENABLED=1).
+When enabled:
+- every request is timed and counted per endpoint,
+- SQL statements are counted and timed via SQLAlchemy engine events,
+  statements slower than SLOW_QUERY_MS are logged,
+- template render time is measured via Flask signals,
+- requests to PROFILE_ENDPOINTS are sampled with cProfile and dumped as
+  .prof files into PROFILE_DIR (open with snakeviz / flameprof),
+- a Prometheus text endpoint is served at /metrics,
+- responses carry a Server-Timing header (app, db, tpl); streamed responses
+  (STREAM_LIST_PAGE) are timed and profiled until their last chunk is sent,
+  but can't carry the header.
+
+Metrics live in process memory, so with several gunicorn workers each
+worker reports its own numbers (Prometheus sums them per instance).
+"""
+
+import cProfile
+import os
+import random
+import threading
+import time
+from datetime import datetime
+
+from flask import Response, before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+
+from .extensions import db
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.total += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """Tiny in-process registry rendering the Prometheus text format."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}    # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.help = {}
+
+    def describe(self, name, kind, text):
+        self.help[name] = (kind, text)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram()
+            hist.observe(value)
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ""
+        body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+        return "{" + body + "}"
+
+    def render(self):
+        lines = []
+        with self.lock:
+            names = sorted({k[0] for k in self.counters} | {k[0] for k in self.histograms})
+            for name in names:
+                kind, text = self.help.get(name, ("untyped", ""))
+                if text:
+                    lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for (n, labels), value in sorted(self.counters.items()):
+                    if n == name:
+                        lines.append(f"{name}{self._labels(labels)} {value}")
+                for (n, labels), hist in sorted(self.histograms.items()):
+                    if n != name:
+                        continue
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        lines.append(f"{name}_bucket{self._labels(labels, [('le', bound)])} {count}")
+                    lines.append(f"{name}_bucket{self._labels(labels, [('le', '+Inf')])} {hist.total}")
+                    lines.append(f"{name}_sum{self._labels(labels)} {hist.sum:.6f}")
+                    lines.append(f"{name}_count{self._labels(labels)} {hist.total}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+metrics.describe("http_requests_total", "counter", "HTTP requests by endpoint, method and status.")
+metrics.describe("http_request_duration_seconds", "histogram", "Request latency by endpoint.")
+metrics.describe("db_queries_total", "counter", "SQL statements executed, by endpoint.")
+metrics.describe("db_query_duration_seconds", "histogram", "SQL statement latency, by endpoint.")
+metrics.describe("db_slow_queries_total", "counter", "SQL statements slower than SLOW_QUERY_MS.")
+metrics.describe("template_render_duration_seconds", "histogram", "Template render time by template.")
+metrics.describe("profiles_captured_total", "counter", "cProfile dumps written, by endpoint.")
+
+
+def _endpoint():
+    return (request.endpoint or "unmatched") if has_request_context() else "cli"
+
+
+# ---------------------------------------------------------
+# SQL
+# ---------------------------------------------------------
+def _install_engine_events(app, engine):
+    slow_ms = app.config.get("SLOW_QUERY_MS", 100)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        endpoint = _endpoint()
+        metrics.inc("db_queries_total", endpoint=endpoint)
+        metrics.observe("db_query_duration_seconds", elapsed, endpoint=endpoint)
+
+        if has_request_context():
+            g.db_queries = g.get("db_queries", 0) + 1
+            g.db_seconds = g.get("db_seconds", 0.0) + elapsed
+
+        if elapsed * 1000 >= slow_ms:
+            metrics.inc("db_slow_queries_total", endpoint=endpoint)
+            app.logger.warning(
+                "Slow query (%.1f ms) on %s: %s",
+                elapsed * 1000,
+                endpoint,
+                " ".join(statement.split())[:500],
+            )
+
+
+# ---------------------------------------------------------
+# Templates
+# ---------------------------------------------------------
+def _before_render(sender, template, context, **extra):
+    if has_request_context():
+        g.setdefault("template_starts", []).append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    if not has_request_context() or not g.get("template_starts"):
+        return
+    elapsed = time.perf_counter() - g.template_starts.pop()
+    g.template_seconds = g.get("template_seconds", 0.0) + elapsed
+    metrics.observe("template_render_duration_seconds", elapsed, template=template.name or "string")
+
+
+# ---------------------------------------------------------
+# Setup
+# ---------------------------------------------------------
+def init_instrumentation(app):
+    if not app.config.get("INSTRUMENTATION_ENABLED"):
+        return
+
+    with app.app_context():
+        _install_engine_events(app, db.engine)
+
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+
+    profile_endpoints = set(app.config.get("PROFILE_ENDPOINTS") or [])
+    sample_rate = app.config.get("PROFILE_SAMPLE_RATE", 0.1)
+    profile_dir = app.config.get("PROFILE_DIR")
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        g.db_queries = 0
+        g.db_seconds = 0.0
+        g.template_seconds = 0.0
+
+        if request.endpoint in profile_endpoints and random.random() < sample_rate:
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    def finish(response, state, endpoint, method):
+        profiler = state.pop("profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(profile_dir, exist_ok=True)
+            stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+            profiler.dump_stats(os.path.join(profile_dir, f"{endpoint}-{stamp}.prof"))
+            metrics.inc("profiles_captured_total", endpoint=endpoint)
+
+        elapsed = time.perf_counter() - state.request_started
+        metrics.inc("http_requests_total", endpoint=endpoint, method=method, status=response.status_code)
+        metrics.observe("http_request_duration_seconds", elapsed, endpoint=endpoint)
+        return elapsed
+
+    @app.after_request
+    def record_request(response):
+        if g.get("request_started") is None:
+            return response
+
+        endpoint, method = _endpoint(), request.method
+        if response.is_streamed:
+            # The body (and its queries and template time) is produced after
+            # this hook, while the server iterates it; finish once it's sent.
+            # The headers are gone by then, so no Server-Timing here.
+            state = g._get_current_object()
+            response.call_on_close(lambda: finish(response, state, endpoint, method))
+            return response
+
+        elapsed = finish(response, g, endpoint, method)
+        response.headers["Server-Timing"] = (
+            f"app;dur={elapsed * 1000:.1f}, "
+            f"db;dur={g.db_seconds * 1000:.1f};desc=\"{g.db_queries} queries\", "
+            f"tpl;dur={g.template_seconds * 1000:.1f}"
+        )
+        return response
+
+    @app.route("/metrics")
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
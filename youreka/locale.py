@@ -0,0 +1,134 @@
+"""
+URL-prefixed locale routing.
+
+Public pages live under /en/... and /fr/.... The locale is taken from the
+URL prefix once per request (into g.lang) and url_for() fills the prefix
+in automatically, so pages no longer depend on the session and can be
+cached by a proxy/CDN.
+
+Unprefixed URLs (/, /grant/5, old ?lang=fr links) redirect to the
+prefixed URL, picking the language from ?lang=, then the remembered
+session language, then the default. The session is only written by an
+explicit ?lang= (the header switch), and only when the language changes.
+"""
+
+from urllib.parse import urlencode
+
+from flask import current_app, g, redirect, request, session, url_for
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import RequestRedirect
+
+
+def get_locale():
+    """Flask-Babel locale selector: the locale resolved from the URL."""
+    return g.get("lang") or current_app.config["BABEL_DEFAULT_LOCALE"]
+
+
+def _remember_lang(lang):
+    # The default language is implied, so first-time visitors get no cookie
+    default = current_app.config["BABEL_DEFAULT_LOCALE"]
+    if session.get("lang", default) != lang:
+        session["lang"] = lang
+        session.permanent = True
+
+
+def _query_without_lang():
+    args = request.args.copy()
+    args.pop("lang", None)
+    query = urlencode(list(args.items(multi=True)))
+    return f"?{query}" if query else ""
+
+
+def _localized_url(lang):
+    """URL of the current page in ``lang``."""
+    if request.endpoint and request.url_rule and "lang_code" in request.url_rule.arguments:
+        values = dict(request.view_args or {})
+        values["lang_code"] = lang
+        return url_for(request.endpoint, **values) + _query_without_lang()
+    return url_for("grants.index", lang_code=lang)
+
+
+def switch_lang_url(lang):
+    """
+    Header switch link: the current page in ``lang`` with ?lang=, which
+    stores the choice and redirects to the clean URL.
+    """
+    url = _localized_url(lang)
+    return url + ("&" if "?" in url else "?") + urlencode({"lang": lang})
+
+
+def localized_prefix(app):
+    """URL prefix for localized blueprints, e.g. /<any(en, fr):lang_code>."""
+    return "/<any({}):lang_code>".format(", ".join(app.config["LANGUAGES"]))
+
+
+def init_locale_routing(app):
+    """Resolve g.lang for routes under localized_prefix and redirect the rest."""
+    languages = app.config["LANGUAGES"]
+    default = app.config["BABEL_DEFAULT_LOCALE"]
+
+    @app.url_value_preprocessor
+    def pull_lang(endpoint, values):
+        if values and "lang_code" in values:
+            g.lang = values.pop("lang_code")
+
+    @app.url_defaults
+    def add_lang(endpoint, values):
+        if "lang_code" not in values and app.url_map.is_endpoint_expecting(endpoint, "lang_code"):
+            values["lang_code"] = g.get("lang") or default
+
+    @app.before_request
+    def resolve_locale():
+        lang = g.get("lang")
+
+        if lang is not None:
+            # Old-style ?lang= on a localized URL: move to the right prefix
+            requested = request.args.get("lang")
+            if requested in languages and request.method in ("GET", "HEAD"):
+                _remember_lang(requested)
+                return redirect(_localized_url(requested))
+            # The prefix alone never touches the session: a cookie would
+            # make the page uncacheable (see http_cache.public_cache)
+            return None
+
+        if request.url_rule is not None:
+            # Not a localized page (static files, /metrics, APIs)
+            return None
+
+        return _redirect_to_localized(languages, default)
+
+    @app.context_processor
+    def inject_lang():
+        return {
+            "current_lang": g.get("lang") or default,
+            "switch_lang_url": switch_lang_url,
+        }
+
+
+def _redirect_to_localized(languages, default):
+    """Redirect an unprefixed URL to /<lang>/... if such a page exists."""
+    lang = request.args.get("lang")
+    if lang in languages:
+        _remember_lang(lang)
+    else:
+        lang = session.get("lang")
+        if lang not in languages:
+            lang = default
+
+    adapter = current_app.create_url_adapter(request)
+    target = f"/{lang}{request.path}"
+    try:
+        adapter.match(target, method=request.method)
+    except RequestRedirect as e:
+        target = e.new_url
+    except HTTPException:
+        # No localized page either: let the normal 404/405 happen
+        return None
+
+    code = 302 if request.method in ("GET", "HEAD") else 307
+    response = redirect(target + _query_without_lang(), code=code)
+    # The target depends on the session language
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.vary.add("Cookie")
+    g.session_used = True
+    return response
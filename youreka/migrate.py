@@ -0,0 +1,248 @@
+"""
+Copy the whole database to another one (`flask migrate-db`), e.g. the dev
+SQLite file to Postgres, or production into staging.
+
+- Every table of the models is copied, in primary key order, in chunks of
+  CHUNK_SIZE rows. Each chunk is inserted (COPY on Postgres, see bulk.py)
+  and committed on its own, so memory stays flat and an interrupted run
+  loses at most one chunk.
+- Tables are copied parents first. Tables that don't reference each other
+  are copied at the same time by ``workers`` threads.
+- Progress is kept on the target in db_migration_checkpoints. Running the
+  command again resumes: finished tables are skipped and a half-copied
+  table continues after the highest key already in the target.
+- On Postgres the id sequences are moved past the copied ids.
+- Finally the row count and a checksum of every table (all values, in key
+  order) are compared between source and target.
+
+The target schema is created from the models. The source should not be
+written to during the copy; run it from a maintenance window or a
+snapshot.
+"""
+
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from sqlalchemy import (
+    Boolean, Column, DateTime, Integer, MetaData, String, Table, create_engine, delete, func,
+    inspect, select, tuple_,
+)
+
+from .bulk import bulk_insert, fast_sqlite_pragmas, fix_sequence
+from .extensions import db
+
+CHUNK_SIZE = 5000
+
+checkpoints = Table(
+    "db_migration_checkpoints",
+    MetaData(),
+    Column("table_name", String(100), primary_key=True),
+    Column("rows_copied", Integer, nullable=False, default=0),
+    Column("done", Boolean, nullable=False, default=False),
+    Column("updated_at", DateTime),
+)
+
+
+class MigrationError(Exception):
+    """The target can't be used (e.g. it has data from elsewhere)."""
+
+
+def normalize_uri(uri):
+    """Accept the postgres:// URLs some hosts hand out (see config.ProdConfig)."""
+    if uri.startswith("postgres://"):
+        return uri.replace("postgres://", "postgresql://", 1)
+    return uri
+
+
+def make_engine(uri):
+    uri = normalize_uri(uri)
+    if uri.startswith("sqlite"):
+        # Table workers take turns writing; wait for the lock instead of failing
+        return create_engine(uri, connect_args={"timeout": 60, "check_same_thread": False})
+    return create_engine(uri, pool_size=8, max_overflow=8)
+
+
+def table_levels(tables):
+    """``tables`` grouped so each group only references tables of earlier groups."""
+    names = {table.name for table in tables}
+    remaining = {
+        table.name: {fk.column.table.name for fk in table.foreign_keys} & names - {table.name}
+        for table in tables
+    }
+    by_name = {table.name: table for table in tables}
+    levels, placed = [], set()
+    while remaining:
+        ready = sorted(name for name, parents in remaining.items() if parents <= placed)
+        if not ready:
+            raise MigrationError(f"Circular foreign keys between {sorted(remaining)}")
+        levels.append([by_name[name] for name in ready])
+        placed.update(ready)
+        for name in ready:
+            del remaining[name]
+    return levels
+
+
+def _key_columns(table):
+    columns = list(table.primary_key.columns)
+    return columns or list(table.columns)
+
+
+def _chunks(conn, table, chunk_size, after=None):
+    """Rows of ``table`` in key order, ``chunk_size`` at a time, after key ``after``."""
+    key = _key_columns(table)
+    while True:
+        query = select(table).order_by(*key).limit(chunk_size)
+        if after is not None:
+            query = query.where(tuple_(*key) > tuple_(*after) if len(key) > 1 else key[0] > after[0])
+        rows = conn.execute(query).mappings().all()
+        if not rows:
+            return
+        yield rows
+        after = [rows[-1][column.name] for column in key]
+
+
+def _last_key(conn, table):
+    key = _key_columns(table)
+    row = conn.execute(select(*key).order_by(*(c.desc() for c in key)).limit(1)).first()
+    return list(row) if row is not None else None
+
+
+def _count(conn, table):
+    return conn.execute(select(func.count()).select_from(table)).scalar()
+
+
+def _normal(value):
+    """Backend-independent text for checksums."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).hex()
+    return repr(value)
+
+
+def table_checksum(engine, table, chunk_size=CHUNK_SIZE):
+    """(row count, sha256 of every value in key order) for ``table`` on ``engine``."""
+    digest, count = hashlib.sha256(), 0
+    with engine.connect() as conn:
+        for rows in _chunks(conn, table, chunk_size):
+            for row in rows:
+                digest.update("\x1f".join(_normal(row[c.name]) for c in table.columns).encode())
+                digest.update(b"\x1e")
+            count += len(rows)
+    return count, digest.hexdigest()
+
+
+class Migration:
+    def __init__(self, source_uri, target_uri, chunk_size=CHUNK_SIZE, workers=4, tables=None, log=print):
+        self.source = make_engine(source_uri)
+        self.target = make_engine(target_uri)
+        self.chunk_size = chunk_size
+        self.workers = max(1, workers)
+        self.tables = [
+            table for table in db.metadata.sorted_tables if not tables or table.name in tables
+        ]
+        self.log = log
+        self.log_lock = threading.Lock()
+
+    def _say(self, message):
+        with self.log_lock:
+            self.log(message)
+
+    # ---------------------------------------------------------
+    # Target setup
+    # ---------------------------------------------------------
+    def prepare(self, reset=False):
+        """Create the target schema; with ``reset`` empty it and forget all progress."""
+        if reset:
+            with self.target.begin() as conn:
+                existing = set(inspect(conn).get_table_names())
+                for table in reversed(self.tables):
+                    if table.name in existing:
+                        conn.execute(delete(table))
+                if checkpoints.name in existing:
+                    conn.execute(delete(checkpoints))
+        db.metadata.create_all(self.target, tables=self.tables)
+        checkpoints.metadata.create_all(self.target)
+
+        with self.target.connect() as conn:
+            started = set(conn.execute(select(checkpoints.c.table_name)).scalars())
+            for table in self.tables:
+                if table.name not in started and _count(conn, table):
+                    raise MigrationError(
+                        f"Target table {table.name} already has rows not copied by this tool; "
+                        f"use --reset to empty the target first."
+                    )
+
+    # ---------------------------------------------------------
+    # Copy
+    # ---------------------------------------------------------
+    def _checkpoint(self, conn, table, rows_copied, done=False):
+        values = {"rows_copied": rows_copied, "done": done, "updated_at": datetime.utcnow()}
+        updated = conn.execute(
+            checkpoints.update().where(checkpoints.c.table_name == table.name).values(**values)
+        ).rowcount
+        if not updated:
+            conn.execute(checkpoints.insert().values(table_name=table.name, **values))
+
+    def copy_table(self, table):
+        started = time.perf_counter()
+        with self.target.connect() as conn:
+            state = conn.execute(select(checkpoints).where(checkpoints.c.table_name == table.name)).first()
+            if state is not None and state.done:
+                self._say(f"  {table.name}: already copied ({state.rows_copied} rows)")
+                return state.rows_copied
+            after = _last_key(conn, table)
+            copied = state.rows_copied if state is not None else 0
+
+        if after is not None:
+            self._say(f"  {table.name}: resuming after {copied} rows")
+        with self.source.connect() as source:
+            for rows in _chunks(source, table, self.chunk_size, after):
+                with self.target.begin() as conn:
+                    fast_sqlite_pragmas(conn)
+                    bulk_insert(conn, table, [dict(row) for row in rows])
+                    copied += len(rows)
+                    self._checkpoint(conn, table, copied)
+
+        with self.target.begin() as conn:
+            id_column = table.c.get("id")
+            if id_column is not None and id_column.primary_key and id_column.autoincrement is not False:
+                fix_sequence(conn, table)
+            self._checkpoint(conn, table, copied, done=True)
+        self._say(f"  {table.name}: {copied} rows in {time.perf_counter() - started:.1f}s")
+        return copied
+
+    def copy(self):
+        """Copy every table, level by level. Returns {table name: rows copied}."""
+        copied = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for level in table_levels(self.tables):
+                for table, rows in zip(level, pool.map(self.copy_table, level)):
+                    copied[table.name] = rows
+        return copied
+
+    # ---------------------------------------------------------
+    # Verify
+    # ---------------------------------------------------------
+    def _verify_table(self, table):
+        source = table_checksum(self.source, table, self.chunk_size)
+        target = table_checksum(self.target, table, self.chunk_size)
+        return table.name, source, target
+
+    def verify(self):
+        """[(table name, source (count, checksum), target (count, checksum))] that differ."""
+        mismatches = []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for name, source, target in pool.map(self._verify_table, self.tables):
+                state = "ok" if source == target else "MISMATCH"
+                self._say(f"  {name}: {source[0]} / {target[0]} rows, checksum {state}")
+                if source != target:
+                    mismatches.append((name, source, target))
+        return mismatches
+
+    def close(self):
+        self.source.dispose()
+        self.target.dispose()
@@ -1,6 +1,9 @@
 from datetime import datetime, date
 from .extensions import db
 
+# Canonical GrantStatus.status values; templates translate the labels
+STATUSES = ("Not Started", "In Progress", "Submitted", "Rejected", "Awarded")
+
 
 class Region(db.Model):
     __tablename__ = "regions"
@@ -67,7 +70,7 @@ class Grant(db.Model):
     currency = db.Column(db.String(10), default="CAD")
 
     # Deadline
-    deadline_date = db.Column(db.Date, nullable=True)
+    deadline_date = db.Column(db.Date, nullable=True, index=True)
     ongoing_flag = db.Column(db.Boolean, default=False)
 
     # Language
@@ -78,10 +81,24 @@ class Grant(db.Model):
     source_url = db.Column(db.String(255))
     external_id = db.Column(db.String(255), unique=True)
 
+    # Last source_url health check (see youreka/scraping/linkcheck.py)
+    link_status = db.Column(db.Integer)             # final HTTP status, None if unreachable
+    link_final_url = db.Column(db.String(500))      # where source_url redirects to, if it does
+    link_error = db.Column(db.String(255))          # timeout / DNS / TLS error
+    link_failures = db.Column(db.Integer)           # consecutive failed checks
+    link_checked_at = db.Column(db.DateTime, index=True)
+
+    # Last time a scraper fetched the source page (see youreka/scraping/upsert.py)
+    scraped_at = db.Column(db.DateTime)
+
+    # Near-duplicate cluster (see youreka/dedup.py): id of the cluster's
+    # canonical (lowest-id) grant
+    cluster_id = db.Column(db.Integer, index=True)
+
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(
-        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True
     )
 
     statuses = db.relationship("GrantStatus", back_populates="grant")
@@ -91,16 +108,67 @@ class Grant(db.Model):
             return None
         return (self.deadline_date - date.today()).days
 
+    def link_broken(self, after=2):
+        """True once source_url has failed ``after`` checks in a row."""
+        return (self.link_failures or 0) >= after
+
     def __repr__(self):
         return f"<Grant {self.name_en}>"
 
 
+def _archive_table():
+    columns = [
+        db.Column(column.name, column.type, primary_key=column.primary_key, autoincrement=False)
+        for column in Grant.__table__.columns
+    ]
+    return db.Table(
+        "archived_grants",
+        *columns,
+        db.Column("archived_at", db.DateTime, index=True),
+        db.Index("ix_archived_grants_external_id", "external_id"),
+        db.Index("ix_archived_grants_deadline_date", "deadline_date"),
+    )
+
+
+# Cold storage for grants whose deadline is long past (see youreka/archive.py):
+# the grants columns without their constraints, plus archived_at. Rows keep
+# their grant id, so links, revisions and change events still resolve.
+archived_grants = _archive_table()
+
+
+class GrantRevision(db.Model):
+    """
+    One scraped version of a grant (see youreka/revisions.py). ``delta`` is
+    zlib-compressed JSON: the full field values on keyframes, otherwise
+    only what changed since the previous revision (text as token diffs).
+    """
+    __tablename__ = "grant_revisions"
+    __table_args__ = (
+        db.UniqueConstraint("grant_id", "revision", name="uq_grant_revisions_grant_revision"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    grant_id = db.Column(db.Integer, nullable=False, index=True)  # no FK: kept for archived grants
+    revision = db.Column(db.Integer, nullable=False)
+    is_keyframe = db.Column(db.Boolean, default=False, nullable=False)
+    delta = db.Column(db.LargeBinary, nullable=False)
+    changed_fields = db.Column(db.String(500))  # comma-separated, for listing without decoding
+    source = db.Column(db.String(50))           # "otf", "ontario", "esdc", "baseline"
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<GrantRevision grant={self.grant_id} r{self.revision}>"
+
+
 class GrantStatus(db.Model):
     """
     Region-specific status for each grant.
     Allows each region to track its own status, notes, and budgets.
     """
     __tablename__ = "grant_statuses"
+    __table_args__ = (
+        db.Index("ix_grant_statuses_region_grant", "region_id", "grant_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     grant_id = db.Column(db.Integer, db.ForeignKey("grants.id"), nullable=False)
@@ -116,10 +184,221 @@ class GrantStatus(db.Model):
     amount_applied = db.Column(db.Float)
     amount_awarded = db.Column(db.Float)
 
-    last_updated = db.Column(db.DateTime, default=datetime.utcnow)
+    last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     grant = db.relationship("Grant", back_populates="statuses")
     region = db.relationship("Region", back_populates="statuses")
 
     def __repr__(self):
         return f"<GrantStatus grant={self.grant_id} region={self.region_id} status={self.status}>"
+
+
+class GrantStatusEvent(db.Model):
+    """
+    Append-only log of region status edits (see youreka/status_history.py).
+    Statuses are stored as indexes into STATUSES to keep rows small; notes
+    are not copied, only flagged when they changed.
+    """
+    __tablename__ = "grant_status_events"
+    __table_args__ = (
+        db.Index("ix_grant_status_events_region_created", "region_id", "created_at"),
+        db.Index("ix_grant_status_events_grant_created", "grant_id", "created_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    # No FKs: history outlives archived or deleted grants
+    region_id = db.Column(db.Integer, nullable=False)
+    grant_id = db.Column(db.Integer, nullable=False)
+    from_status = db.Column(db.SmallInteger)  # None for a new status row
+    to_status = db.Column(db.SmallInteger)
+    notes_changed = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<GrantStatusEvent grant={self.grant_id} region={self.region_id} {self.from_status}->{self.to_status}>"
+
+
+class GrantStatusSnapshot(db.Model):
+    """
+    Per-region pipeline totals (grants and amounts per status) taken by
+    `flask snapshot-statuses`; one row per (region, day, status).
+    """
+    __tablename__ = "grant_status_snapshots"
+
+    region_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    snapshot_date = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    grants = db.Column(db.Integer, nullable=False, default=0)
+    budget_allocated = db.Column(db.Float)
+    amount_applied = db.Column(db.Float)
+    amount_awarded = db.Column(db.Float)
+
+    def __repr__(self):
+        return f"<GrantStatusSnapshot region={self.region_id} {self.snapshot_date} status={self.status}>"
+
+
+class GrantLSHBucket(db.Model):
+    """
+    LSH band buckets of each grant's MinHash signature. Grants sharing a
+    bucket are duplicate candidates; one row per (band bucket, grant).
+    """
+    __tablename__ = "grant_lsh_buckets"
+
+    bucket = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    grant_id = db.Column(
+        db.Integer, db.ForeignKey("grants.id"), primary_key=True, autoincrement=False, index=True
+    )
+
+    def __repr__(self):
+        return f"<GrantLSHBucket {self.bucket} grant={self.grant_id}>"
+
+
+class RegionRecommendation(db.Model):
+    """
+    Materialized top-N grants per region from the relevance scorer
+    (youreka/recommendations.py). Rebuilt daily, patched on ingest.
+    """
+    __tablename__ = "region_recommendations"
+    __table_args__ = (
+        db.Index("ix_region_recommendations_rank", "region_id", "rank"),
+    )
+
+    region_id = db.Column(db.Integer, db.ForeignKey("regions.id"), primary_key=True, autoincrement=False)
+    grant_id = db.Column(db.Integer, db.ForeignKey("grants.id"), primary_key=True, autoincrement=False)
+    score = db.Column(db.Float, nullable=False)
+    rank = db.Column(db.Integer, nullable=False)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    grant = db.relationship("Grant")
+
+    def __repr__(self):
+        return f"<RegionRecommendation region={self.region_id} grant={self.grant_id} rank={self.rank}>"
+
+
+class SavedSearch(db.Model):
+    """
+    A list-page filter combination someone wants to be notified about.
+    ``query_string`` holds the filters as a normalized query string.
+    """
+    __tablename__ = "saved_searches"
+
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(255), nullable=False, index=True)
+    region_id = db.Column(db.Integer, db.ForeignKey("regions.id"), index=True)
+    name = db.Column(db.String(200))
+    query_string = db.Column(db.Text, nullable=False, default="")
+    lang = db.Column(db.String(5), default="en")
+    token = db.Column(db.String(64), unique=True, nullable=False)  # unsubscribe link
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_notified_at = db.Column(db.DateTime)
+
+    region = db.relationship("Region")
+
+    def __repr__(self):
+        return f"<SavedSearch {self.id} {self.email} ?{self.query_string}>"
+
+
+class SavedSearchKey(db.Model):
+    """
+    Reverse index for saved searches: each search is filed under one
+    (field, value) it requires, so a changed grant only has to be checked
+    against searches filed under its own values (plus field "*": searches
+    with no indexable equality filter).
+    """
+    __tablename__ = "saved_search_keys"
+
+    field = db.Column(db.String(30), primary_key=True)
+    value = db.Column(db.String(255), primary_key=True)
+    saved_search_id = db.Column(
+        db.Integer, db.ForeignKey("saved_searches.id"), primary_key=True, index=True
+    )
+
+
+class SearchNotification(db.Model):
+    """Queued "new match" notice for a saved search, sent in batched digests."""
+    __tablename__ = "search_notifications"
+    __table_args__ = (
+        db.UniqueConstraint("saved_search_id", "grant_id", name="uq_search_notifications_search_grant"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    saved_search_id = db.Column(db.Integer, db.ForeignKey("saved_searches.id"), nullable=False)
+    grant_id = db.Column(db.Integer, db.ForeignKey("grants.id"), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, index=True)
+
+    saved_search = db.relationship("SavedSearch")
+    grant = db.relationship("Grant")
+
+
+class ChangeEvent(db.Model):
+    """
+    Append-only log of catalogue changes (see youreka/changes.py).
+    The id is the sync cursor, so it must never be reused.
+    """
+    __tablename__ = "change_events"
+    __table_args__ = (
+        db.Index("ix_change_events_entity", "entity", "entity_id"),
+        {"sqlite_autoincrement": True},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)   # "grant", "grant_status"
+    entity_id = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.String(10), nullable=False)   # insert, update, delete, expire
+    grant_id = db.Column(db.Integer)   # no FK: deleted grants keep their events
+    region_id = db.Column(db.Integer)  # grant_status events only
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<ChangeEvent {self.id} {self.action} {self.entity}:{self.entity_id}>"
+
+
+class ReferenceVersion(db.Model):
+    """
+    Write counter per reference table (regions, organizations). Each
+    process caches those tables and reloads one when its counter moved
+    (see youreka/reference.py).
+    """
+    __tablename__ = "reference_versions"
+
+    name = db.Column(db.String(30), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ReferenceVersion {self.name}={self.version}>"
+
+
+class ScrapeRun(db.Model):
+    """
+    One execution of a scraper, with timing and volume metrics.
+    Per-page detail is kept as JSON in `details`.
+    """
+    __tablename__ = "scrape_runs"
+
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(50), nullable=False, index=True)  # "otf", "ontario", "esdc"
+    status = db.Column(db.String(20), default="running")  # running, success, failed
+
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    duration_seconds = db.Column(db.Float)
+
+    pages_fetched = db.Column(db.Integer, default=0)
+    bytes_fetched = db.Column(db.Integer, default=0)
+    fetch_seconds = db.Column(db.Float, default=0.0)
+    wait_seconds = db.Column(db.Float, default=0.0)
+    parse_seconds = db.Column(db.Float, default=0.0)
+    db_seconds = db.Column(db.Float, default=0.0)
+
+    errors = db.Column(db.Integer, default=0)
+    cache_hits = db.Column(db.Integer, default=0)    # pages skipped: grant already stored
+    cache_misses = db.Column(db.Integer, default=0)  # pages that had to be fetched
+    grants_created = db.Column(db.Integer, default=0)
+
+    details = db.Column(db.Text)  # JSON: per-page timings, errors, per-host crawl stats
+
+    def __repr__(self):
+        return f"<ScrapeRun {self.id} {self.source} {self.status}>"
@@ -0,0 +1,133 @@
+"""
+Offline catalogue for the list page.
+
+/api/catalogue sends every live grant as one compact JSON bundle (rows
+as arrays under "fields", organizations by id, the regions tracking each
+grant). The list page keeps the bundle in the browser's Cache Storage
+and from then on asks for ``?since=<cursor>``: only the grants the change
+log (youreka/changes.py) saw change since then, plus the ids that left
+the live table. Filtering then runs in the browser
+(static/js/catalogue.js mirrors parse_filters / grant_matches /
+collapse_duplicates), so changing a filter needs no request.
+
+/sw.js is a service worker that keeps visited pages and static files for
+when the connection drops.
+
+Without the change log every request gets the full bundle.
+"""
+
+import json
+import os
+
+from flask import current_app, send_from_directory
+from sqlalchemy import select
+
+from .changes import GRANT, GRANT_STATUS, events_since, latest_cursor
+from .extensions import db
+from .grants.filters import PROVINCE_NAMES
+from .models import Grant, GrantStatus, Organization
+
+FIELDS = (
+    "id", "name_en", "name_fr", "organization_id", "category", "province",
+    "region_scope", "team_scope", "individual_type", "language", "is_ngo_only",
+    "funding_min", "funding_max", "currency", "deadline_date", "source_url",
+    "cluster_id", "updated_at",
+)
+BUNDLE_VERSION = 1
+DELTA_PAGE_SIZE = 5000
+
+
+def _value(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def _rows(grant_ids=None):
+    """(rows, organizations, regions) for the live grants, or just ``grant_ids``."""
+    columns = [getattr(Grant, name) for name in FIELDS]
+    query = select(*columns).order_by(Grant.id)
+    statuses = select(GrantStatus.grant_id, GrantStatus.region_id)
+    if grant_ids is not None:
+        query = query.where(Grant.id.in_(grant_ids))
+        statuses = statuses.where(GrantStatus.grant_id.in_(grant_ids))
+    rows = [[_value(v) for v in row] for row in db.session.execute(query)]
+
+    regions = {}
+    for grant_id, region_id in db.session.execute(statuses):
+        regions.setdefault(str(grant_id), []).append(region_id)
+
+    org_ids = {row[FIELDS.index("organization_id")] for row in rows} - {None}
+    organizations = {}
+    if org_ids:
+        organizations = {
+            str(org_id): name
+            for org_id, name in db.session.execute(
+                select(Organization.id, Organization.name).where(Organization.id.in_(org_ids))
+            )
+        }
+    return rows, organizations, regions
+
+
+def _bundle(cursor, full, grant_ids=None):
+    rows, organizations, regions = _rows(grant_ids)
+    return {
+        "version": BUNDLE_VERSION,
+        "cursor": cursor,
+        "full": full,
+        "fields": FIELDS,
+        "grants": rows,
+        "removed": [],
+        "organizations": organizations,
+        "regions": regions,
+        "provinces": PROVINCE_NAMES,
+    }
+
+
+def full_bundle():
+    """
+    The whole catalogue as JSON text. Kept per process until the change
+    log moves, so repeated first visits don't rebuild it.
+    """
+    if not current_app.config.get("CHANGE_LOG_ENABLED", True):
+        return json.dumps(_bundle(None, True), separators=(",", ":"))
+    cursor = latest_cursor()
+    cached = current_app.extensions.get("catalogue_bundle")
+    if cached and cached[0] == cursor:
+        return cached[1]
+    text = json.dumps(_bundle(cursor, True), separators=(",", ":"))
+    current_app.extensions["catalogue_bundle"] = (cursor, text)
+    return text
+
+
+def delta_bundle(since):
+    """
+    JSON text with the grants changed after cursor ``since``. Raises
+    CursorExpired when the log no longer reaches back that far.
+    """
+    cursor, changed = since, set()
+    while True:
+        rows, has_more = events_since(cursor, DELTA_PAGE_SIZE)
+        changed.update(r.grant_id for r in rows if r.entity in (GRANT, GRANT_STATUS) and r.grant_id)
+        if rows:
+            cursor = rows[-1].id
+        if not has_more:
+            break
+    if not changed:
+        return json.dumps(_bundle(cursor, False, grant_ids=[]), separators=(",", ":"))
+
+    grant_ids = sorted(changed)
+    bundle = _bundle(cursor, False, grant_ids=grant_ids)
+    live = {row[0] for row in bundle["grants"]}
+    bundle["removed"] = [grant_id for grant_id in grant_ids if grant_id not in live]
+    return json.dumps(bundle, separators=(",", ":"))
+
+
+def init_offline(app):
+    js_dir = os.path.join(app.static_folder, "js")
+
+    @app.route("/sw.js")
+    def service_worker():
+        # Served from the root so it can control /en/ and /fr/ pages;
+        # browsers check it for updates on every visit
+        response = send_from_directory(js_dir, "sw.js", mimetype="text/javascript", max_age=0)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
@@ -0,0 +1,317 @@
+"""
+Admission control for the public site.
+
+Every list request scans and renders the whole (filtered) catalogue, so
+one aggressive crawler can keep all workers busy. Before any other work,
+each request is put in an endpoint class and checked twice:
+
+- Rate: a token bucket per (class, client IP), sized by RATE_LIMITS
+  (requests per minute, burst). An empty bucket answers 429 with
+  Retry-After right away.
+- Concurrency: endpoints in EXPENSIVE_ENDPOINTS share
+  EXPENSIVE_CONCURRENCY slots per process. A request that gets no slot
+  within EXPENSIVE_QUEUE_SECONDS answers 503 with Retry-After, instead of
+  queueing behind the slow ones. A slot is held until the (possibly
+  streamed) response is closed.
+
+Buckets live in process memory (RATE_LIMIT_MAX_CLIENTS, least recently
+seen dropped first), so each worker limits on its own. With
+RATE_LIMIT_STORAGE = "sqlite:///<path>" the workers of one host share
+their buckets through a small SQLite file instead.
+
+Rejections are counted in the metrics registry
+(http_requests_rejected_total, see youreka/instrumentation.py).
+"""
+
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, current_app, g, jsonify, request
+from flask_babel import ngettext
+
+from .instrumentation import metrics
+
+# Classes of endpoints; anything else (static files, /metrics, redirects)
+# is never limited
+LIST, DETAIL, WRITE, API = "list", "detail", "write", "api"
+LIST_ENDPOINTS = {"grants.index"}
+API_BLUEPRINTS = {"api", "calendar"}
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+metrics.describe(
+    "http_requests_rejected_total", "counter",
+    "Requests turned away by admission control, by endpoint class and reason.",
+)
+
+
+class TokenBucket:
+    """
+    Classic token bucket: ``rate`` tokens per second, up to ``capacity``.
+    ``acquire()`` blocks until a token is available and returns the time waited;
+    ``take()`` doesn't wait.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def take(self):
+        """Take a token if there is one: 0.0, else the seconds until there is."""
+        with self.lock:
+            self._refill(time.monotonic())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+# ---------------------------------------------------------
+# Bucket storage
+# ---------------------------------------------------------
+class MemoryBuckets:
+    """Buckets of this process, the least recently seen dropped past ``max_keys``."""
+
+    def __init__(self, max_keys=50000):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, rate, capacity):
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = TokenBucket(rate, capacity)
+                if len(self.buckets) > self.max_keys:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(key)
+        return bucket.take()
+
+
+class SQLiteBuckets:
+    """
+    Buckets in a SQLite file shared by the processes of one host. Each
+    check is one short write transaction; rows of buckets that would be
+    full again are deleted now and then.
+    """
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.calls = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets "
+            "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, full_at REAL NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")  # losing a bucket only forgives a client
+            self.local.conn = conn
+        return conn
+
+    def take(self, key, rate, capacity):
+        conn = self._conn()
+        now = time.time()  # shared between processes, unlike monotonic()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?)",
+                (key, tokens, now, now + (capacity - tokens) / rate),
+            )
+            self.calls += 1
+            if self.calls % self.PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM buckets WHERE full_at < ?", (now,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+
+def make_buckets(config):
+    storage = config.get("RATE_LIMIT_STORAGE")
+    if not storage:
+        return MemoryBuckets(config.get("RATE_LIMIT_MAX_CLIENTS", 50000))
+    if storage.startswith("sqlite:///"):
+        return SQLiteBuckets(storage[len("sqlite:///"):])
+    raise ValueError(f"Unsupported RATE_LIMIT_STORAGE: {storage!r}")
+
+
+# ---------------------------------------------------------
+# Concurrency
+# ---------------------------------------------------------
+class ConcurrencyLimiter:
+    """At most ``limit`` expensive requests at once in this process."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.semaphore = threading.BoundedSemaphore(limit)
+
+    def enter(self, timeout):
+        """A _Slot if one frees up within ``timeout`` seconds, else None."""
+        if timeout:
+            acquired = self.semaphore.acquire(timeout=timeout)
+        else:
+            acquired = self.semaphore.acquire(blocking=False)
+        if not acquired:
+            return None
+        return _Slot(self.semaphore)
+
+
+class _Slot:
+    def __init__(self, semaphore):
+        self.semaphore = semaphore
+        self.lock = threading.Lock()
+        self.released = False
+        self.on_close = False   # released with the response instead of at teardown
+
+    def release(self):
+        with self.lock:
+            if self.released:
+                return
+            self.released = True
+        self.semaphore.release()
+
+
+# ---------------------------------------------------------
+# Request hooks
+# ---------------------------------------------------------
+def endpoint_class(endpoint, blueprint, method):
+    """The rate limit class of a request, or None when it isn't limited."""
+    if endpoint is None or blueprint is None:
+        return None
+    if blueprint in API_BLUEPRINTS:
+        return API
+    if blueprint != "grants":
+        return None
+    if method not in SAFE_METHODS:
+        return WRITE
+    return LIST if endpoint in LIST_ENDPOINTS else DETAIL
+
+
+def client_address():
+    """The client's IP, trusting RATE_LIMIT_TRUSTED_PROXIES X-Forwarded-For hops."""
+    hops = current_app.config.get("RATE_LIMIT_TRUSTED_PROXIES", 0)
+    if hops:
+        forwarded = [a.strip() for a in request.headers.get("X-Forwarded-For", "").split(",") if a.strip()]
+        if len(forwarded) >= hops:
+            return forwarded[-hops]
+    return request.remote_addr or "unknown"
+
+
+def _reject(status, kind, reason, retry_after):
+    metrics.inc("http_requests_rejected_total", endpoint_class=kind, reason=reason)
+    seconds = max(1, math.ceil(retry_after))
+    if status == 429:
+        message = ngettext(
+            "Too many requests. Please try again in %(num)d second.",
+            "Too many requests. Please try again in %(num)d seconds.",
+            seconds,
+        )
+    else:
+        message = ngettext(
+            "The site is busy. Please try again in %(num)d second.",
+            "The site is busy. Please try again in %(num)d seconds.",
+            seconds,
+        )
+    if kind == API:
+        response = jsonify(error=message, retry_after=seconds)
+        response.status_code = status
+    else:
+        response = Response(message, status=status, mimetype="text/plain")
+    response.headers["Retry-After"] = str(seconds)
+    response.cache_control.no_store = True
+    return response
+
+
+def init_rate_limits(app):
+    if not app.config.get("ADMISSION_ENABLED", True):
+        return
+
+    limits = {
+        kind: (per_minute / 60.0, burst)
+        for kind, (per_minute, burst) in (app.config.get("RATE_LIMITS") or {}).items()
+    }
+    exempt = set(app.config.get("RATE_LIMIT_EXEMPT") or ())
+    expensive = set(app.config.get("EXPENSIVE_ENDPOINTS") or ())
+    queue_seconds = app.config.get("EXPENSIVE_QUEUE_SECONDS", 0.5)
+    limiter = ConcurrencyLimiter(app.config.get("EXPENSIVE_CONCURRENCY", 4))
+    app.extensions["admission"] = {"buckets": make_buckets(app.config), "limiter": limiter}
+
+    @app.before_request
+    def admit_request():
+        if not app.config.get("ADMISSION_ENABLED", True):
+            return None  # switched off at runtime (e.g. by build-static)
+        kind = endpoint_class(request.endpoint, request.blueprint, request.method)
+        if kind is None:
+            return None
+
+        client = client_address()
+        if kind in limits and client not in exempt:
+            rate, burst = limits[kind]
+            wait = app.extensions["admission"]["buckets"].take(f"{kind}:{client}", rate, burst)
+            if wait:
+                return _reject(429, kind, "rate_limited", wait)
+
+        if request.endpoint in expensive:
+            slot = limiter.enter(queue_seconds)
+            if slot is None:
+                # Roughly when a slot might free up: a request's worth of time
+                return _reject(503, kind, "overloaded", max(1.0, queue_seconds * 2))
+            g.admission_slot = slot
+        return None
+
+    @app.after_request
+    def release_with_response(response):
+        slot = g.get("admission_slot")
+        if slot is not None:
+            # Streamed pages keep reading rows until the body is sent
+            slot.on_close = True
+            response.call_on_close(slot.release)
+        return response
+
+    @app.teardown_request
+    def release_on_error(exc):
+        slot = g.get("admission_slot")
+        if slot is not None and not slot.on_close:
+            slot.release()
@@ -0,0 +1,383 @@
+"""
+Region-to-grant relevance scoring and materialized recommendations.
+
+Grants are encoded into NumPy feature arrays (province, scope, team
+scope, language, category, deadline, funding) and every (region, grant)
+pair is scored at once as an R x G matrix, chunk by chunk over the
+catalogue. The best RECOMMENDATIONS_PER_REGION (+ a buffer) per region
+are stored in region_recommendations.
+
+- refresh_all() rescores the whole catalogue (daily: deadlines move).
+- refresh_grants(ids) rescores only changed grants and merges them into
+  the stored lists; it falls back to refresh_all() when a region's
+  buffer runs out. Called from finalize_ingest().
+
+    flask --app app refresh-recommendations
+"""
+
+from datetime import date, datetime
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import delete, select
+from sqlalchemy.orm import joinedload
+
+from .bulk import bulk_insert
+from .extensions import db
+from .grants.filters import PROVINCE_NAMES
+from .models import Grant, GrantStatus, RegionRecommendation
+from .reference import active_regions
+
+CHUNK_SIZE = 50000
+
+PROVINCES = sorted(PROVINCE_NAMES.values())
+_PROVINCE_CODES = {name.lower(): i for i, name in enumerate(PROVINCES)}
+_PROVINCE_CODES.update({abbr.lower(): PROVINCES.index(name) for abbr, name in PROVINCE_NAMES.items()})
+
+SCOPES = {"national": 1, "provincial": 2, "municipal": 3, "regional": 3}
+TEAM_SCOPES = {"national": 1, "regional": 2}
+LANGUAGES = {"en": 1, "fr": 2, "bilingual": 3}
+
+# LANGUAGE_FIT[francophone region?][grant language code]
+#                 unknown  EN   FR   Bilingual
+LANGUAGE_FIT = np.array([
+    [0.6, 1.0, 0.3, 1.0],
+    [0.6, 0.4, 1.0, 1.0],
+], dtype=np.float32)
+
+# How strongly a region's past status on a grant says "we care about this category"
+STATUS_WEIGHTS = {
+    "Awarded": 3.0,
+    "Submitted": 2.0,
+    "In Progress": 1.5,
+    "Not Started": 0.5,
+    "Rejected": 0.5,
+}
+
+DEFAULT_WEIGHTS = {
+    "team": 1.0,
+    "language": 1.0,
+    "category": 1.5,
+    "deadline": 1.0,
+    "funding": 0.5,
+}
+
+GRANT_COLUMNS = (
+    Grant.id, Grant.province, Grant.region_scope, Grant.team_scope, Grant.category,
+    Grant.language, Grant.funding_min, Grant.funding_max, Grant.deadline_date,
+    Grant.ongoing_flag, Grant.cluster_id,
+)
+
+
+def _code(mapping, value):
+    return mapping.get((value or "").strip().lower(), 0)
+
+
+def _province_code(value):
+    return _PROVINCE_CODES.get((value or "").strip().lower(), -1)
+
+
+# ---------------------------------------------------------
+# Encoding
+# ---------------------------------------------------------
+def encode_grants(rows, categories, today):
+    """
+    Turn grant rows (GRANT_COLUMNS order) into feature arrays.
+    ``categories`` maps category name -> code and grows as needed.
+    """
+    n = len(rows)
+    enc = {
+        "id": np.empty(n, dtype=np.int64),
+        "province": np.empty(n, dtype=np.int16),
+        "scope": np.empty(n, dtype=np.int8),
+        "team": np.empty(n, dtype=np.int8),
+        "category": np.empty(n, dtype=np.int32),
+        "language": np.empty(n, dtype=np.int8),
+        "funding": np.full(n, np.nan, dtype=np.float32),
+        "days": np.full(n, np.nan, dtype=np.float32),
+        "ongoing": np.zeros(n, dtype=bool),
+        "duplicate": np.zeros(n, dtype=bool),
+    }
+    for i, row in enumerate(rows):
+        (grant_id, province, scope, team, category, language,
+         funding_min, funding_max, deadline, ongoing, cluster_id) = row
+        enc["id"][i] = grant_id
+        enc["province"][i] = _province_code(province)
+        enc["scope"][i] = _code(SCOPES, scope)
+        enc["team"][i] = _code(TEAM_SCOPES, team)
+        enc["category"][i] = categories.setdefault(category or "", len(categories))
+        enc["language"][i] = _code(LANGUAGES, language)
+        if funding_max or funding_min:
+            enc["funding"][i] = funding_max or funding_min
+        if deadline:
+            enc["days"][i] = (deadline - today).days
+        enc["ongoing"][i] = bool(ongoing)
+        # Only the canonical grant of a duplicate cluster is recommended
+        enc["duplicate"][i] = cluster_id is not None and cluster_id != grant_id
+    return enc
+
+
+def _is_francophone(region):
+    name = f"{region.name_en} {region.name_fr or ''}".lower()
+    return region.province == "QC" or "french" in name or "franco" in name
+
+
+def encode_regions(regions):
+    return {
+        "id": np.array([r.id for r in regions], dtype=np.int64),
+        "province": np.array([_province_code(r.province) for r in regions], dtype=np.int16),
+        "national": np.array(
+            [r.province is None and not _is_francophone(r) for r in regions], dtype=bool
+        ),
+        "francophone": np.array([_is_francophone(r) for r in regions], dtype=np.int8),
+    }
+
+
+def category_affinity(regions, categories):
+    """
+    R x C matrix in [0, 1]: how much each region has engaged with each
+    category (from its GrantStatus rows). Regions without history get a
+    flat 0.5 so category neither helps nor hurts.
+    """
+    index = {region.id: i for i, region in enumerate(regions)}
+    rows = db.session.execute(
+        select(GrantStatus.region_id, Grant.category, GrantStatus.status)
+        .join(Grant, Grant.id == GrantStatus.grant_id)
+    ).all()
+
+    for _, category, _ in rows:
+        categories.setdefault(category or "", len(categories))
+    affinity = np.zeros((len(regions), len(categories)), dtype=np.float32)
+    if rows:
+        r = np.array([index.get(region_id, -1) for region_id, _, _ in rows])
+        c = np.array([categories[category or ""] for _, category, _ in rows])
+        w = np.array([STATUS_WEIGHTS.get(status, 0.5) for _, _, status in rows], dtype=np.float32)
+        keep = r >= 0
+        np.add.at(affinity, (r[keep], c[keep]), w[keep])
+
+    if not categories:
+        return np.full((len(regions), 0), 0.5, dtype=np.float32)
+    totals = affinity.max(axis=1, keepdims=True)
+    return np.where(totals > 0, affinity / np.maximum(totals, 1e-9), 0.5).astype(np.float32)
+
+
+def _grow(affinity, n_categories):
+    """Pad the affinity matrix for categories first seen after it was built."""
+    if affinity.shape[1] >= n_categories:
+        return affinity
+    no_history = (affinity == 0.5).all(axis=1, keepdims=True)
+    pad = np.where(no_history, 0.5, 0.0).astype(np.float32)
+    return np.hstack([affinity, np.repeat(pad, n_categories - affinity.shape[1], axis=1)])
+
+
+# ---------------------------------------------------------
+# Scoring
+# ---------------------------------------------------------
+def score_matrix(regions, grants, affinity, weights=None, max_funding=None):
+    """R x G relevance scores in [0, 1]; 0 means "not for this region"."""
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+
+    # Geography gates everything else
+    region_prov = regions["province"][:, None]
+    same_province = (region_prov == grants["province"][None, :]) & (region_prov >= 0)
+    grant_national = (grants["scope"] == SCOPES["national"]) | (grants["province"] < 0)
+    municipal = grants["scope"] == SCOPES["municipal"]
+    geo = np.where(
+        same_province,
+        np.where(municipal, 0.8, 1.0)[None, :],
+        np.where(grant_national, 0.6, 0.0)[None, :],
+    )
+    geo = np.where(regions["national"][:, None], np.where(grant_national, 1.0, 0.25)[None, :], geo)
+
+    # Team scope: national regions want national grants, city teams regional ones
+    team = grants["team"][None, :]
+    wants_national = regions["national"][:, None]
+    team_fit = np.where(
+        team == 0, 0.5,
+        np.where((team == TEAM_SCOPES["national"]) == wants_national, 1.0, 0.2),
+    )
+
+    language_fit = LANGUAGE_FIT[regions["francophone"][:, None], grants["language"][None, :]]
+    category_fit = _grow(affinity, int(grants["category"].max(initial=0)) + 1)[:, grants["category"]]
+
+    # Per-grant terms (broadcast over regions)
+    days = grants["days"]
+    urgency = np.where(
+        np.isnan(days),
+        np.where(grants["ongoing"], 0.5, 0.3),
+        np.clip(1.0 - np.nan_to_num(days) / 365.0, 0.1, 1.0),
+    )
+    funding = np.nan_to_num(grants["funding"])
+    if max_funding is None:
+        max_funding = funding.max(initial=0.0)
+    funding_fit = np.log1p(funding) / np.log1p(max(max_funding, 1.0))
+
+    total = sum(weights.values())
+    score = geo * (
+        weights["team"] * team_fit
+        + weights["language"] * language_fit
+        + weights["category"] * category_fit
+        + weights["deadline"] * urgency[None, :]
+        + weights["funding"] * funding_fit[None, :]
+    ) / total
+
+    closed = (days < 0) | grants["duplicate"]
+    score[:, closed] = 0.0
+    return score.astype(np.float32)
+
+
+def top_k(scores, ids, k):
+    """Best k (ids, scores) per row, sorted descending; zero scores dropped."""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return [([], []) for _ in range(scores.shape[0])]
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    best = np.take_along_axis(part, order, axis=1)
+    result = []
+    for row, cols in enumerate(best):
+        row_scores = scores[row, cols]
+        keep = row_scores > 0
+        result.append((ids[cols[keep]].tolist(), row_scores[keep].tolist()))
+    return result
+
+
+# ---------------------------------------------------------
+# Materialization
+# ---------------------------------------------------------
+def _settings():
+    config = current_app.config
+    per_region = config.get("RECOMMENDATIONS_PER_REGION", 20)
+    return per_region, per_region + config.get("RECOMMENDATIONS_BUFFER", 20), config.get("RECOMMENDATION_WEIGHTS")
+
+
+def _context():
+    regions = active_regions()
+    categories = {}
+    affinity = category_affinity(regions, categories)
+    max_funding = db.session.query(db.func.max(db.func.coalesce(Grant.funding_max, Grant.funding_min))).scalar()
+    return regions, encode_regions(regions), categories, affinity, max_funding or 0.0
+
+
+def _store(regions, best, keep):
+    table = RegionRecommendation.__table__
+    now = datetime.utcnow()
+    conn = db.session.connection()
+    conn.execute(delete(table).where(table.c.region_id.in_([r.id for r in regions])))
+    rows = []
+    for region, (ids, scores) in zip(regions, best):
+        for rank, (grant_id, score) in enumerate(zip(ids[:keep], scores[:keep]), start=1):
+            rows.append({
+                "region_id": region.id, "grant_id": int(grant_id), "score": float(score),
+                "rank": rank, "computed_at": now,
+            })
+    bulk_insert(conn, table, rows)
+    return len(rows)
+
+
+def refresh_all(chunk_size=CHUNK_SIZE):
+    """Rescore the whole catalogue and rewrite every region's list."""
+    _, keep, weights = _settings()
+    regions, reg, categories, affinity, max_funding = _context()
+    if not regions:
+        return {"regions": 0, "grants": 0, "stored": 0}
+
+    today = date.today()
+    best_ids = np.zeros((len(regions), 0), dtype=np.int64)
+    best_scores = np.zeros((len(regions), 0), dtype=np.float32)
+    scanned, last_id = 0, 0
+    while True:
+        rows = db.session.execute(
+            select(*GRANT_COLUMNS).where(Grant.id > last_id).order_by(Grant.id).limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        scanned += len(rows)
+
+        grants = encode_grants(rows, categories, today)
+        scores = score_matrix(reg, grants, affinity, weights, max_funding)
+        # Keep a running top-k: previous best + this chunk
+        all_scores = np.hstack([best_scores, scores])
+        all_ids = np.hstack([best_ids, np.tile(grants["id"], (len(regions), 1))])
+        k = min(keep, all_scores.shape[1])
+        part = np.argpartition(-all_scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(all_scores, part, axis=1)
+        best_ids = np.take_along_axis(all_ids, part, axis=1)
+
+    best = []
+    for row in range(len(regions)):
+        order = np.argsort(-best_scores[row], kind="stable")
+        scores = best_scores[row, order]
+        keep_mask = scores > 0
+        best.append((best_ids[row, order][keep_mask].tolist(), scores[keep_mask].tolist()))
+    stored = _store(regions, best, keep)
+    db.session.commit()
+    return {"regions": len(regions), "grants": scanned, "stored": stored}
+
+
+def refresh_grants(grant_ids):
+    """
+    Rescore only ``grant_ids`` and merge them into the stored lists.
+    Falls back to refresh_all() if a region no longer has enough stored
+    candidates to fill its list (a stored grant dropped out).
+    """
+    per_region, keep, weights = _settings()
+    grant_ids = sorted(set(grant_ids))
+    regions, reg, categories, affinity, max_funding = _context()
+    if not regions or not grant_ids:
+        return {"regions": len(regions), "grants": 0, "stored": 0}
+
+    stored = {}
+    for rec in RegionRecommendation.query.filter(
+        RegionRecommendation.region_id.in_([r.id for r in regions])
+    ):
+        stored.setdefault(rec.region_id, {})[rec.grant_id] = rec.score
+    if not stored:
+        return refresh_all()
+
+    changed = set(grant_ids)
+    candidates = [
+        {gid: score for gid, score in stored.get(region.id, {}).items() if gid not in changed}
+        for region in regions
+    ]
+    full_before = [len(stored.get(region.id, {})) >= keep for region in regions]
+
+    today = date.today()
+    for start in range(0, len(grant_ids), CHUNK_SIZE):
+        chunk = grant_ids[start:start + CHUNK_SIZE]
+        rows = db.session.execute(select(*GRANT_COLUMNS).where(Grant.id.in_(chunk))).all()
+        if not rows:
+            continue
+        grants = encode_grants(rows, categories, today)
+        scores = score_matrix(reg, grants, affinity, weights, max_funding)
+        for row, ids_scores in enumerate(top_k(scores, grants["id"], keep)):
+            candidates[row].update(zip(*ids_scores))
+
+    best = []
+    for row, merged in enumerate(candidates):
+        ranked = sorted(merged.items(), key=lambda item: (-item[1], item[0]))[:keep]
+        # A region whose list was full may now hide better grants we didn't rescore
+        if full_before[row] and len(ranked) < per_region:
+            return refresh_all()
+        best.append(([gid for gid, _ in ranked], [score for _, score in ranked]))
+
+    count = _store(regions, best, keep)
+    db.session.commit()
+    return {"regions": len(regions), "grants": len(grant_ids), "stored": count}
+
+
+def recommendations_for(region_id, limit=None):
+    """Stored recommendations for a region, best first."""
+    if limit is None:
+        limit = current_app.config.get("RECOMMENDATIONS_PER_REGION", 20)
+    return (
+        RegionRecommendation.query.options(
+            joinedload(RegionRecommendation.grant).joinedload(Grant.organization)
+        )
+        .filter(RegionRecommendation.region_id == region_id)
+        .order_by(RegionRecommendation.rank)
+        .limit(limit)
+        .all()
+    )
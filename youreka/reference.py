@@ -0,0 +1,149 @@
+"""
+Process-local cache of reference data: regions and organizations.
+
+They change a few times a year but every page reads them (region
+pickers, the selected region, scrapers finding their organization).
+Each process keeps a snapshot of both tables. reference_versions holds
+a counter per table that every write bumps in the same transaction:
+
+- ORM writes: a session listener bumps it on flush.
+- Core writes (synthetic catalogue): call bump_versions() yourself.
+
+A process compares its snapshot's version with the counter at most every
+REFERENCE_CHECK_SECONDS and reloads the table when the counter moved, so
+all workers pick up a change within that window (the writing process
+right away).
+
+Snapshots are read-only named tuples with the model's column names, so
+templates and code reading ``region.name_en`` or ``org.id`` don't change.
+"""
+
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from flask import abort, current_app, has_app_context
+from sqlalchemy import event, insert, select, update
+
+from .extensions import db
+from .models import Organization, Region, ReferenceVersion
+
+MODELS = {"regions": Region, "organizations": Organization}
+
+_TUPLES = {
+    name: namedtuple(model.__name__ + "Ref", [c.name for c in model.__table__.columns])
+    for name, model in MODELS.items()
+}
+
+
+class _Snapshot:
+    def __init__(self, version, rows):
+        self.version = version
+        self.rows = rows                       # ordered by id
+        self.by_id = {row.id: row for row in rows}
+        self.by_name = {row.name: row for row in rows if hasattr(row, "name")}  # organizations
+        self.checked = time.monotonic()
+
+
+def bump_versions(conn, names):
+    """Increment the counters of ``names`` (keys of MODELS) on ``conn``."""
+    table = ReferenceVersion.__table__
+    now = datetime.utcnow()
+    for name in names:
+        result = conn.execute(
+            update(table).where(table.c.name == name).values(version=table.c.version + 1, updated_at=now)
+        )
+        if not result.rowcount:
+            conn.execute(insert(table).values(name=name, version=1, updated_at=now))
+    if has_app_context():
+        # This process sees its own write on the next read
+        for name in names:
+            current_app.extensions.get("reference_cache", {}).pop(name, None)
+
+
+def _record_flush(session, flush_context):
+    names = {
+        name
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        for name, model in MODELS.items()
+        if isinstance(obj, model)
+    }
+    if names:
+        bump_versions(session.connection(), sorted(names))
+
+
+def _version(name):
+    table = ReferenceVersion.__table__
+    return db.session.execute(select(table.c.version).where(table.c.name == name)).scalar() or 0
+
+
+def _snapshot(name):
+    cache = current_app.extensions.setdefault("reference_cache", {})
+    snap = cache.get(name)
+    interval = current_app.config.get("REFERENCE_CHECK_SECONDS", 5)
+    if snap is not None and time.monotonic() - snap.checked < interval:
+        return snap
+
+    version = _version(name)
+    if snap is not None and snap.version == version:
+        snap.checked = time.monotonic()
+        return snap
+
+    model, ref = MODELS[name], _TUPLES[name]
+    rows = [ref(*row) for row in db.session.execute(select(*model.__table__.c).order_by(model.id))]
+    snap = cache[name] = _Snapshot(version, rows)
+    return snap
+
+
+def reference_version(name):
+    """The version of table ``name`` this process sees, for cache keys and ETags."""
+    return _snapshot(name).version
+
+
+# ---------------------------------------------------------
+# Regions
+# ---------------------------------------------------------
+def active_regions():
+    """Active regions ordered by id."""
+    return [r for r in _snapshot("regions").rows if r.is_active]
+
+
+def get_region(region_id):
+    return _snapshot("regions").by_id.get(region_id) if region_id else None
+
+
+def get_region_or_404(region_id):
+    region = get_region(region_id)
+    if region is None:
+        abort(404)
+    return region
+
+
+# ---------------------------------------------------------
+# Organizations
+# ---------------------------------------------------------
+def get_organization(organization_id):
+    return _snapshot("organizations").by_id.get(organization_id) if organization_id else None
+
+
+def get_organization_by_name(name):
+    return _snapshot("organizations").by_name.get(name)
+
+
+def get_or_create_organization(name, **defaults):
+    """The organization called ``name``, created (and committed) if missing."""
+    org = get_organization_by_name(name)
+    if org is not None:
+        return org
+    # The snapshot may lag a write by another process; the table has the final word
+    existing = Organization.query.filter_by(name=name).first()
+    if existing is None:
+        existing = Organization(name=name, **defaults)
+        db.session.add(existing)
+        db.session.commit()
+    return _TUPLES["organizations"](*(getattr(existing, c.name) for c in Organization.__table__.columns))
+
+
+def init_reference_cache(app):
+    if not event.contains(db.session, "after_flush", _record_flush):
+        event.listen(db.session, "after_flush", _record_flush)
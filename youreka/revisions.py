@@ -0,0 +1,203 @@
+"""
+Delta-compressed revision history for grants.
+
+Programs like OTF's Seed and Grow grants reopen every funding cycle on the
+same page, so a re-scrape overwrites last cycle's deadline and amounts.
+Each changed version is kept in grant_revisions. Full copies of
+the long description/eligibility texts are avoided: a revision stores only
+the fields that changed since the previous one, texts as word-level diffs,
+as compressed JSON. Every KEYFRAME_INTERVAL-th revision is a full copy,
+so rebuilding any version never replays more than that many deltas.
+"""
+
+import json
+import re
+import zlib
+from datetime import date
+from difflib import SequenceMatcher
+
+from sqlalchemy import func
+
+from .extensions import db
+from .models import GrantRevision
+
+# Grant columns a revision tracks
+TRACKED_FIELDS = (
+    "name_en", "name_fr", "description_en", "description_fr", "eligibility_en", "eligibility_fr",
+    "organization_id", "category", "province", "region_scope", "country", "team_scope",
+    "individual_type", "funding_min", "funding_max", "currency", "deadline_date", "ongoing_flag",
+    "language", "is_ngo_only", "source_url",
+)
+# Long texts are stored as token diffs; everything else as the new value
+TEXT_FIELDS = ("description_en", "description_fr", "eligibility_en", "eligibility_fr")
+KEYFRAME_INTERVAL = 10
+
+_TOKEN_RE = re.compile(r"\s+|\S+")
+
+
+def revision_values(grant):
+    """JSON-able {field: value} of a grant's tracked fields."""
+    values = {}
+    for field in TRACKED_FIELDS:
+        value = getattr(grant, field)
+        values[field] = value.isoformat() if isinstance(value, date) else value
+    return values
+
+
+# ---------------------------------------------------------
+# Text diffs
+# ---------------------------------------------------------
+def _tokens(text):
+    return _TOKEN_RE.findall(text or "")
+
+
+def text_diff(old, new):
+    """
+    Ops turning ``old`` into ``new``: n > 0 copies n old tokens, n < 0
+    skips n old tokens, a string is inserted as-is.
+    """
+    a, b = _tokens(old), _tokens(new)
+    ops = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == "equal":
+            ops.append(i2 - i1)
+        if tag in ("delete", "replace"):
+            ops.append(i1 - i2)
+        if tag in ("insert", "replace"):
+            ops.append("".join(b[j1:j2]))
+    return ops
+
+
+def apply_text_diff(old, ops):
+    tokens, out, i = _tokens(old), [], 0
+    for op in ops:
+        if isinstance(op, str):
+            out.append(op)
+        elif op > 0:
+            out.extend(tokens[i:i + op])
+            i += op
+        else:
+            i -= op
+    return "".join(out)
+
+
+# ---------------------------------------------------------
+# Encoding
+# ---------------------------------------------------------
+def _pack(payload):
+    return zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"), 9)
+
+
+def _unpack(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def make_delta(old, new):
+    """Payload with the fields that differ: {"f": {field: value}, "t": {field: ops}}."""
+    fields, texts = {}, {}
+    for field in TRACKED_FIELDS:
+        if old.get(field) == new.get(field):
+            continue
+        if field in TEXT_FIELDS and old.get(field) and new.get(field):
+            texts[field] = text_diff(old[field], new[field])
+        else:
+            fields[field] = new.get(field)
+    return {"f": fields, "t": texts}
+
+
+def apply_delta(values, payload):
+    values = dict(values)
+    values.update(payload.get("f", {}))
+    for field, ops in payload.get("t", {}).items():
+        values[field] = apply_text_diff(values.get(field), ops)
+    return values
+
+
+# ---------------------------------------------------------
+# Storage
+# ---------------------------------------------------------
+def _rows(grant_id, upto=None):
+    """Revision rows from the last keyframe at or before ``upto`` (default: latest)."""
+    keyframes = db.session.query(func.max(GrantRevision.revision)).filter(
+        GrantRevision.grant_id == grant_id, GrantRevision.is_keyframe.is_(True)
+    )
+    if upto is not None:
+        keyframes = keyframes.filter(GrantRevision.revision <= upto)
+    start = keyframes.scalar()
+    if start is None:
+        return []
+    query = GrantRevision.query.filter(
+        GrantRevision.grant_id == grant_id, GrantRevision.revision >= start
+    )
+    if upto is not None:
+        query = query.filter(GrantRevision.revision <= upto)
+    return query.order_by(GrantRevision.revision).all()
+
+
+def _replay(rows):
+    values = {}
+    for row in rows:
+        payload = _unpack(row.delta)
+        values = dict(payload) if row.is_keyframe else apply_delta(values, payload)
+    return values
+
+
+def grant_version(grant_id, revision=None):
+    """Field values of ``revision`` (default: latest), or None if it doesn't exist."""
+    rows = _rows(grant_id, revision)
+    if not rows or (revision is not None and rows[-1].revision != revision):
+        return None
+    return _replay(rows)
+
+
+def grant_versions(grant_id):
+    """[(GrantRevision, values)] for every revision, oldest first, in one pass."""
+    versions, values = [], {}
+    for row in GrantRevision.query.filter_by(grant_id=grant_id).order_by(GrantRevision.revision):
+        payload = _unpack(row.delta)
+        values = dict(payload) if row.is_keyframe else apply_delta(values, payload)
+        versions.append((row, values))
+    return versions
+
+
+def _add(grant_id, revision, payload, keyframe, changed, source):
+    db.session.add(GrantRevision(
+        grant_id=grant_id,
+        revision=revision,
+        is_keyframe=keyframe,
+        delta=_pack(payload),
+        changed_fields=",".join(changed)[:500] or None,
+        source=source,
+    ))
+
+
+def record_revision(grant, previous=None, source=None):
+    """
+    Store the grant's current values as a new revision if they differ
+    from the latest one. ``previous`` (values before this change) seeds the
+    history of grants that existed before revisions were kept. Returns the
+    new revision number, or None if nothing changed.
+    """
+    current = revision_values(grant)
+    latest = (
+        db.session.query(func.max(GrantRevision.revision))
+        .filter(GrantRevision.grant_id == grant.id)
+        .scalar()
+    )
+    if latest is None:
+        if previous is None or previous == current:
+            _add(grant.id, 1, current, True, [], source)
+            return 1
+        _add(grant.id, 1, previous, True, [], "baseline")
+        latest, last_values = 1, previous
+    else:
+        last_values = _replay(_rows(grant.id))
+
+    delta = make_delta(last_values, current)
+    changed = sorted({*delta["f"], *delta["t"]})
+    if not changed:
+        return None
+    revision = latest + 1
+    keyframe = revision % KEYFRAME_INTERVAL == 1
+    _add(grant.id, revision, current if keyframe else delta, keyframe, changed, source)
+    return revision
@@ -0,0 +1,177 @@
+"""
+Saved searches and incremental matching of ingested grants.
+
+Each saved search is filed in saved_search_keys under one equality
+filter it requires (region, category, team scope, language, type or
+province, most selective first), or under "*" if it has none. When
+grants are ingested, each grant only looks up the searches filed under
+its own values plus "*", and checks those few with grant_matches() —
+no saved search is ever re-run against the whole table. A region
+filter matches the grants the region tracks, so a region starting to
+track a grant checks the searches filed under that region too.
+
+Matches are queued in search_notifications and sent as batched digests
+by `flask send-search-notifications` (see email_utils).
+"""
+
+import secrets
+from datetime import datetime
+from urllib.parse import parse_qsl, urlencode
+
+from sqlalchemy import select, tuple_
+from werkzeug.datastructures import MultiDict
+
+from .bulk import bulk_insert
+from .extensions import db
+from .grants.filters import grant_matches, parse_filters
+from .models import Grant, GrantStatus, SavedSearch, SavedSearchKey, SearchNotification
+
+# Query params that make up a search (same names as the list page form)
+FILTER_PARAMS = (
+    "region_id", "province", "ngo_only", "min_amount", "max_amount", "category",
+    "language", "team_scope", "individual_type", "deadline_before",
+)
+# Indexable equality filters, most selective first
+INDEXED_FIELDS = ("region_id", "category", "team_scope", "individual_type", "language", "province")
+CATCH_ALL = ("*", "")
+CHUNK_SIZE = 500
+
+
+def normalize_query(args):
+    """Canonical query string for the filter params in ``args``."""
+    pairs = sorted(
+        (key, value.strip())
+        for key, value in args.items(multi=True)
+        if key in FILTER_PARAMS and value and value.strip()
+    )
+    return urlencode(pairs)
+
+
+def search_filters(search):
+    return parse_filters(MultiDict(parse_qsl(search.query_string)))
+
+
+def index_key(filters):
+    """The (field, value) a search with these filters is filed under."""
+    for field in INDEXED_FIELDS:
+        if field in filters:
+            return field, str(filters[field])
+    return CATCH_ALL
+
+
+def grant_keys(grant, region_ids):
+    """Every (field, value) under which a search matching ``grant`` could be filed."""
+    keys = {CATCH_ALL}
+    keys.update(("region_id", str(region_id)) for region_id in region_ids)
+    for field in ("category", "team_scope", "individual_type", "language"):
+        value = getattr(grant, field)
+        if value:
+            keys.add((field, value))
+    if grant.province:
+        keys.add(("province", grant.province.lower()))
+    return keys
+
+
+def create_saved_search(email, args, name=None, lang="en"):
+    """Save (or re-activate) a search for ``email``. Returns the SavedSearch."""
+    query = normalize_query(args)
+    search = SavedSearch.query.filter_by(email=email, query_string=query).first()
+    if search:
+        search.is_active = True
+        if name:
+            search.name = name
+        db.session.commit()
+        return search
+
+    filters = parse_filters(MultiDict(parse_qsl(query)))
+    search = SavedSearch(
+        email=email,
+        name=name,
+        query_string=query,
+        lang=lang,
+        region_id=filters.get("region_id"),
+        token=secrets.token_urlsafe(24),
+    )
+    db.session.add(search)
+    db.session.flush()
+    field, value = index_key(filters)
+    db.session.add(SavedSearchKey(field=field, value=value, saved_search_id=search.id))
+    db.session.commit()
+    return search
+
+
+def _region_ids(grant_ids):
+    regions = {}
+    for grant_id, region_id in db.session.execute(
+        select(GrantStatus.grant_id, GrantStatus.region_id).where(GrantStatus.grant_id.in_(grant_ids))
+    ):
+        regions.setdefault(grant_id, set()).add(region_id)
+    return regions
+
+
+def queue_matches(grant_ids, chunk_size=CHUNK_SIZE, region_id=None):
+    """
+    Find the active saved searches each of ``grant_ids`` matches and queue
+    a notification for every (search, grant) pair not already queued.
+    With ``region_id`` (a region just started tracking the grants) only
+    the searches filed under that region are checked. Runs in the current
+    transaction; the caller commits.
+    """
+    grant_ids = sorted(set(grant_ids))
+    stats = {"grants": 0, "candidates": 0, "queued": 0}
+    filters_cache = {}
+
+    for start in range(0, len(grant_ids), chunk_size):
+        chunk = grant_ids[start:start + chunk_size]
+        grants = Grant.query.filter(Grant.id.in_(chunk)).all()
+        regions = _region_ids(chunk)
+        stats["grants"] += len(grants)
+
+        if region_id is not None:
+            keys = {grant.id: {("region_id", str(region_id))} for grant in grants}
+        else:
+            keys = {grant.id: grant_keys(grant, regions.get(grant.id, ())) for grant in grants}
+        all_keys = list(set().union(*keys.values())) if keys else []
+        filed = {}
+        for field, value, search_id in db.session.execute(
+            select(SavedSearchKey.field, SavedSearchKey.value, SavedSearchKey.saved_search_id)
+            .join(SavedSearch, SavedSearch.id == SavedSearchKey.saved_search_id)
+            .where(
+                SavedSearch.is_active.is_(True),
+                tuple_(SavedSearchKey.field, SavedSearchKey.value).in_(all_keys),
+            )
+        ):
+            filed.setdefault((field, value), set()).add(search_id)
+
+        missing = {sid for ids in filed.values() for sid in ids} - set(filters_cache)
+        if missing:
+            for search in SavedSearch.query.filter(SavedSearch.id.in_(missing)):
+                filters_cache[search.id] = search_filters(search)
+
+        pairs = []
+        for grant in grants:
+            # Duplicates of a program are only announced once (canonical grant)
+            if grant.cluster_id is not None and grant.cluster_id != grant.id:
+                continue
+            candidates = set().union(*(filed.get(key, ()) for key in keys[grant.id]))
+            stats["candidates"] += len(candidates)
+            for search_id in candidates:
+                if grant_matches(grant, filters_cache[search_id], regions.get(grant.id, ())):
+                    pairs.append((search_id, grant.id))
+
+        if pairs:
+            already = set(db.session.execute(
+                select(SearchNotification.saved_search_id, SearchNotification.grant_id).where(
+                    tuple_(SearchNotification.saved_search_id, SearchNotification.grant_id).in_(pairs)
+                )
+            ).tuples())
+            now = datetime.utcnow()
+            rows = [
+                {"saved_search_id": search_id, "grant_id": grant_id, "created_at": now}
+                for search_id, grant_id in pairs
+                if (search_id, grant_id) not in already
+            ]
+            bulk_insert(db.session.connection(), SearchNotification.__table__, rows)
+            stats["queued"] += len(rows)
+
+    return stats
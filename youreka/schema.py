@@ -0,0 +1,46 @@
+"""
+Additive schema upgrades for existing databases.
+
+db.create_all() only creates missing tables. ensure_schema() also adds
+indexes (and nullable columns) that were declared on the models after a
+database was first created, so older SQLite files and the production
+Postgres pick them up on the next start without a migration tool.
+"""
+
+from sqlalchemy import inspect, text
+
+from .extensions import db
+
+
+def _add_missing_columns(conn, inspector, table):
+    existing = {c["name"] for c in inspector.get_columns(table.name)}
+    added = []
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        if not column.nullable or column.primary_key:
+            # Can't be added in place; needs a real migration
+            continue
+        col_type = column.type.compile(dialect=conn.dialect)
+        conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {col_type}'))
+        added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def ensure_schema():
+    """Create missing nullable columns and indexes. Returns what was added."""
+    added = []
+    with db.engine.begin() as conn:
+        inspector = inspect(conn)
+        tables = set(inspector.get_table_names())
+        for table in db.metadata.sorted_tables:
+            if table.name not in tables:
+                continue
+            added += _add_missing_columns(conn, inspector, table)
+
+            existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(conn)
+                    added.append(index.name)
+    return added
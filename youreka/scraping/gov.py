@@ -1,8 +1,12 @@
-import requests
 from bs4 import BeautifulSoup
 from datetime import datetime
 from urllib.parse import urljoin
-from youreka.models import Grant, Organization, db
+from youreka.models import db
+from youreka.reference import get_or_create_organization
+from youreka.ingest import finalize_ingest
+from .metrics import current_run, scrape_run
+from .scheduler import fetch_html
+from .upsert import needs_refresh, stored_grant, upsert_grant
 
 BASE = "https://www.ontario.ca"
 URL = "https://www.ontario.ca/page/available-funding-opportunities-ontario-government"
@@ -13,15 +17,17 @@ EDU_KEYWORDS = [
 ]
 
 
-def fetch_html(url):
-    res = requests.get(url, headers={"User-Agent": "Mozilla/5.0"})
-    res.raise_for_status()
-    return res.text
-
-
 def scrape_program_page(link):
     """Scrape the program's DEDICATED page for real info."""
     html = fetch_html(link)
+    run = current_run()
+    if run is not None:
+        with run.phase("parse"):
+            return parse_program_details(html)
+    return parse_program_details(html)
+
+
+def parse_program_details(html):
     soup = BeautifulSoup(html, "html.parser")
 
     # Description is usually the first paragraph after h1
@@ -55,75 +61,96 @@ def scrape_program_page(link):
 def scrape_ontario():
     print("Scraping Ontario — WITH SUBPAGE DETAILS...")
 
-    # Ensure organization exists
-    org = Organization.query.filter_by(name="Ontario Government").first()
-    if not org:
-        org = Organization(
-            name="Ontario Government",
-            type="Government",
-            country="Canada",
-            province="Ontario"
-        )
-        db.session.add(org)
-        db.session.commit()
-
-    html = fetch_html(URL)
-    soup = BeautifulSoup(html, "html.parser")
-
-    created = 0
-
-    for h2 in soup.find_all("h2"):
-        title = h2.get_text(strip=True)
-
-        # Skip filler sections
-        if "Overview" in title or "On this page" in title:
-            continue
-
-        # Keyword filter
-        if not any(k in title.lower() for k in EDU_KEYWORDS):
-            continue
-
-        # Find the clickable link for the program
-        link_tag = h2.find_next("a")
-        if not link_tag:
-            continue
-
-        relative_link = link_tag.get("href")
-        full_link = urljoin(BASE, relative_link)
-
-        external_id = f"ontario-{title}"
-
-        # Skip duplicates
-        if Grant.query.filter_by(external_id=external_id).first():
-            continue
-
-        # Scrape subpage (REAL info)
-        description, eligibility, deadline = scrape_program_page(full_link)
-
-        grant = Grant(
-            name_en=title,
-            description_en=description or "No description available.",
-            eligibility_en=eligibility or "Eligibility criteria not specified.",
-            category="Education/Technology",
-            organization=org,
-            language="EN",
-            region_scope="Provincial",
-            province="Ontario",
-            source_url=full_link,
-            external_id=external_id,
-        )
-
-        # Parse deadline date if possible
-        try:
-            if deadline:
-                grant.deadline_date = datetime.strptime(
-                    deadline.split(" at ")[0], "%B %d, %Y"
-                ).date()
-        except:
-            pass
-
-        db.session.add(grant)
-        created += 1
-
-    db.session.commit()
-    print(f"Ontario scraping finished. Created {created} grants.")
+    with scrape_run("ontario") as run:
+        # Ensure organization exists
+        with run.phase("db"):
+            org = get_or_create_organization(
+                "Ontario Government",
+                type="Government",
+                country="Canada",
+                province="Ontario"
+            )
+
+        html = fetch_html(URL)
+        with run.phase("parse"):
+            soup = BeautifulSoup(html, "html.parser")
+            headings = soup.find_all("h2")
+
+        created = 0
+        updated = 0
+        new_grants = []
+        changed_grants = []
+
+        for h2 in headings:
+            title = h2.get_text(strip=True)
+
+            # Skip filler sections
+            if "Overview" in title or "On this page" in title:
+                continue
+
+            # Keyword filter
+            if not any(k in title.lower() for k in EDU_KEYWORDS):
+                continue
+
+            # Find the clickable link for the program
+            link_tag = h2.find_next("a")
+            if not link_tag:
+                continue
+
+            relative_link = link_tag.get("href")
+            full_link = urljoin(BASE, relative_link)
+
+            external_id = f"ontario-{title}"
+
+            # Skip pages fetched recently
+            with run.phase("db"):
+                existing = stored_grant(external_id)
+            if existing and not needs_refresh(existing):
+                run.cache_hit()
+                continue
+            run.cache_miss()
+
+            # Scrape subpage (REAL info)
+            try:
+                description, eligibility, deadline = scrape_program_page(full_link)
+            except Exception as e:
+                print(f"Error scraping {full_link}: {e}")
+                run.error(full_link, e)
+                continue
+
+            # Parse deadline date if possible
+            deadline_date = None
+            try:
+                if deadline:
+                    deadline_date = datetime.strptime(
+                        deadline.split(" at ")[0], "%B %d, %Y"
+                    ).date()
+            except:
+                pass
+
+            with run.phase("db"):
+                grant, is_new, changed = upsert_grant(external_id, {
+                    "name_en": title,
+                    "description_en": description or "No description available.",
+                    "eligibility_en": eligibility or "Eligibility criteria not specified.",
+                    "category": "Education/Technology",
+                    "organization_id": org.id,
+                    "language": "EN",
+                    "region_scope": "Provincial",
+                    "province": "Ontario",
+                    "source_url": full_link,
+                    "deadline_date": deadline_date,
+                }, source="ontario")
+
+            if is_new:
+                new_grants.append(grant)
+                created += 1
+            elif changed:
+                changed_grants.append(grant)
+                updated += 1
+
+        with run.phase("db"):
+            db.session.commit()
+            finalize_ingest(grant.id for grant in new_grants + changed_grants)
+        run.created(created)
+        print(f"Ontario scraping finished. Created {created} grants, updated {updated}.")
@@ -0,0 +1,204 @@
+"""
+Concurrent health check of Grant.source_url.
+
+Government and foundation pages move or vanish, and a dead "Official
+site" link is only noticed when someone clicks it. check_links() picks
+the grants whose link is due (never checked, or last checked longer ago
+than LINKCHECK_MAX_AGE_HOURS; failing links sooner), checks each distinct
+URL once with aiohttp (HEAD, falling back to GET for servers that reject
+HEAD), and stores the final status, redirect target and error on the
+grants. Per-host connection limits keep it polite even though hundreds
+of URLs are in flight.
+
+    flask --app app check-links               # due links only (cron)
+    flask --app app check-links --all
+    flask --app app check-links --url http://127.0.0.1:8000/page   # no DB
+"""
+
+import asyncio
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+import aiohttp
+from flask import current_app
+from sqlalchemy import and_, bindparam, or_, select, update
+
+from ..extensions import db
+from ..models import Grant
+from .scheduler import DEFAULT_USER_AGENT
+
+LinkResult = namedtuple("LinkResult", "url status final_url error seconds")
+
+BATCH_SIZE = 500
+MAX_REDIRECTS = 10
+
+
+def is_broken(result):
+    return result.status is None or result.status >= 400
+
+
+def _describe(exc):
+    if isinstance(exc, asyncio.TimeoutError):
+        return "timeout"
+    text = f"{type(exc).__name__}: {exc}".strip()
+    return text[:255]
+
+
+def _host(url):
+    return urlsplit(url).netloc.lower()
+
+
+async def _request(session, method, url):
+    async with session.request(method, url, allow_redirects=True, max_redirects=MAX_REDIRECTS) as resp:
+        # Leaving the block without reading the body drops a GET's download
+        return resp.status, str(resp.url)
+
+
+async def _check(session, url):
+    started = time.perf_counter()
+    status = final_url = error = None
+    timed_out = False
+    try:
+        status, final_url = await _request(session, "HEAD", url)
+    except asyncio.TimeoutError as exc:
+        error, timed_out = _describe(exc), True
+    except (aiohttp.ClientError, ValueError) as exc:
+        error = _describe(exc)
+
+    # Plenty of servers answer HEAD with 403/404/405 (or drop it) for pages
+    # that load fine; only a failed GET counts. A timeout isn't retried.
+    if not timed_out and (status is None or status >= 400):
+        try:
+            status, final_url = await _request(session, "GET", url)
+            error = None
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as exc:
+            error = _describe(exc)
+
+    if final_url == url:
+        final_url = None
+    return LinkResult(url, status, final_url, error, round(time.perf_counter() - started, 3))
+
+
+async def check_urls(urls, concurrency=20, per_host=2, timeout=15, user_agent=DEFAULT_USER_AGENT):
+    """Check ``urls`` concurrently. Returns {url: LinkResult}."""
+    urls = list(dict.fromkeys(u for u in urls if u))
+    if not urls:
+        return {}
+    # Slots are taken before a request starts, so the timeout only covers
+    # the request itself, not the wait behind other links to the same host.
+    overall = asyncio.Semaphore(concurrency)
+    hosts = {}
+
+    async def limited(session, url):
+        host = hosts.setdefault(_host(url), asyncio.Semaphore(per_host))
+        async with host, overall:
+            return await _check(session, url)
+
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_host)
+    async with aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=timeout),
+        headers={"User-Agent": user_agent},
+    ) as session:
+        results = await asyncio.gather(*(limited(session, url) for url in urls))
+    return {result.url: result for result in results}
+
+
+def check_urls_sync(urls, config=None):
+    """check_urls() with settings from ``config`` (default: the app's), for sync callers."""
+    config = config if config is not None else current_app.config
+    return asyncio.run(check_urls(
+        urls,
+        concurrency=config.get("LINKCHECK_CONCURRENCY", 20),
+        per_host=config.get("LINKCHECK_PER_HOST", 2),
+        timeout=config.get("LINKCHECK_TIMEOUT", 15),
+        user_agent=config.get("SCRAPER_USER_AGENT", DEFAULT_USER_AGENT),
+    ))
+
+
+def due_grants(now=None, recheck_all=False, limit=None):
+    """(id, source_url, link_failures) of grants whose link should be checked, stalest first."""
+    now = now or datetime.utcnow()
+    config = current_app.config
+    max_age = timedelta(hours=config.get("LINKCHECK_MAX_AGE_HOURS", 7 * 24))
+    retry_age = timedelta(hours=config.get("LINKCHECK_RETRY_HOURS", 24))
+
+    grants = Grant.__table__
+    query = select(grants.c.id, grants.c.source_url, grants.c.link_failures).where(
+        grants.c.source_url.isnot(None), grants.c.source_url != ""
+    )
+    if not recheck_all:
+        query = query.where(or_(
+            grants.c.link_checked_at.is_(None),
+            grants.c.link_checked_at < now - max_age,
+            and_(grants.c.link_failures > 0, grants.c.link_checked_at < now - retry_age),
+        ))
+    query = query.order_by(grants.c.link_checked_at.is_(None).desc(), grants.c.link_checked_at, grants.c.id)
+    if limit:
+        query = query.limit(limit)
+    return db.session.execute(query).all()
+
+
+def _store(rows, results, now):
+    grants = Grant.__table__
+    params = []
+    for grant_id, url, failures in rows:
+        result = results[url]
+        params.append({
+            "b_id": grant_id,
+            "status": result.status,
+            "final_url": (result.final_url or "")[:500] or None,
+            "error": result.error,
+            "failures": (failures or 0) + 1 if is_broken(result) else 0,
+            "checked_at": now,
+        })
+    # updated_at is kept as-is: a link check is not a content change
+    db.session.execute(
+        update(grants)
+        .where(grants.c.id == bindparam("b_id"))
+        .values(
+            link_status=bindparam("status"),
+            link_final_url=bindparam("final_url"),
+            link_error=bindparam("error"),
+            link_failures=bindparam("failures"),
+            link_checked_at=bindparam("checked_at"),
+            updated_at=grants.c.updated_at,
+        ),
+        params,
+    )
+
+
+def check_links(recheck_all=False, limit=None, batch_size=BATCH_SIZE, verbose=False):
+    """Check due grant links, store the results, and return counts."""
+    started = time.perf_counter()
+    rows = due_grants(recheck_all=recheck_all, limit=limit)
+    stats = {"grants": 0, "urls": 0, "ok": 0, "redirected": 0, "broken": 0, "hosts": 0}
+    hosts = set()
+
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        results = check_urls_sync([url for _, url, _ in batch])
+        now = datetime.utcnow()
+        _store(batch, results, now)
+        db.session.commit()
+
+        stats["grants"] += len(batch)
+        stats["urls"] += len(results)
+        for result in results.values():
+            hosts.add(_host(result.url))
+            if is_broken(result):
+                stats["broken"] += 1
+                if verbose:
+                    print(f"  BROKEN {result.status or result.error}  {result.url}")
+            else:
+                stats["ok"] += 1
+                if result.final_url:
+                    stats["redirected"] += 1
+        if verbose:
+            print(f"  {stats['grants']}/{len(rows)} grants checked")
+
+    stats["hosts"] = len(hosts)
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    return stats
@@ -0,0 +1,240 @@
+"""
+Structured metrics for scrape runs.
+
+Usage inside a scraper:
+
+    with scrape_run("otf") as run:
+        with run.phase("parse"):
+            data = parse(html)
+        with run.phase("db"):
+            db.session.commit()
+
+Page fetches made through the crawl scheduler are recorded automatically
+on the active run. When the block exits, the run is stored in the
+`scrape_runs` table and appended as one JSON line to SCRAPE_RUN_LOG.
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import current_app, has_app_context
+
+from ..extensions import db
+from ..models import ScrapeRun
+
+_current_run = contextvars.ContextVar("current_scrape_run", default=None)
+
+PHASES = ("fetch", "parse", "db")
+
+
+def current_run():
+    """Return the active ScrapeRunRecorder, or None outside a scrape run."""
+    return _current_run.get()
+
+
+class ScrapeRunRecorder:
+    def __init__(self, source):
+        from .scheduler import get_scheduler
+
+        self.source = source
+        self.started_at = datetime.utcnow()
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+
+        self.seconds = {phase: 0.0 for phase in PHASES}
+        self.wait_seconds = 0.0
+        self.pages = []
+        self.error_list = []
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.grants_created = 0
+        # The scheduler's host counters are per process; keep this run's share
+        self.crawl_start = get_scheduler().snapshot()
+
+    # ---------------------------------------------------------
+    # Recording
+    # ---------------------------------------------------------
+    @contextmanager
+    def phase(self, name):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            with self.lock:
+                self.seconds[name] = self.seconds.get(name, 0.0) + elapsed
+
+    def record_page(self, url, status, size, fetch_seconds, wait_seconds=0.0):
+        with self.lock:
+            self.seconds["fetch"] += fetch_seconds
+            self.wait_seconds += wait_seconds
+            self.pages.append({
+                "url": url,
+                "status": status,
+                "bytes": size,
+                "latency_ms": round(fetch_seconds * 1000, 1),
+                "wait_ms": round(wait_seconds * 1000, 1),
+            })
+
+    def error(self, url, exc):
+        with self.lock:
+            self.error_list.append({"url": url, "error": f"{type(exc).__name__}: {exc}"})
+
+    def cache_hit(self):
+        with self.lock:
+            self.cache_hits += 1
+
+    def cache_miss(self):
+        with self.lock:
+            self.cache_misses += 1
+
+    def created(self, count=1):
+        with self.lock:
+            self.grants_created += count
+
+    # ---------------------------------------------------------
+    # Output
+    # ---------------------------------------------------------
+    def summary(self, status):
+        from .scheduler import get_scheduler
+
+        duration = time.monotonic() - self.started
+        return {
+            "source": self.source,
+            "status": status,
+            "started_at": self.started_at.isoformat(),
+            "finished_at": datetime.utcnow().isoformat(),
+            "duration_seconds": round(duration, 3),
+            "pages_fetched": len(self.pages),
+            "bytes_fetched": sum(p["bytes"] for p in self.pages),
+            "fetch_seconds": round(self.seconds["fetch"], 3),
+            "wait_seconds": round(self.wait_seconds, 3),
+            "parse_seconds": round(self.seconds["parse"], 3),
+            "db_seconds": round(self.seconds["db"], 3),
+            "errors": len(self.error_list),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "grants_created": self.grants_created,
+            "pages": self.pages,
+            "error_list": self.error_list,
+            "hosts": get_scheduler().metrics(since=self.crawl_start),
+        }
+
+    def save(self, status):
+        data = self.summary(status)
+        details = {k: data[k] for k in ("pages", "error_list", "hosts")}
+
+        # A failed run may leave the session in a broken transaction
+        if status == "failed":
+            db.session.rollback()
+        run = ScrapeRun(
+            source=self.source,
+            status=status,
+            started_at=self.started_at,
+            finished_at=datetime.fromisoformat(data["finished_at"]),
+            duration_seconds=data["duration_seconds"],
+            pages_fetched=data["pages_fetched"],
+            bytes_fetched=data["bytes_fetched"],
+            fetch_seconds=data["fetch_seconds"],
+            wait_seconds=data["wait_seconds"],
+            parse_seconds=data["parse_seconds"],
+            db_seconds=data["db_seconds"],
+            errors=data["errors"],
+            cache_hits=data["cache_hits"],
+            cache_misses=data["cache_misses"],
+            grants_created=data["grants_created"],
+            details=json.dumps(details),
+        )
+        db.session.add(run)
+        db.session.commit()
+
+        data["id"] = run.id
+        _append_json_log(data)
+        print(
+            f"[run {run.id}] {self.source}: {data['status']} in {data['duration_seconds']}s — "
+            f"{data['pages_fetched']} pages, fetch {data['fetch_seconds']}s, "
+            f"parse {data['parse_seconds']}s, db {data['db_seconds']}s, "
+            f"{data['errors']} errors, {data['cache_hits']} cache hits"
+        )
+        return run
+
+
+def _append_json_log(data):
+    path = None
+    if has_app_context():
+        path = current_app.config.get("SCRAPE_RUN_LOG")
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(data, default=str) + "\n")
+
+
+@contextmanager
+def scrape_run(source):
+    recorder = ScrapeRunRecorder(source)
+    token = _current_run.set(recorder)
+    try:
+        yield recorder
+    except Exception:
+        _current_run.reset(token)
+        recorder.save("failed")
+        raise
+    _current_run.reset(token)
+    recorder.save("success")
+
+
+# ---------------------------------------------------------
+# Run comparison (used by the `compare-scrape-runs` CLI)
+# ---------------------------------------------------------
+COMPARE_FIELDS = [
+    "duration_seconds",
+    "pages_fetched",
+    "bytes_fetched",
+    "fetch_seconds",
+    "wait_seconds",
+    "parse_seconds",
+    "db_seconds",
+    "errors",
+    "cache_hits",
+    "cache_misses",
+    "grants_created",
+]
+
+
+def _pct(old, new):
+    if not old:
+        return ""
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def compare_runs(base, other):
+    """Return printable lines comparing two ScrapeRun rows."""
+    lines = [f"{'metric':<18}{'run ' + str(base.id):>14}{'run ' + str(other.id):>14}{'change':>10}"]
+    for field in COMPARE_FIELDS:
+        a = getattr(base, field) or 0
+        b = getattr(other, field) or 0
+        lines.append(f"{field:<18}{a:>14}{b:>14}{_pct(a, b):>10}")
+
+    # Per-page latency for URLs present in both runs
+    base_pages = {p["url"]: p for p in json.loads(base.details or "{}").get("pages", [])}
+    other_pages = {p["url"]: p for p in json.loads(other.details or "{}").get("pages", [])}
+    shared = [url for url in other_pages if url in base_pages]
+    if shared:
+        lines.append("")
+        lines.append("Slowest page regressions (latency ms):")
+        deltas = sorted(
+            shared,
+            key=lambda u: other_pages[u]["latency_ms"] - base_pages[u]["latency_ms"],
+            reverse=True,
+        )
+        for url in deltas[:10]:
+            a = base_pages[url]["latency_ms"]
+            b = other_pages[url]["latency_ms"]
+            lines.append(f"  {a:>8} -> {b:>8} ({_pct(a, b)})  {url}")
+    return lines
@@ -1,12 +1,14 @@
-import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
-from datetime import datetime
+from datetime import date, datetime
 from ..extensions import db
-from ..models import Grant, Organization
+from ..reference import get_or_create_organization
+from ..ingest import finalize_ingest
+from .metrics import scrape_run
+from .scheduler import fetch_html
+from .upsert import needs_refresh, stored_grant, upsert_grant
 
 BASE_URL = "https://otf.ca"
-HEADERS = {"User-Agent": "Mozilla/5.0"}
 
 OTF_PROGRAMS = {
     "Seed Grant": "/our-grants/community-investments-grants/seed-grant",
@@ -28,12 +30,6 @@ OTF_PROGRAMS = {
 }
 
 
-def fetch_html(url):
-    resp = requests.get(url, headers=HEADERS, timeout=20)
-    resp.raise_for_status()
-    return resp.text
-
-
 def text_or_none(tag):
     return tag.get_text(" ", strip=True) if tag else None
 
@@ -132,64 +128,79 @@ def parse_otf_program_page(html, url):
 def scrape_otf():
     print("Scraping Ontario Trillium Foundation (OTF)...")
 
-    # Ensure organization exists
-    org = Organization.query.filter_by(name="Ontario Trillium Foundation").first()
-    if not org:
-        org = Organization(
-            name="Ontario Trillium Foundation",
-            type="Government",
-            country="Canada",
-            province="Ontario",
-            ngo_only=False,
-        )
-        db.session.add(org)
-        db.session.commit()
-
-    created = 0
-
-    for program_name, relative_url in OTF_PROGRAMS.items():
-        url = urljoin(BASE_URL, relative_url)
-
-        if Grant.query.filter_by(external_id=url).first():
-            continue
-
-        try:
-            html = fetch_html(url)
-            data = parse_otf_program_page(html, url)
-        except Exception as e:
-            print(f"Error scraping {url}: {e}")
-            continue
-
-        # ✅ NEW: skip expired grants
-        from datetime import date
-        if data["deadline_date"] and data["deadline_date"] < date.today():
-            print(f"Skipping expired grant: {data['name']} (deadline {data['deadline_date']})")
-            continue
-
-        # Create grant
-        grant = Grant(
-            name_en=data["name"],
-            description_en=data["description"],
-            eligibility_en=data["eligibility"],
-            organization=org,
-            category="Community",
-            region_scope="Provincial",
-            country="Canada",
-            province="Ontario",
-            team_scope="Regional",
-            funding_min=data["funding_min"],
-            funding_max=data["funding_max"],
-            currency="CAD",
-            deadline_date=data["deadline_date"],
-            ongoing_flag=data["ongoing_flag"],
-            language="EN",
-            is_ngo_only=False,
-            source_url=url,
-            external_id=url,
-        )
-
-        db.session.add(grant)
-        created += 1
-
-    db.session.commit()
-    print(f"OTF scraping done. Created {created} grants.")
+    with scrape_run("otf") as run:
+        # Ensure organization exists
+        with run.phase("db"):
+            org = get_or_create_organization(
+                "Ontario Trillium Foundation",
+                type="Government",
+                country="Canada",
+                province="Ontario",
+                ngo_only=False,
+            )
+
+        created = 0
+        updated = 0
+        expired = 0
+        new_grants = []
+        changed_grants = []
+
+        for program_name, relative_url in OTF_PROGRAMS.items():
+            url = urljoin(BASE_URL, relative_url)
+
+            with run.phase("db"):
+                existing = stored_grant(url)
+            if existing and not needs_refresh(existing):
+                run.cache_hit()
+                continue
+            run.cache_miss()
+
+            try:
+                html = fetch_html(url)
+                with run.phase("parse"):
+                    data = parse_otf_program_page(html, url)
+            except Exception as e:
+                print(f"Error scraping {url}: {e}")
+                run.error(url, e)
+                continue
+
+            # Create grant, or update it (keeping a revision) if the page changed
+            with run.phase("db"):
+                grant, is_new, changed = upsert_grant(url, {
+                    "name_en": data["name"],
+                    "description_en": data["description"],
+                    "eligibility_en": data["eligibility"],
+                    "organization_id": org.id,
+                    "category": "Community",
+                    "region_scope": "Provincial",
+                    "country": "Canada",
+                    "province": "Ontario",
+                    "team_scope": "Regional",
+                    "funding_min": data["funding_min"],
+                    "funding_max": data["funding_max"],
+                    "currency": "CAD",
+                    "deadline_date": data["deadline_date"],
+                    "ongoing_flag": data["ongoing_flag"],
+                    "language": "EN",
+                    "is_ngo_only": False,
+                    "source_url": url,
+                }, source="otf")
+
+            if is_new:
+                created += 1
+            elif changed:
+                updated += 1
+            # Expired programs are recorded (the archive job moves them out of
+            # the live table) but there's nothing to announce or recommend
+            if data["deadline_date"] and data["deadline_date"] < date.today():
+                expired += 1
+            elif is_new:
+                new_grants.append(grant)
+            elif changed:
+                changed_grants.append(grant)
+
+        with run.phase("db"):
+            db.session.commit()
+            finalize_ingest(grant.id for grant in new_grants + changed_grants)
+        run.created(created)
+        print(f"OTF scraping done. Created {created} grants, updated {updated} ({expired} past deadline).")
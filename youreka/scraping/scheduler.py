@@ -0,0 +1,337 @@
+"""
+Polite crawl scheduler shared by all scrapers.
+
+Every outgoing scraper request goes through ``CrawlScheduler.fetch`` which:
+- waits on a per-host token bucket (sustained rate + small burst),
+- honours robots.txt rules and Crawl-delay (cached per host),
+- backs off adaptively when a host answers 429 / 503, and slowly
+  recovers its rate again after successful requests.
+
+Per-host throughput metrics are kept in memory for the process and can
+be printed with ``get_scheduler().report()`` at the end of a scrape run;
+``metrics(since=snapshot())`` gives the numbers of one run only.
+"""
+
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib import robotparser
+from urllib.parse import urlsplit
+
+import requests
+from flask import current_app, has_app_context
+
+from ..ratelimit import TokenBucket
+from .metrics import current_run
+
+DEFAULT_USER_AGENT = "YourekaGrantPortalBot/1.0 (+https://youreka.ca)"
+
+# Statuses that mean "slow down" rather than "this page is broken"
+THROTTLE_STATUSES = (429, 503)
+
+COUNTERS = (
+    "requests", "bytes", "errors", "throttled", "robots_blocked",
+    "robots_cache_hits", "wait_seconds", "fetch_seconds",
+)
+
+
+class RobotsDisallowed(Exception):
+    """Raised when robots.txt does not allow fetching a URL."""
+
+
+class HostState:
+    """Rate limiter, robots cache, backoff and metrics for a single host."""
+
+    def __init__(self, host, rate, burst):
+        self.host = host
+        self.base_rate = rate
+        self.bucket = TokenBucket(rate, burst)
+        self.lock = threading.Lock()
+
+        self.robots = None
+        self.robots_fetched_at = 0.0
+        self.robots_ttl = 0.0
+
+        self.backoff_until = 0.0
+        self.consecutive_throttles = 0
+
+        # Metrics
+        self.first_request_at = None
+        self.requests = 0
+        self.bytes = 0
+        self.errors = 0
+        self.throttled = 0
+        self.robots_blocked = 0
+        self.robots_cache_hits = 0
+        self.wait_seconds = 0.0
+        self.fetch_seconds = 0.0
+
+    def set_rate(self, rate):
+        with self.bucket.lock:
+            self.bucket.rate = rate
+
+    def counters(self):
+        with self.lock:
+            return {name: getattr(self, name) for name in COUNTERS}
+
+    def metrics(self, since=None):
+        """Counters so far, or since ``since`` (a CrawlScheduler.snapshot())."""
+        counts = self.counters()
+        started = self.first_request_at
+        if since is not None:
+            before = since["hosts"].get(self.host, {})
+            counts = {name: value - before.get(name, 0) for name, value in counts.items()}
+            if started is not None:
+                started = max(started, since["at"])
+        elapsed = time.monotonic() - started if started else 0.0
+        return {
+            "host": self.host,
+            "requests": counts["requests"],
+            "bytes": counts["bytes"],
+            "errors": counts["errors"],
+            "throttled": counts["throttled"],
+            "robots_blocked": counts["robots_blocked"],
+            "robots_cache_hits": counts["robots_cache_hits"],
+            "current_rate": round(self.bucket.rate, 4),
+            "wait_seconds": round(counts["wait_seconds"], 3),
+            "fetch_seconds": round(counts["fetch_seconds"], 3),
+            "requests_per_second": round(counts["requests"] / elapsed, 4) if elapsed else 0.0,
+        }
+
+
+class CrawlScheduler:
+    def __init__(
+        self,
+        user_agent=DEFAULT_USER_AGENT,
+        rate=0.5,
+        burst=2,
+        timeout=20,
+        robots_ttl=6 * 3600,
+        max_retries=3,
+        max_backoff=300,
+    ):
+        self.user_agent = user_agent
+        self.rate = rate
+        self.burst = burst
+        self.timeout = timeout
+        self.robots_ttl = robots_ttl
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = user_agent
+
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            user_agent=config.get("SCRAPER_USER_AGENT", DEFAULT_USER_AGENT),
+            rate=config.get("CRAWL_RATE_PER_SECOND", 0.5),
+            burst=config.get("CRAWL_BURST", 2),
+            timeout=config.get("CRAWL_TIMEOUT", 20),
+            robots_ttl=config.get("CRAWL_ROBOTS_TTL", 6 * 3600),
+            max_retries=config.get("CRAWL_MAX_RETRIES", 3),
+            max_backoff=config.get("CRAWL_MAX_BACKOFF", 300),
+        )
+
+    # ---------------------------------------------------------
+    # Host state
+    # ---------------------------------------------------------
+    def _host(self, url):
+        parts = urlsplit(url)
+        key = f"{parts.scheme}://{parts.netloc}"
+        with self.lock:
+            state = self.hosts.get(key)
+            if state is None:
+                state = HostState(key, self.rate, self.burst)
+                self.hosts[key] = state
+            return state
+
+    # ---------------------------------------------------------
+    # robots.txt
+    # ---------------------------------------------------------
+    def _robots(self, state):
+        now = time.monotonic()
+        with state.lock:
+            if state.robots is not None and now - state.robots_fetched_at < state.robots_ttl:
+                state.robots_cache_hits += 1
+                return state.robots
+
+            parser = robotparser.RobotFileParser()
+            ttl = self.robots_ttl
+            try:
+                resp = self.session.get(state.host + "/robots.txt", timeout=self.timeout)
+                if resp.status_code in (401, 403):
+                    parser.disallow_all = True
+                elif resp.status_code >= 500:
+                    # Server trouble: allow for now but re-check soon
+                    parser.allow_all = True
+                    ttl = min(ttl, 300)
+                elif resp.status_code >= 400:
+                    parser.allow_all = True
+                else:
+                    parser.parse(resp.text.splitlines())
+            except requests.RequestException:
+                parser.allow_all = True
+                ttl = min(ttl, 300)
+
+            state.robots = parser
+            state.robots_fetched_at = now
+            state.robots_ttl = ttl
+
+            # Crawl-delay can only make us slower than the configured rate
+            delay = parser.crawl_delay(self.user_agent)
+            if delay:
+                state.base_rate = min(self.rate, 1.0 / float(delay))
+                state.set_rate(min(state.bucket.rate, state.base_rate))
+            return parser
+
+    # ---------------------------------------------------------
+    # Adaptive backoff
+    # ---------------------------------------------------------
+    def _retry_after(self, resp):
+        value = resp.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def _on_throttled(self, state, resp):
+        with state.lock:
+            state.throttled += 1
+            state.consecutive_throttles += 1
+            delay = self._retry_after(resp)
+            if delay is None:
+                delay = min(self.max_backoff, 2 ** state.consecutive_throttles)
+            state.backoff_until = time.monotonic() + min(delay, self.max_backoff)
+            # Multiplicative decrease of the sustained rate
+            state.set_rate(max(state.bucket.rate / 2, state.base_rate / 16))
+
+    def _on_success(self, state):
+        with state.lock:
+            state.consecutive_throttles = 0
+            # Additive increase back towards the base rate
+            if state.bucket.rate < state.base_rate:
+                state.set_rate(min(state.base_rate, state.bucket.rate + state.base_rate / 10))
+
+    def _wait_for_backoff(self, state):
+        remaining = state.backoff_until - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+            return remaining
+        return 0.0
+
+    # ---------------------------------------------------------
+    # Public API
+    # ---------------------------------------------------------
+    def fetch(self, url, method="GET", **kwargs):
+        """
+        Fetch ``url`` politely and return the ``requests.Response``.
+        Raises RobotsDisallowed or requests.HTTPError on failure.
+        """
+        state = self._host(url)
+
+        if not self._robots(state).can_fetch(self.user_agent, url):
+            with state.lock:
+                state.robots_blocked += 1
+            raise RobotsDisallowed(f"robots.txt disallows {url}")
+
+        kwargs.setdefault("timeout", self.timeout)
+
+        for attempt in range(self.max_retries + 1):
+            waited = self._wait_for_backoff(state)
+            waited += state.bucket.acquire()
+
+            started = time.monotonic()
+            try:
+                resp = self.session.request(method, url, **kwargs)
+            except requests.RequestException:
+                with state.lock:
+                    state.errors += 1
+                raise
+            finally:
+                elapsed = time.monotonic() - started
+                with state.lock:
+                    if state.first_request_at is None:
+                        state.first_request_at = started
+                    state.requests += 1
+                    state.wait_seconds += waited
+                    state.fetch_seconds += elapsed
+
+            with state.lock:
+                state.bytes += len(resp.content)
+
+            run = current_run()
+            if run is not None:
+                run.record_page(url, resp.status_code, len(resp.content), elapsed, waited)
+
+            if resp.status_code in THROTTLE_STATUSES and attempt < self.max_retries:
+                self._on_throttled(state, resp)
+                continue
+
+            if resp.status_code >= 400:
+                with state.lock:
+                    state.errors += 1
+                if resp.status_code in THROTTLE_STATUSES:
+                    self._on_throttled(state, resp)
+            else:
+                self._on_success(state)
+
+            resp.raise_for_status()
+            return resp
+
+    def snapshot(self):
+        """Counters of every host now, to pass to ``metrics(since=...)`` later."""
+        with self.lock:
+            states = list(self.hosts.values())
+        return {"at": time.monotonic(), "hosts": {s.host: s.counters() for s in states}}
+
+    def metrics(self, since=None):
+        """Per-host metrics for the process, or only since a ``snapshot()``."""
+        with self.lock:
+            states = list(self.hosts.values())
+        metrics = {s.host: s.metrics(since) for s in states}
+        if since is not None:
+            # Hosts this window never touched
+            metrics = {
+                host: m for host, m in metrics.items()
+                if m["requests"] or m["robots_blocked"] or m["robots_cache_hits"]
+            }
+        return metrics
+
+    def report(self):
+        for host, m in self.metrics().items():
+            print(
+                f"[crawl] {host}: {m['requests']} requests, {m['bytes']} bytes, "
+                f"{m['requests_per_second']} req/s, {m['throttled']} throttled, "
+                f"{m['errors']} errors, {m['robots_blocked']} blocked by robots.txt"
+            )
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Return the process-wide scheduler, configured from the app if available."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            if has_app_context():
+                _scheduler = CrawlScheduler.from_config(current_app.config)
+            else:
+                _scheduler = CrawlScheduler()
+        return _scheduler
+
+
+def fetch_html(url):
+    """Fetch ``url`` through the process-wide scheduler and return its text."""
+    return get_scheduler().fetch(url).text
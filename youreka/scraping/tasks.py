@@ -3,23 +3,21 @@ Basic scraping skeleton for gov funding pages.
 You can expand selectors for real data extraction.
 """
 
-import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 from flask import current_app
 from ..extensions import db
 from ..models import Grant, Organization
+from ..ingest import finalize_ingest
+from ..reference import get_or_create_organization
+from .metrics import scrape_run
+from .scheduler import fetch_html
+from .upsert import needs_refresh, stored_grant, upsert_grant
 
 BASE_URL = "https://www.canada.ca"
 FUNDING_LIST_URL = "https://www.canada.ca/en/employment-social-development/services/funding.html"
 
 
-def fetch_html(url: str) -> str:
-    resp = requests.get(url, timeout=20)
-    resp.raise_for_status()
-    return resp.text
-
-
 # def parse_funding_programs_page(html: str):
 #     soup = BeautifulSoup(html, "html.parser")
 #     main = soup.find("main") or soup
@@ -120,7 +118,7 @@ def parse_program_page(html: str, url: str) -> dict:
     created = 0
     for p in programs:
         url = p["url"]
-        existing = Grant.query.filter_by(external_id=url).first()
+        existing = stored_grant(url)
         if existing:
             continue
 
@@ -158,58 +156,74 @@ def parse_program_page(html: str, url: str) -> dict:
 
 def run_scrape():
     print("Running scraping task for Canada funding programs...")
-    html = fetch_html(FUNDING_LIST_URL)
-
-    # FIXED HERE
-    programs = parse_funding_list(html)
-
-    print(f"Found {len(programs)} candidate program links")
-
-    gov_org = Organization.query.filter_by(name="Government of Canada - ESDC").first()
-    if not gov_org:
-        gov_org = Organization(
-            name="Government of Canada - ESDC",
-            type="Government",
-            country="Canada",
-        )
-        db.session.add(gov_org)
-        db.session.commit()
-
-    created = 0
-    for p in programs:
-        url = p["url"]
-        existing = Grant.query.filter_by(external_id=url).first()
-        if existing:
-            continue
-
-        try:
-            program_html = fetch_html(url)
-            data = parse_program_page(program_html, url)
-        except Exception as e:
-            print(f"Error scraping {url}: {e}")
-            continue
 
-        grant = Grant(
-            name_en=data["name_en"],
-            description_en=data["description_en"],
-            organization=gov_org,
-            category=None,
-            region_scope="National",
-            country="Canada",
-            province=None,
-            funding_min=None,
-            funding_max=None,
-            currency="CAD",
-            deadline_date=None,
-            ongoing_flag=True,
-            language="EN",
-            team_scope="National",
-            is_ngo_only=False,
-            source_url=url,
-            external_id=url,
-        )
-        db.session.add(grant)
-        created += 1
+    with scrape_run("esdc") as run:
+        html = fetch_html(FUNDING_LIST_URL)
+
+        # FIXED HERE
+        with run.phase("parse"):
+            programs = parse_funding_list(html)
+
+        print(f"Found {len(programs)} candidate program links")
+
+        with run.phase("db"):
+            gov_org = get_or_create_organization(
+                "Government of Canada - ESDC",
+                type="Government",
+                country="Canada",
+            )
+
+        created = 0
+        updated = 0
+        new_grants = []
+        changed_grants = []
+        for p in programs:
+            url = p["url"]
+            with run.phase("db"):
+                existing = stored_grant(url)
+            if existing and not needs_refresh(existing):
+                run.cache_hit()
+                continue
+            run.cache_miss()
+
+            try:
+                program_html = fetch_html(url)
+                with run.phase("parse"):
+                    data = parse_program_page(program_html, url)
+            except Exception as e:
+                print(f"Error scraping {url}: {e}")
+                run.error(url, e)
+                continue
 
-    db.session.commit()
-    print(f"Scraping complete. Created {created} new grants.")
+            with run.phase("db"):
+                grant, is_new, changed = upsert_grant(url, {
+                    "name_en": data["name_en"],
+                    "description_en": data["description_en"],
+                    "organization_id": gov_org.id,
+                    "category": None,
+                    "region_scope": "National",
+                    "country": "Canada",
+                    "province": None,
+                    "funding_min": None,
+                    "funding_max": None,
+                    "currency": "CAD",
+                    "deadline_date": None,
+                    "ongoing_flag": True,
+                    "language": "EN",
+                    "team_scope": "National",
+                    "is_ngo_only": False,
+                    "source_url": url,
+                }, source="esdc")
+
+            if is_new:
+                new_grants.append(grant)
+                created += 1
+            elif changed:
+                changed_grants.append(grant)
+                updated += 1
+
+        with run.phase("db"):
+            db.session.commit()
+            finalize_ingest(grant.id for grant in new_grants + changed_grants)
+        run.created(created)
+        print(f"Scraping complete. Created {created} new grants, updated {updated}.")
@@ -0,0 +1,83 @@
+"""
+Insert-or-update for scraped grants.
+
+Scrapers used to skip any program whose external_id was already stored,
+so a page reopening for a new funding cycle was never read again. Now a
+stored page is re-fetched once it is older than SCRAPE_REFRESH_HOURS, and
+upsert_grant() writes the new values and records a revision (see
+youreka/revisions.py) only when something actually changed.
+"""
+
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import update
+
+from ..archive import ArchivedGrant, reopened, restore_grants
+from ..extensions import db
+from ..models import Grant, archived_grants
+from ..revisions import record_revision, revision_values
+
+
+def stored_grant(external_id):
+    """The live grant with ``external_id``, else the archived one (detached, read-only), else None."""
+    grant = Grant.query.filter_by(external_id=external_id).first()
+    if grant is None:
+        grant = db.session.query(ArchivedGrant).filter(ArchivedGrant.external_id == external_id).first()
+        if grant is not None:
+            # Mapped as Grant: keep it out of the session so a refresh or
+            # flush never goes to the live table
+            db.session.expunge(grant)
+    return grant
+
+
+def needs_refresh(grant, now=None):
+    """Whether a stored grant's source page is due for another fetch."""
+    if grant.scraped_at is None:
+        return True
+    hours = current_app.config.get("SCRAPE_REFRESH_HOURS", 7 * 24)
+    return grant.scraped_at < (now or datetime.utcnow()) - timedelta(hours=hours)
+
+
+def upsert_grant(external_id, values, source):
+    """
+    Create or update the grant with ``external_id`` from scraped ``values``
+    (Grant column names). Returns (grant, created, changed). Doesn't commit.
+    An archived grant is restored first and counts as changed, unless the
+    page still shows a passed deadline: then only its fetch time is noted
+    and the archived grant is returned unchanged.
+    """
+    now = datetime.utcnow()
+    grant = Grant.query.filter_by(external_id=external_id).first()
+    restored = False
+    if grant is None:
+        match = archived_grants.c.external_id == external_id
+        if not reopened(values.get("deadline_date"), values.get("ongoing_flag")):
+            if db.session.execute(update(archived_grants).where(match).values(scraped_at=now)).rowcount:
+                return stored_grant(external_id), False, False
+        elif restore_grants(match):
+            grant, restored = Grant.query.filter_by(external_id=external_id).one(), True
+    if grant is None:
+        grant = Grant(external_id=external_id, scraped_at=now, **values)
+        db.session.add(grant)
+        db.session.flush()
+        record_revision(grant, source=source)
+        return grant, True, False
+
+    before = revision_values(grant)
+    for field, value in values.items():
+        setattr(grant, field, value)
+    if revision_values(grant) == before:
+        # Same page as last time: only note the fetch (not a content change)
+        grants = Grant.__table__
+        db.session.execute(
+            update(grants)
+            .where(grants.c.id == grant.id)
+            .values(scraped_at=now, updated_at=grants.c.updated_at)
+        )
+        return grant, False, restored
+
+    grant.scraped_at = now
+    db.session.flush()
+    record_revision(grant, previous=before, source=source)
+    return grant, False, True
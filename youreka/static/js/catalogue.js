@@ -0,0 +1,354 @@
+// Offline catalogue and in-browser filtering for the list page
+// (see youreka/offline.py).
+//
+// The bundle from /api/catalogue is kept in Cache Storage and brought up to
+// date with ?since=<cursor> on every visit. Once it is loaded, submitting
+// the filter form filters it here instead of asking the server, using the
+// same rules as youreka/grants/filters.py: keep parseFilters, grantMatches
+// and collapseDuplicates in sync with parse_filters, grant_matches and
+// collapse_duplicates. Archived grants and a change of region still go to
+// the server (the page's region links depend on it).
+
+(function () {
+  var root = document.getElementById("yk-offline");
+  if (!root || !window.fetch || !window.caches || !window.URLSearchParams) return;
+
+  var CATALOGUE_CACHE = "yk-catalogue-v1"; // same name as in sw.js
+  var BUNDLE_VERSION = 1; // youreka/offline.py
+  var FIELDS_FILTERED = ["category", "language", "team_scope", "individual_type"];
+  var NON_FILTER_ARGS = ["start", "end", "lang"]; // calendar/routes.py
+  var data = root.dataset;
+  var form = document.querySelector(".yk-filter-form");
+  var grid = document.getElementById("yk-card-grid");
+  var state = null;
+
+  if ("serviceWorker" in navigator) {
+    navigator.serviceWorker.register(data.serviceWorker).catch(function () {});
+  }
+
+  // ---------------------------------------------------------
+  // Bundle storage and delta sync
+  // ---------------------------------------------------------
+  function loadStored() {
+    return caches.open(CATALOGUE_CACHE).then(function (cache) {
+      return cache.match(data.catalogueUrl);
+    }).then(function (response) {
+      return response ? response.json() : null;
+    }).catch(function () { return null; });
+  }
+
+  function store(catalogue) {
+    return caches.open(CATALOGUE_CACHE).then(function (cache) {
+      return cache.put(data.catalogueUrl, new Response(JSON.stringify(catalogue), {
+        headers: { "Content-Type": "application/json" }
+      }));
+    }).catch(function () {});
+  }
+
+  function fromBundle(bundle) {
+    var catalogue = {
+      version: bundle.version, cursor: bundle.cursor, fields: bundle.fields,
+      grants: {}, organizations: bundle.organizations, regions: bundle.regions,
+      provinces: bundle.provinces
+    };
+    bundle.grants.forEach(function (row) { catalogue.grants[row[0]] = row; });
+    return catalogue;
+  }
+
+  function merge(catalogue, delta) {
+    delta.grants.forEach(function (row) {
+      catalogue.grants[row[0]] = row;
+      // A delta carries the regions of every grant it lists
+      catalogue.regions[row[0]] = delta.regions[row[0]] || [];
+    });
+    delta.removed.forEach(function (id) {
+      delete catalogue.grants[id];
+      delete catalogue.regions[id];
+    });
+    Object.keys(delta.organizations).forEach(function (id) {
+      catalogue.organizations[id] = delta.organizations[id];
+    });
+    catalogue.cursor = delta.cursor;
+    return catalogue;
+  }
+
+  function fetchFull() {
+    return fetch(data.catalogueUrl).then(function (response) {
+      if (!response.ok) throw new Error(response.status);
+      return response.json();
+    }).then(function (bundle) {
+      var catalogue = fromBundle(bundle);
+      store(catalogue);
+      return catalogue;
+    });
+  }
+
+  function sync() {
+    return loadStored().then(function (stored) {
+      if (!stored || stored.version !== BUNDLE_VERSION || stored.cursor === null) {
+        return fetchFull().catch(function () { return stored; });
+      }
+      return fetch(data.catalogueUrl + "?since=" + stored.cursor).then(function (response) {
+        if (response.status === 410) return fetchFull(); // cursor expired: resync
+        if (!response.ok) return stored;
+        return response.json().then(function (delta) {
+          if (delta.full) {
+            var catalogue = fromBundle(delta);
+            store(catalogue);
+            return catalogue;
+          }
+          if (delta.grants.length || delta.removed.length || delta.cursor !== stored.cursor) {
+            merge(stored, delta);
+            store(stored);
+          }
+          return stored;
+        });
+      }).catch(function () { return stored; }); // offline: use what we have
+    });
+  }
+
+  // ---------------------------------------------------------
+  // Filters (mirror of youreka/grants/filters.py)
+  // ---------------------------------------------------------
+  function toInt(value) {
+    value = (value || "").trim();
+    return /^[+-]?\d+$/.test(value) ? parseInt(value, 10) : null;
+  }
+
+  function toFloat(value) {
+    value = (value || "").trim();
+    if (!value || isNaN(Number(value))) return null;
+    return Number(value);
+  }
+
+  function pad(n, width) {
+    var s = String(n);
+    while (s.length < width) s = "0" + s;
+    return s;
+  }
+
+  function parseDate(value) {
+    var parts = (value || "").trim().split("-");
+    if (parts.length !== 3 || !parts.every(function (p) { return /^\s*[+-]?\d+\s*$/.test(p); })) return null;
+    var y = parseInt(parts[0], 10), m = parseInt(parts[1], 10), d = parseInt(parts[2], 10);
+    var date = new Date(Date.UTC(y, m - 1, d));
+    if (y < 1 || y > 9999 || date.getUTCMonth() !== m - 1 || date.getUTCDate() !== d) return null;
+    return pad(y, 4) + "-" + pad(m, 2) + "-" + pad(d, 2);
+  }
+
+  function parseFilters(params, provinces) {
+    var filters = {};
+    var regionId = toInt(params.get("region_id"));
+    if (regionId) filters.region_id = regionId;
+
+    var province = (params.get("province") || "").trim();
+    if (province) {
+      var full = provinces[province.toUpperCase()];
+      if (full) filters.province = full.toLowerCase();
+      else filters.province_contains = province.toLowerCase();
+    }
+
+    if (params.get("ngo_only") === "true") filters.ngo_only = true;
+
+    var minAmount = toFloat(params.get("min_amount"));
+    if (minAmount !== null) filters.min_amount = minAmount;
+    var maxAmount = toFloat(params.get("max_amount"));
+    if (maxAmount !== null) filters.max_amount = maxAmount;
+
+    FIELDS_FILTERED.forEach(function (field) {
+      var value = (params.get(field) || "").trim();
+      if (value) filters[field] = value;
+    });
+    if (filters.individual_type === "both") delete filters.individual_type;
+
+    var deadline = parseDate(params.get("deadline_before"));
+    if (deadline) filters.deadline_before = deadline;
+    return filters;
+  }
+
+  function grantMatches(g, filters, regionIds) {
+    if (filters.region_id && regionIds.indexOf(filters.region_id) === -1) return false;
+
+    var province = (g.province || "").toLowerCase();
+    if (filters.province && province !== filters.province) return false;
+    if (filters.province_contains && (!g.province || province.indexOf(filters.province_contains) === -1)) {
+      return false;
+    }
+
+    if (filters.ngo_only && g.is_ngo_only !== true) return false;
+
+    if ("min_amount" in filters && (g.funding_max === null || g.funding_max < filters.min_amount)) return false;
+    if ("max_amount" in filters && (g.funding_min === null || g.funding_min > filters.max_amount)) return false;
+
+    for (var i = 0; i < FIELDS_FILTERED.length; i++) {
+      var field = FIELDS_FILTERED[i];
+      if (field in filters && g[field] !== filters[field]) return false;
+    }
+
+    if (filters.deadline_before && (!g.deadline_date || g.deadline_date > filters.deadline_before)) {
+      return false;
+    }
+    return true;
+  }
+
+  function collapseDuplicates(grants, params) {
+    // One grant per near-duplicate cluster: the lowest id that matched
+    if (params.get("show_duplicates") || data.collapse !== "1") return grants;
+    var lowest = {};
+    grants.forEach(function (g) {
+      var key = g.cluster_id === null ? "g" + g.id : "c" + g.cluster_id;
+      if (!(key in lowest) || g.id < lowest[key]) lowest[key] = g.id;
+    });
+    return grants.filter(function (g) {
+      return lowest[g.cluster_id === null ? "g" + g.id : "c" + g.cluster_id] === g.id;
+    });
+  }
+
+  function search(catalogue, params) {
+    var filters = parseFilters(params, catalogue.provinces);
+    var fields = catalogue.fields;
+    var found = [];
+    Object.keys(catalogue.grants).forEach(function (id) {
+      var row = catalogue.grants[id], g = {};
+      for (var i = 0; i < fields.length; i++) g[fields[i]] = row[i];
+      if (grantMatches(g, filters, catalogue.regions[id] || [])) found.push(g);
+    });
+    found = collapseDuplicates(found, params);
+    // Deadline ascending, open-ended last (as the list query)
+    found.sort(function (a, b) {
+      if ((a.deadline_date === null) !== (b.deadline_date === null)) return a.deadline_date === null ? 1 : -1;
+      if (a.deadline_date !== b.deadline_date) return a.deadline_date < b.deadline_date ? -1 : 1;
+      return a.id - b.id;
+    });
+    return found;
+  }
+
+  // ---------------------------------------------------------
+  // Rendering (mirror of templates/grants/_card.html)
+  // ---------------------------------------------------------
+  function amount(value) {
+    // Python prints float columns with a decimal point (1000.0)
+    return Number.isInteger(value) ? value.toFixed(1) : String(value);
+  }
+
+  function daysLeft(deadline) {
+    if (!deadline) return null;
+    var now = new Date();
+    var today = Date.UTC(now.getFullYear(), now.getMonth(), now.getDate());
+    var parts = deadline.split("-");
+    return Math.round((Date.UTC(+parts[0], +parts[1] - 1, +parts[2]) - today) / 86400000);
+  }
+
+  function fill(card, slot, text) {
+    card.querySelectorAll('[data-slot="' + slot + '"]').forEach(function (el) {
+      if (text === null || text === undefined || text === "") el.remove();
+      else el.textContent = text;
+    });
+  }
+
+  function renderCard(template, catalogue, g) {
+    var card = template.content.firstElementChild.cloneNode(true);
+    var url = data.detailUrl.replace(/0$/, g.id);
+    var days = daysLeft(g.deadline_date);
+    if (days !== null) {
+      if (days < 0) card.classList.add("yk-deadline-past");
+      else if (days < 7) card.classList.add("yk-deadline-red");
+      else if (days < 14) card.classList.add("yk-deadline-yellow");
+      else if (days < 30) card.classList.add("yk-deadline-blue");
+    }
+
+    card.querySelectorAll("[data-link]").forEach(function (a) { a.href = url; });
+    fill(card, "name", g.name_en);
+    fill(card, "organization", catalogue.organizations[g.organization_id]);
+    fill(card, "region_scope", g.region_scope);
+    fill(card, "team_scope", g.team_scope);
+    fill(card, "language", g.language);
+    var type = g.individual_type;
+    fill(card, "individual_type", type ? type.charAt(0).toUpperCase() + type.slice(1).toLowerCase() : null);
+
+    var unknown = data.unknown;
+    fill(card, "funding", g.funding_min || g.funding_max
+      ? (g.funding_min ? amount(g.funding_min) : unknown) + " – " +
+        (g.funding_max ? amount(g.funding_max) : unknown) + " " + (g.currency || "")
+      : data.notSpecified);
+
+    fill(card, "deadline", g.deadline_date || data.ongoing);
+    fill(card, "days_left", days === null ? null : (days < 0 ? data.pastDeadline : days + " " + data.daysLeft));
+
+    if (g.province) fill(card, "province", g.province);
+    else card.querySelectorAll("[data-province-row]").forEach(function (el) { el.remove(); });
+
+    var source = card.querySelector("[data-source]");
+    if (g.source_url) source.href = g.source_url;
+    else source.remove();
+    return card;
+  }
+
+  function render(catalogue, params) {
+    var grants = search(catalogue, params);
+    var cards = document.createDocumentFragment();
+    if (grants.length) {
+      var template = document.getElementById("yk-card-template");
+      grants.forEach(function (g) { cards.appendChild(renderCard(template, catalogue, g)); });
+    } else {
+      cards.appendChild(document.getElementById("yk-empty-template").content.cloneNode(true));
+    }
+    grid.replaceChildren(cards);
+
+    var badge = document.getElementById("yk-result-count");
+    badge.textContent = grants.length ? grants.length + " " + data.results : data.noResults;
+    badge.classList.toggle("yk-badge-muted", !grants.length);
+
+    // Links that carry the filters
+    var query = params.toString();
+    var saved = document.querySelector('input[name="query"]');
+    if (saved) saved.value = query;
+    var feed = document.getElementById("yk-feed-link");
+    if (feed) {
+      var feedParams = new URLSearchParams();
+      params.forEach(function (value, key) {
+        if (value && NON_FILTER_ARGS.indexOf(key) === -1 && !feedParams.has(key)) feedParams.set(key, value);
+      });
+      feed.href = data.feedUrl + (feedParams.toString() ? "?" + feedParams : "");
+    }
+    root.hidden = false;
+  }
+
+  // ---------------------------------------------------------
+  // Form
+  // ---------------------------------------------------------
+  function handledHere(params) {
+    return !params.get("archived") && (params.get("region_id") || "") === data.regionId;
+  }
+
+  function setForm(params) {
+    Array.prototype.forEach.call(form.elements, function (el) {
+      if (!el.name) return;
+      if (el.type === "checkbox") el.checked = params.get(el.name) === el.value;
+      else if (el.tagName !== "BUTTON") el.value = params.get(el.name) || "";
+    });
+  }
+
+  sync().then(function (catalogue) {
+    if (!catalogue || !form || !grid) return;
+    state = catalogue;
+
+    form.addEventListener("submit", function (event) {
+      var params = new URLSearchParams(new FormData(form));
+      if (!handledHere(params)) return;
+      event.preventDefault();
+      render(state, params);
+      history.pushState({ filtered: true }, "", "?" + params);
+    });
+
+    window.addEventListener("popstate", function () {
+      var params = new URLSearchParams(location.search);
+      if (!handledHere(params)) {
+        location.reload();
+        return;
+      }
+      setForm(params);
+      render(state, params);
+    });
+  });
+})();
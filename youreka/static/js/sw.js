@@ -0,0 +1,103 @@
+// Service worker for the grant portal (served at /sw.js, see youreka/offline.py).
+//
+// - Fingerprinted /assets/ URLs never change, so they are answered from
+//   the cache first.
+// - Unversioned /static/ files are answered from the cache too, but
+//   refetched in the background so a deploy shows up on the next load.
+// - Pages are fetched from the network and a copy kept, so grants already
+//   visited still open when the connection drops.
+// - /api/catalogue is left to the list page (static/js/catalogue.js),
+//   which keeps its own merged copy.
+
+var VERSION = "v2";
+var STATIC_CACHE = "yk-static-" + VERSION;
+var PAGE_CACHE = "yk-pages-" + VERSION;
+var CATALOGUE_CACHE = "yk-catalogue-" + VERSION;
+var MAX_PAGES = 300;
+
+self.addEventListener("install", function () {
+  self.skipWaiting();
+});
+
+self.addEventListener("activate", function (event) {
+  var keep = [STATIC_CACHE, PAGE_CACHE, CATALOGUE_CACHE];
+  event.waitUntil(
+    caches.keys().then(function (names) {
+      return Promise.all(names.filter(function (name) {
+        return name.indexOf("yk-") === 0 && keep.indexOf(name) === -1;
+      }).map(function (name) { return caches.delete(name); }));
+    }).then(function () { return self.clients.claim(); })
+  );
+});
+
+function trimPages(cache) {
+  return cache.keys().then(function (keys) {
+    if (keys.length <= MAX_PAGES) return;
+    return Promise.all(keys.slice(0, keys.length - MAX_PAGES).map(function (key) {
+      return cache.delete(key);
+    }));
+  });
+}
+
+function cacheFirst(request) {
+  return caches.open(STATIC_CACHE).then(function (cache) {
+    return cache.match(request).then(function (cached) {
+      if (cached) return cached;
+      return fetch(request).then(function (response) {
+        if (response.ok) cache.put(request, response.clone());
+        return response;
+      });
+    });
+  });
+}
+
+function staleWhileRevalidate(event) {
+  var request = event.request;
+  return caches.open(STATIC_CACHE).then(function (cache) {
+    return cache.match(request).then(function (cached) {
+      var fresh = fetch(request).then(function (response) {
+        if (response.ok) cache.put(request, response.clone());
+        return response;
+      });
+      if (!cached) return fresh;
+      event.waitUntil(fresh.catch(function () {}));
+      return cached;
+    });
+  });
+}
+
+function networkFirst(request) {
+  return caches.open(PAGE_CACHE).then(function (cache) {
+    return fetch(request).then(function (response) {
+      if (response.ok) {
+        cache.put(request, response.clone()).then(function () { return trimPages(cache); });
+      }
+      return response;
+    }).catch(function () {
+      return cache.match(request).then(function (cached) {
+        if (cached) return cached;
+        // Offline on a page never visited: the list page of that language,
+        // which can still filter the stored catalogue
+        var lang = new URL(request.url).pathname.split("/")[1];
+        return cache.match("/" + lang + "/", { ignoreSearch: true }).then(function (list) {
+          return list || Response.error();
+        });
+      });
+    });
+  });
+}
+
+self.addEventListener("fetch", function (event) {
+  var request = event.request;
+  if (request.method !== "GET") return;
+  var url = new URL(request.url);
+  if (url.origin !== self.location.origin) return;
+
+  if (url.pathname.indexOf("/assets/") === 0) {
+    event.respondWith(cacheFirst(request));
+  } else if (url.pathname.indexOf("/static/") === 0) {
+    event.respondWith(staleWhileRevalidate(event));
+  } else if (request.mode === "navigate" && /^\/(en|fr)\//.test(url.pathname)) {
+    event.respondWith(networkFirst(request));
+  }
+});
@@ -0,0 +1,251 @@
+"""
+Static snapshot of the public catalogue.
+
+`flask build-static` renders every live grant's page and the list page
+for each STATIC_PRESETS query, in every language, into STATIC_SITE_DIR
+(with .gz / .br variants), so nginx or a CDN can answer most anonymous
+reads without reaching Flask. POSTs, region-specific views and other
+filters still go to the app.
+
+Pages are rendered through the app itself (a test client), so they are
+byte-for-byte what Flask would send. The build is incremental: each page
+is stored in manifest.json with a stamp of what it was rendered from, and
+only pages whose stamp changed are rendered again.
+
+- Grant page: the grant's updated_at and cluster (plus the newest
+  updated_at in the cluster, for "Also listed as").
+- List and preset pages: the catalogue as a whole (grant count, newest
+  updated_at, change log cursor, status count) and the date.
+- Everything: templates, translations, built assets and reference data
+  versions. When any of these change the whole site is rendered again.
+
+Pages of grants that left the live table (archived, deleted) are removed,
+so the app serves them again. The manifest also goes out as urls.map, an
+nginx map from "GET<uri>" to the file.
+"""
+
+import hashlib
+import json
+import os
+import time
+from datetime import date
+from urllib.parse import parse_qsl, urlencode
+
+from flask import url_for
+from sqlalchemy import func, select
+from werkzeug.datastructures import MultiDict
+
+from .assets import MANIFEST_NAME as ASSET_MANIFEST_NAME, write_precompressed
+from .changes import latest_cursor
+from .extensions import db
+from .models import Grant, GrantStatus, ReferenceVersion
+
+MANIFEST_NAME = "manifest.json"
+NGINX_MAP_NAME = "urls.map"
+MANIFEST_VERSION = 1
+# Quality 11 takes seconds on a multi-megabyte list page for ~2% smaller output
+BROTLI_QUALITY = 9
+
+
+def _write(path, data):
+    """Atomically write ``data`` (bytes) and its precompressed variants."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    write_precompressed(tmp, data, brotli_quality=BROTLI_QUALITY)
+    for suffix in (".gz", ".br"):
+        if os.path.exists(tmp + suffix):
+            os.replace(tmp + suffix, path + suffix)
+    os.replace(tmp, path)
+
+
+def _remove(path):
+    for suffix in ("", ".gz", ".br"):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def _hash_tree(digest, root, suffixes=None):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if suffixes and not name.endswith(suffixes):
+                continue
+            path = os.path.join(dirpath, name)
+            digest.update(os.path.relpath(path, root).encode())
+            with open(path, "rb") as f:
+                digest.update(f.read())
+
+
+def site_fingerprint(app):
+    """Hash of everything every page depends on."""
+    digest = hashlib.sha256(str(MANIFEST_VERSION).encode())
+    _hash_tree(digest, os.path.join(app.root_path, app.template_folder))
+    _hash_tree(digest, app.config["BABEL_TRANSLATION_DIRECTORIES"], (".mo",))
+    asset_manifest = os.path.join(app.static_folder, "dist", ASSET_MANIFEST_NAME)
+    if os.path.exists(asset_manifest):
+        with open(asset_manifest, "rb") as f:
+            digest.update(f.read())
+    versions = db.session.execute(
+        select(ReferenceVersion.name, ReferenceVersion.version).order_by(ReferenceVersion.name)
+    ).all()
+    digest.update(repr([tuple(v) for v in versions]).encode())
+    digest.update(repr((app.config["LANGUAGES"], app.config.get("DEDUP_COLLAPSE_LIST"))).encode())
+    return digest.hexdigest()[:16]
+
+
+def _catalogue_stamp(app):
+    grants = db.session.execute(select(func.count(Grant.id), func.max(Grant.updated_at))).one()
+    statuses = db.session.execute(select(func.count(GrantStatus.id))).scalar()
+    cursor = latest_cursor() if app.config.get("CHANGE_LOG_ENABLED", True) else None
+    return f"{grants[0]}|{grants[1]}|{statuses}|{cursor}|{date.today()}"
+
+
+def _grant_stamps():
+    """{grant id: stamp} for every live grant."""
+    cluster_updated = dict(
+        db.session.execute(
+            select(Grant.cluster_id, func.max(Grant.updated_at))
+            .where(Grant.cluster_id.isnot(None))
+            .group_by(Grant.cluster_id)
+        ).all()
+    )
+    # The link checker leaves updated_at alone but the page shows its
+    # broken-link warning; the check date is enough to catch changes
+    rows = db.session.execute(
+        select(
+            Grant.id, Grant.updated_at, Grant.cluster_id,
+            Grant.link_status, Grant.link_failures, Grant.link_checked_at,
+        )
+    ).all()
+    return {
+        grant_id: (
+            f"{updated_at}|{cluster_id}|{cluster_updated.get(cluster_id)}"
+            f"|{link_status}|{link_failures}|{checked_at.date() if checked_at else None}"
+        )
+        for grant_id, updated_at, cluster_id, link_status, link_failures, checked_at in rows
+    }
+
+
+def preset_query(preset):
+    """Canonical query string of a preset ("province=ON&ngo_only=true" -> sorted, no blanks)."""
+    pairs = sorted((k, v) for k, v in parse_qsl(preset, keep_blank_values=False))
+    return urlencode(pairs)
+
+
+def _preset_file(lang, query):
+    if not query:
+        return f"{lang}/index.html"
+    slug = "".join(c if c.isalnum() else "-" for c in query.lower()).strip("-")
+    return f"{lang}/presets/{slug}.html"
+
+
+def _load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get("version") == MANIFEST_VERSION else None
+
+
+def _save_manifest(out_dir, manifest):
+    tmp = os.path.join(out_dir, MANIFEST_NAME + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST_NAME))
+
+    lines = [f'"GET{url}" /{page["file"]};' for url, page in sorted(manifest["pages"].items())]
+    tmp = os.path.join(out_dir, NGINX_MAP_NAME + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, os.path.join(out_dir, NGINX_MAP_NAME))
+
+
+def build_static(app, out_dir=None, full=False, presets=None, verbose=False):
+    """
+    Render changed pages into ``out_dir`` (default STATIC_SITE_DIR) and
+    update its manifest. ``full`` renders everything. Returns counts.
+    Switches off rate limiting and list streaming on ``app``: run it in a
+    CLI process, not in a web worker.
+    """
+    started = time.perf_counter()
+    out_dir = out_dir or app.config["STATIC_SITE_DIR"]
+    presets = app.config.get("STATIC_PRESETS", []) if presets is None else presets
+    base_url = app.config.get("PORTAL_BASE_URL", "http://localhost")
+
+    fingerprint = site_fingerprint(app)
+    old = _load_manifest(out_dir)
+    if full or old is None or old.get("fingerprint") != fingerprint:
+        old_pages, full = (old or {}).get("pages", {}), True
+    else:
+        old_pages = old["pages"]
+
+    # What each page should be rendered from: url -> (file, stamp, kind)
+    wanted = {}
+    catalogue = _catalogue_stamp(app)
+    grant_stamps = _grant_stamps()
+    queries = sorted({"", *(preset_query(p) for p in presets)})
+    with app.test_request_context(base_url=base_url):
+        for lang in app.config["LANGUAGES"]:
+            for query in queries:
+                url = url_for("grants.index", lang_code=lang) + (f"?{query}" if query else "")
+                wanted[url] = (_preset_file(lang, query), catalogue, "list")
+            for grant_id, stamp in grant_stamps.items():
+                url = url_for("grants.grant_detail", grant_id=grant_id, lang_code=lang)
+                wanted[url] = (f"{lang}/grant/{grant_id}.html", stamp, "grant")
+
+    # Render through the app, without the parts meant for live traffic
+    app.config.update(ADMISSION_ENABLED=False, STREAM_LIST_PAGE=False)
+    client = app.test_client(use_cookies=False)
+
+    stats = {"rendered": 0, "unchanged": 0, "removed": 0, "failed": 0, "bytes": 0}
+    pages = {}
+    for url, (filename, stamp, kind) in wanted.items():
+        previous = old_pages.get(url)
+        path = os.path.join(out_dir, filename)
+        if not full and previous and previous["stamp"] == stamp and os.path.exists(path):
+            pages[url] = previous
+            stats["unchanged"] += 1
+            continue
+
+        path_part, _, query = url.partition("?")
+        response = client.get(path_part, query_string=MultiDict(parse_qsl(query)), base_url=base_url)
+        if response.status_code != 200:
+            stats["failed"] += 1
+            if verbose:
+                print(f"  {response.status_code} {url}")
+            continue
+        data = response.get_data()
+        _write(path, data)
+        pages[url] = {
+            "file": filename,
+            "kind": kind,
+            "stamp": stamp,
+            "etag": hashlib.sha256(data).hexdigest()[:16],
+            "bytes": len(data),
+        }
+        stats["rendered"] += 1
+        stats["bytes"] += len(data)
+        # The CLI's app context outlives each request; don't let the
+        # session's identity map grow with every page
+        db.session.remove()
+
+    for url, previous in old_pages.items():
+        if url not in pages:
+            _remove(os.path.join(out_dir, previous["file"]))
+            if url not in wanted:
+                stats["removed"] += 1
+
+    _save_manifest(out_dir, {
+        "version": MANIFEST_VERSION,
+        "fingerprint": fingerprint,
+        "base_url": base_url,
+        "pages": pages,
+    })
+    stats["pages"] = len(pages)
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    return stats
@@ -0,0 +1,236 @@
+"""
+Region status history and pipeline timelines.
+
+GrantStatus only holds a region's current status. Every edit also
+appends a compact GrantStatusEvent (region, grant, from -> to, notes
+changed?), and `flask snapshot-statuses` (run weekly, or daily) stores
+per-region totals per status. The reports then only read index ranges:
+
+- what moved this week:   events by (region_id, created_at)
+- a grant's history:      events by (grant_id, created_at)
+- week-over-week totals:  snapshots by (region_id, snapshot_date)
+- current totals:         grant_statuses by region_id
+"""
+
+from datetime import date, datetime, timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy import case, delete, event, func, insert, inspect, literal, select
+
+from .extensions import db
+from .models import STATUSES, Grant, GrantStatus, GrantStatusEvent, GrantStatusSnapshot
+
+# Statuses saved by the French form before option values were canonical
+LEGACY_LABELS = {
+    "Non commencé": "Not Started",
+    "En cours": "In Progress",
+    "Soumis": "Submitted",
+    "Rejeté": "Rejected",
+    "Attribué": "Awarded",
+}
+
+
+def status_code(status):
+    """Index of ``status`` in STATUSES (None for unknown values)."""
+    status = LEGACY_LABELS.get(status, status)
+    try:
+        return STATUSES.index(status)
+    except ValueError:
+        return None
+
+
+def status_name(code):
+    return STATUSES[code] if code is not None and 0 <= code < len(STATUSES) else None
+
+
+def _record_flush(session, flush_context):
+    if not (has_app_context() and current_app.config.get("STATUS_HISTORY_ENABLED", True)):
+        return
+    now = datetime.utcnow()
+    rows = []
+    for obj in session.new:
+        if isinstance(obj, GrantStatus):
+            rows.append({
+                "region_id": obj.region_id, "grant_id": obj.grant_id, "from_status": None,
+                "to_status": status_code(obj.status), "notes_changed": bool(obj.notes), "created_at": now,
+            })
+    for obj in session.dirty:
+        if not isinstance(obj, GrantStatus):
+            continue
+        attrs = inspect(obj).attrs
+        status, notes = attrs.status.history, attrs.notes.history
+        if not (status.has_changes() or notes.has_changes()):
+            continue
+        previous = status.deleted[0] if status.deleted else obj.status
+        rows.append({
+            "region_id": obj.region_id, "grant_id": obj.grant_id,
+            "from_status": status_code(previous), "to_status": status_code(obj.status),
+            "notes_changed": notes.has_changes(), "created_at": now,
+        })
+    if rows:
+        session.connection().execute(insert(GrantStatusEvent.__table__), rows)
+
+
+def log_bulk_statuses(conn, first_status_id):
+    """
+    History events for status rows bulk-inserted with Core (ids from
+    ``first_status_id`` on), dated by their last_updated. Returns rows.
+    """
+    if not current_app.config.get("STATUS_HISTORY_ENABLED", True):
+        return 0
+    statuses = GrantStatus.__table__
+    code = case(*((statuses.c.status == name, i) for i, name in enumerate(STATUSES)), else_=None)
+    return conn.execute(
+        insert(GrantStatusEvent.__table__).from_select(
+            ["region_id", "grant_id", "from_status", "to_status", "notes_changed", "created_at"],
+            select(
+                statuses.c.region_id, statuses.c.grant_id, literal(None), code,
+                statuses.c.notes.isnot(None), func.coalesce(statuses.c.last_updated, datetime.utcnow()),
+            )
+            .where(statuses.c.id >= first_status_id)
+            .order_by(statuses.c.id),
+        )
+    ).rowcount
+
+
+# ---------------------------------------------------------
+# Snapshots
+# ---------------------------------------------------------
+def snapshot_statuses(day=None):
+    """Store today's per-region totals per status (replacing any for that day)."""
+    day = day or date.today()
+    totals = {}
+    for region_id, status, grants, budget, applied, awarded in db.session.execute(
+        select(
+            GrantStatus.region_id,
+            GrantStatus.status,
+            func.count(GrantStatus.id),
+            func.sum(GrantStatus.budget_allocated),
+            func.sum(GrantStatus.amount_applied),
+            func.sum(GrantStatus.amount_awarded),
+        ).group_by(GrantStatus.region_id, GrantStatus.status)
+    ):
+        code = status_code(status)
+        if code is None:
+            continue
+        row = totals.setdefault((region_id, code), {
+            "region_id": region_id, "snapshot_date": day, "status": code,
+            "grants": 0, "budget_allocated": 0.0, "amount_applied": 0.0, "amount_awarded": 0.0,
+        })
+        row["grants"] += grants
+        row["budget_allocated"] += budget or 0.0
+        row["amount_applied"] += applied or 0.0
+        row["amount_awarded"] += awarded or 0.0
+
+    table = GrantStatusSnapshot.__table__
+    db.session.execute(delete(table).where(table.c.snapshot_date == day))
+    if totals:
+        db.session.execute(insert(table), list(totals.values()))
+    return len(totals)
+
+
+# ---------------------------------------------------------
+# Reports
+# ---------------------------------------------------------
+def _week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def current_totals(region_id):
+    """{status: grant count} for a region right now."""
+    counts = dict.fromkeys(STATUSES, 0)
+    for status, n in db.session.execute(
+        select(GrantStatus.status, func.count(GrantStatus.id))
+        .where(GrantStatus.region_id == region_id)
+        .group_by(GrantStatus.status)
+    ):
+        name = status_name(status_code(status))
+        if name:
+            counts[name] += n
+    return counts
+
+
+def region_timeline(region_id, weeks=12, today=None):
+    """
+    Weekly pipeline totals for a region, oldest first: the last snapshot
+    of each past week, then the live totals for this week. Each entry has
+    ``week``, ``counts`` ({status: grants}), ``awarded`` and ``changes``
+    (vs the previous entry).
+    """
+    today = today or date.today()
+    start = _week_start(today) - timedelta(weeks=weeks)
+    latest = {}
+    for snap in GrantStatusSnapshot.query.filter(
+        GrantStatusSnapshot.region_id == region_id,
+        GrantStatusSnapshot.snapshot_date >= start,
+    ).order_by(GrantStatusSnapshot.snapshot_date):
+        week = _week_start(snap.snapshot_date)
+        entry = latest.get(week)
+        if entry is None or entry["date"] < snap.snapshot_date:
+            entry = latest[week] = {
+                "week": week, "date": snap.snapshot_date,
+                "counts": dict.fromkeys(STATUSES, 0), "awarded": 0.0, "live": False,
+            }
+        if entry["date"] == snap.snapshot_date:
+            entry["counts"][STATUSES[snap.status]] = snap.grants
+            entry["awarded"] += snap.amount_awarded or 0.0
+
+    awarded = db.session.execute(
+        select(func.sum(GrantStatus.amount_awarded)).where(GrantStatus.region_id == region_id)
+    ).scalar()
+    # The live totals stand in for this week's snapshot
+    timeline = [latest[week] for week in sorted(latest) if week < _week_start(today)]
+    timeline.append({
+        "week": _week_start(today), "date": today, "counts": current_totals(region_id),
+        "awarded": awarded or 0.0, "live": True,
+    })
+
+    previous = None
+    for entry in timeline:
+        entry["changes"] = {
+            status: entry["counts"][status] - (previous["counts"][status] if previous else 0)
+            for status in STATUSES
+        } if previous else None
+        previous = entry
+    return timeline
+
+
+def _region_events(query, region_id, since, until):
+    query = query.filter(GrantStatusEvent.region_id == region_id, GrantStatusEvent.created_at >= since)
+    if until is not None:
+        query = query.filter(GrantStatusEvent.created_at < until)
+    return query
+
+
+def region_movements(region_id, since, until=None, limit=200):
+    """Status events for a region in [since, until), newest first, with their grants."""
+    query = db.session.query(GrantStatusEvent, Grant).outerjoin(Grant, Grant.id == GrantStatusEvent.grant_id)
+    query = _region_events(query, region_id, since, until)
+    return query.order_by(GrantStatusEvent.created_at.desc()).limit(limit).all()
+
+
+def transition_counts(region_id, since, until=None):
+    """{(from, to): n} over all of a region's status events in [since, until)."""
+    query = db.session.query(
+        GrantStatusEvent.from_status, GrantStatusEvent.to_status, func.count(GrantStatusEvent.id)
+    ).filter(GrantStatusEvent.from_status.is_distinct_from(GrantStatusEvent.to_status))
+    query = _region_events(query, region_id, since, until)
+    counts = {}
+    for old, new, n in query.group_by(GrantStatusEvent.from_status, GrantStatusEvent.to_status):
+        key = (status_name(old), status_name(new))
+        counts[key] = counts.get(key, 0) + n
+    return counts
+
+
+def grant_history(grant_id, region_id=None, limit=50):
+    """Status events of one grant (optionally one region), newest first."""
+    query = GrantStatusEvent.query.filter(GrantStatusEvent.grant_id == grant_id)
+    if region_id is not None:
+        query = query.filter(GrantStatusEvent.region_id == region_id)
+    return query.order_by(GrantStatusEvent.created_at.desc()).limit(limit).all()
+
+
+def init_status_history(app):
+    if not event.contains(db.session, "after_flush", _record_flush):
+        event.listen(db.session, "after_flush", _record_flush)
+    app.add_template_global(status_name)
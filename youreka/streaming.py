@@ -0,0 +1,54 @@
+"""
+Streaming template rendering.
+
+``stream_page`` renders a template with Flask's stream_template and
+groups Jinja's many tiny output events into reasonably sized chunks.
+Templates can force everything rendered so far out to the client with
+``{{ stream_flush() }}`` (e.g. right before a slow loop), so the page
+header and sidebar arrive before the first database row is read.
+"""
+
+from flask import Response, g, get_flashed_messages, stream_template
+from markupsafe import Markup
+
+FLUSH_MARKER = Markup("\x00yk-flush\x00")
+CHUNK_SIZE = 16 * 1024
+
+
+def stream_flush():
+    """Template helper: flush point when streaming, no-op otherwise."""
+    return FLUSH_MARKER if g.get("streaming") else ""
+
+
+def _buffered(events, chunk_size):
+    buffer, size = [], 0
+    try:
+        for event in events:
+            if event == FLUSH_MARKER:
+                if buffer:
+                    yield "".join(buffer)
+                    buffer, size = [], 0
+                continue
+            buffer.append(event)
+            size += len(event)
+            if size >= chunk_size:
+                yield "".join(buffer)
+                buffer, size = [], 0
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        events.close()
+
+
+def stream_page(template_name, chunk_size=CHUNK_SIZE, **context):
+    """Return a streamed text/html Response for ``template_name``."""
+    g.streaming = True
+    # Flashes live in the session cookie, which is sent with the headers;
+    # read them now so the template doesn't pop them after that.
+    get_flashed_messages(with_categories=True)
+    events = stream_template(template_name, **context)
+    return Response(_buffered(events, chunk_size), mimetype="text/html")
+
+
+def init_streaming(app):
+    app.add_template_global(stream_flush)
@@ -0,0 +1,265 @@
+"""
+In-memory typeahead index for /api/suggest.
+
+Grant names (EN and FR), organization names, categories and provinces
+(with their French names) are held in one sorted array of
+(folded key, term) entries. A term is filed under the start of each of its
+words, so "sci" finds "Women in Science". A lookup is a bisect plus a
+short scan, so keystrokes never reach the database.
+
+The index is built on first use in each process and then kept current
+from the change log (see youreka/changes.py): at most every
+SUGGEST_SYNC_SECONDS a lookup first reloads just the grants that changed
+since the index's cursor. Without the change log it is rebuilt on that
+interval instead.
+"""
+
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from heapq import nsmallest
+from itertools import islice
+
+from flask import current_app
+from sqlalchemy import select
+
+from .changes import GRANT, CursorExpired, events_since, latest_cursor
+from .extensions import db
+from .models import Grant, Organization
+
+KINDS = ("grant", "organization", "category", "province")
+SCAN_LIMIT = 1000
+MIN_WORD = 2
+CACHE_SIZE = 10000
+
+# Grant.province holds English names
+PROVINCE_NAMES_FR = {
+    "British Columbia": "Colombie-Britannique",
+    "Quebec": "Québec",
+    "Nova Scotia": "Nouvelle-Écosse",
+    "New Brunswick": "Nouveau-Brunswick",
+    "Prince Edward Island": "Île-du-Prince-Édouard",
+    "Newfoundland and Labrador": "Terre-Neuve-et-Labrador",
+}
+
+_COLUMNS = (
+    Grant.id, Grant.name_en, Grant.name_fr, Grant.category, Grant.province,
+    Grant.organization_id, Organization.name,
+)
+
+
+def fold(text):
+    """Lower-case, accent-free, single-spaced form used for matching."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.casefold().split())
+
+
+def _keys(text):
+    """(key, inner) for the folded text from the start of each word worth typing."""
+    folded = fold(text)
+    keys = [(folded, 0)] if folded else []
+    for i, char in enumerate(folded):
+        if char == " " and i + 1 < len(folded):
+            rest = folded[i + 1:]
+            if len(rest.split(" ", 1)[0]) >= MIN_WORD:
+                keys.append((rest, 1))
+    return keys
+
+
+def _terms(row):
+    """(kind, text, value) suggestions contributed by one grant row."""
+    grant_id, name_en, name_fr, category, province, organization_id, organization = row
+    terms = set()
+    for name in (name_en, name_fr):
+        if name:
+            terms.add(("grant", name, grant_id))
+    if organization:
+        terms.add(("organization", organization, organization_id))
+    if category:
+        terms.add(("category", category, category))
+    if province:
+        terms.add(("province", province, province))
+        if province in PROVINCE_NAMES_FR:
+            terms.add(("province", PROVINCE_NAMES_FR[province], province))
+    return terms
+
+
+class SuggestIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        self.entries = []      # sorted [(key, inner, term)]; inner=1 for a later word
+        self.counts = {}       # term -> number of grants contributing it
+        self.by_grant = {}     # grant id -> its terms
+        self.results = {}      # (prefix, kinds, limit) -> answer, until the next change
+        self.cursor = None     # change log position the index reflects
+        self.synced = 0.0
+
+    # ---------------------------------------------------------
+    # Maintenance (callers hold the lock)
+    # ---------------------------------------------------------
+    def _add(self, term):
+        n = self.counts.get(term, 0)
+        self.counts[term] = n + 1
+        if n == 0:
+            for key, inner in _keys(term[1]):
+                insort(self.entries, (key, inner, term))
+
+    def _remove(self, term):
+        n = self.counts.pop(term, 0) - 1
+        if n > 0:
+            self.counts[term] = n
+            return
+        for key, inner in _keys(term[1]):
+            entry = (key, inner, term)
+            i = bisect_left(self.entries, entry)
+            if i < len(self.entries) and self.entries[i] == entry:
+                del self.entries[i]
+
+    def _set_grant(self, grant_id, terms):
+        old = self.by_grant.pop(grant_id, set())
+        for term in old - terms:
+            self._remove(term)
+        for term in terms - old:
+            self._add(term)
+        if terms:
+            self.by_grant[grant_id] = terms
+
+    def load(self, rows, cursor):
+        """Replace the whole index with ``rows`` (see _COLUMNS)."""
+        counts, by_grant = {}, {}
+        for row in rows:
+            terms = _terms(row)
+            by_grant[row[0]] = terms
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+        entries = sorted((key, inner, term) for term in counts for key, inner in _keys(term[1]))
+        with self.lock:
+            self.entries, self.counts, self.by_grant = entries, counts, by_grant
+            self.results = {}
+            self.cursor = cursor
+
+    def update(self, grant_ids, rows, cursor):
+        """Reload ``grant_ids`` from ``rows``; ids without a row are dropped."""
+        found = {row[0]: _terms(row) for row in rows}
+        with self.lock:
+            for grant_id in grant_ids:
+                self._set_grant(grant_id, found.get(grant_id, set()))
+            self.results = {}
+            self.cursor = cursor
+
+    # ---------------------------------------------------------
+    # Lookup
+    # ---------------------------------------------------------
+    def search(self, prefix, kinds=KINDS, limit=10):
+        """Best ``limit`` terms with a word starting with ``prefix``, as dicts."""
+        prefix = fold(prefix)
+        if not prefix:
+            return []
+        with self.lock:
+            # Short prefixes scan many entries; repeats are answered from memory
+            cache_key = (prefix, kinds, limit)
+            cached = self.results.get(cache_key)
+            if cached is None:
+                if len(self.results) >= CACHE_SIZE:
+                    self.results = {}
+                cached = self.results[cache_key] = self._search(prefix, kinds, limit)
+            return cached
+
+    def _search(self, prefix, kinds, limit):
+        matches = {}
+        start = bisect_left(self.entries, (prefix,))
+        for key, inner, term in islice(self.entries, start, start + SCAN_LIMIT):
+            if not key.startswith(prefix):
+                break
+            if term[0] in kinds and matches.get(term, 1):
+                matches[term] = inner
+        # Matches at the start of the text first, then the most used
+        counts = self.counts
+        ranked = nsmallest(
+            limit * 4, matches, key=lambda t: (matches[t], -counts.get(t, 0), len(t[1]), t[1])
+        )
+        # Grants sharing a name (one per cycle) are suggested once
+        seen, found = set(), []
+        for kind, text, value in ranked:
+            if (kind, text) in seen:
+                continue
+            seen.add((kind, text))
+            found.append({
+                "kind": kind, "text": text, "value": value,
+                "grants": self.counts.get((kind, text, value), 0),
+            })
+            if len(found) == limit:
+                break
+        return found
+
+
+# ---------------------------------------------------------
+# Per-process index
+# ---------------------------------------------------------
+def _rows(grant_ids=None):
+    query = select(*_COLUMNS).outerjoin(Organization, Organization.id == Grant.organization_id)
+    if grant_ids is not None:
+        query = query.where(Grant.id.in_(grant_ids))
+    return db.session.execute(query).all()
+
+
+def _rebuild(index):
+    change_log = current_app.config.get("CHANGE_LOG_ENABLED", True)
+    cursor = latest_cursor() if change_log else None
+    index.load(_rows(), cursor)
+
+
+def _catch_up(index):
+    cursor, changed = index.cursor, set()
+    while True:
+        rows, has_more = events_since(cursor, 5000)
+        changed.update(r.grant_id for r in rows if r.entity == GRANT)
+        if rows:
+            cursor = rows[-1].id
+        if not has_more:
+            break
+    if changed:
+        grant_ids = sorted(changed)
+        index.update(grant_ids, _rows(grant_ids), cursor)
+    else:
+        index.cursor = cursor
+
+
+def get_index(app=None):
+    """This process's index, built on first use and synced at most every SUGGEST_SYNC_SECONDS."""
+    app = app or current_app._get_current_object()
+    index = app.extensions.get("suggest_index")
+    if index is None:
+        index = app.extensions["suggest_index"] = SuggestIndex()
+
+    interval = app.config.get("SUGGEST_SYNC_SECONDS", 30)
+    if index.synced and time.monotonic() - index.synced < interval:
+        return index
+    # One thread syncs; the others keep answering from the current
+    # index, except before the first build
+    if not index.sync_lock.acquire(blocking=not index.synced):
+        return index
+    try:
+        if index.synced and time.monotonic() - index.synced < interval:
+            return index
+        try:
+            if index.cursor is None:
+                _rebuild(index)
+            else:
+                _catch_up(index)
+        except CursorExpired:
+            _rebuild(index)
+        finally:
+            # The index is in memory; don't keep a transaction open for it
+            db.session.rollback()
+        index.synced = time.monotonic()
+    finally:
+        index.sync_lock.release()
+    return index
+
+
+def suggest(prefix, kinds=KINDS, limit=10):
+    return get_index().search(prefix, kinds, limit)
@@ -0,0 +1,305 @@
+"""
+Synthetic catalogue generator for large-scale testing.
+
+Produces realistic bilingual grants, organizations, regions and GrantStatus
+rows and writes them with bulk inserts (COPY on Postgres). Output is
+deterministic for a given seed. It can also emit a CSV in the
+data/grants.csv layout for the seeding / import path.
+
+    flask --app app generate-catalogue --grants 1000000 --seed 7
+    flask --app app generate-catalogue --grants 5000 --csv data/synthetic.csv --no-db
+"""
+
+import csv
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select
+
+from .bulk import bulk_insert, fast_sqlite_pragmas, fix_sequence, next_id
+from .changes import log_bulk_inserts
+from .extensions import db
+from .ingest import finalize_ingest
+from .models import STATUSES, Grant, GrantStatus, Organization, Region
+from .reference import bump_versions
+from .seed_grants import GRANT_CSV_FIELDS
+from .status_history import log_bulk_statuses
+
+CHUNK_SIZE = 10000
+
+# (English, French) program names
+PROGRAMS = [
+    ("Youth Innovation Fund", "Fonds d'innovation jeunesse"),
+    ("Community Capacity Grant", "Subvention de renforcement des capacités communautaires"),
+    ("STEM Outreach Program", "Programme de sensibilisation aux STIM"),
+    ("Student Research Award", "Bourse de recherche étudiante"),
+    ("Science Literacy Initiative", "Initiative de culture scientifique"),
+    ("Digital Skills Grant", "Subvention pour les compétences numériques"),
+    ("Women in Science Scholarship", "Bourse pour les femmes en sciences"),
+    ("Indigenous Education Fund", "Fonds pour l'éducation autochtone"),
+    ("Rural Learning Partnership", "Partenariat d'apprentissage rural"),
+    ("Health Research Mentorship Grant", "Subvention de mentorat en recherche en santé"),
+    ("Climate Action Youth Grant", "Subvention jeunesse pour l'action climatique"),
+    ("Newcomer Youth Support Fund", "Fonds de soutien aux jeunes nouveaux arrivants"),
+]
+
+QUALIFIERS = [
+    ("", ""),
+    ("Emerging ", "émergent "),
+    ("Regional ", "régional "),
+    ("National ", "national "),
+    ("Pilot ", "pilote "),
+]
+
+FUNDERS = [
+    ("Foundation", "Foundation"),
+    ("Community Foundation", "Foundation"),
+    ("Ministry of Education", "Government"),
+    ("Research Council", "Government"),
+    ("Credit Union", "Corporate"),
+    ("Trust", "Foundation"),
+]
+
+PLACES = [
+    ("Ontario", "Ontario", "Toronto"),
+    ("British Columbia", "Colombie-Britannique", "Vancouver"),
+    ("Alberta", "Alberta", "Calgary"),
+    ("Quebec", "Québec", "Montreal"),
+    ("Manitoba", "Manitoba", "Winnipeg"),
+    ("Saskatchewan", "Saskatchewan", "Regina"),
+    ("Nova Scotia", "Nouvelle-Écosse", "Halifax"),
+    ("New Brunswick", "Nouveau-Brunswick", "Moncton"),
+    ("Newfoundland and Labrador", "Terre-Neuve-et-Labrador", "St. John's"),
+    ("Prince Edward Island", "Île-du-Prince-Édouard", "Charlottetown"),
+]
+
+CATEGORIES = ["Education", "Youth", "STEM", "Community", "Research", "Health", "Education/Technology"]
+
+DESCRIPTIONS_EN = [
+    "Supports projects that give young people hands-on experience with scientific research.",
+    "Funds community organizations delivering programs for students in underserved areas.",
+    "Helps schools and non-profits expand access to mentorship and skills training.",
+    "Provides multi-year funding for initiatives that improve science and health literacy.",
+    "Covers program costs, equipment and coordinator time for eligible projects.",
+]
+DESCRIPTIONS_FR = [
+    "Soutient des projets qui offrent aux jeunes une expérience concrète de la recherche scientifique.",
+    "Finance des organismes communautaires offrant des programmes aux élèves des régions mal desservies.",
+    "Aide les écoles et les organismes sans but lucratif à élargir l'accès au mentorat et à la formation.",
+    "Offre un financement pluriannuel aux initiatives qui améliorent la culture scientifique et la santé.",
+    "Couvre les coûts de programme, l'équipement et le temps de coordination des projets admissibles.",
+]
+ELIGIBILITY_EN = [
+    "Registered charities and non-profit organizations based in Canada.",
+    "Students enrolled full-time in a Canadian secondary or post-secondary institution.",
+    "Schools, school boards and community groups with a youth focus.",
+]
+ELIGIBILITY_FR = [
+    "Organismes de bienfaisance enregistrés et organismes sans but lucratif établis au Canada.",
+    "Élèves inscrits à temps plein dans un établissement secondaire ou postsecondaire canadien.",
+    "Écoles, conseils scolaires et groupes communautaires axés sur les jeunes.",
+]
+
+# Rough pipeline shape: most grants never get past "Not Started"
+STATUS_WEIGHTS = [50, 20, 15, 8, 7]
+
+
+def _organizations(rng, count, start_id):
+    rows = []
+    for i in range(count):
+        place = rng.choice(PLACES)
+        suffix, org_type = rng.choice(FUNDERS)
+        rows.append({
+            "id": start_id + i,
+            "name": f"{place[2]} {suffix} #{start_id + i}",
+            "type": org_type,
+            "ngo_only": rng.random() < 0.3,
+            "website_url": f"https://funder{start_id + i}.example.org",
+            "country": "Canada",
+            "province": place[0] if org_type != "Government" or rng.random() < 0.5 else None,
+        })
+    return rows
+
+
+def _regions(rng, count, start_id):
+    rows = []
+    for i in range(count):
+        place = rng.choice(PLACES)
+        rows.append({
+            "id": start_id + i,
+            "name_en": f"{place[2]} Chapter {start_id + i}",
+            "name_fr": f"Section {place[2]} {start_id + i}",
+            "province": place[0],
+            "city": place[2],
+            "is_active": True,
+        })
+    return rows
+
+
+def _grant(rng, grant_id, org_ids, seed, today):
+    program_en, program_fr = rng.choice(PROGRAMS)
+    qual_en, qual_fr = rng.choice(QUALIFIERS)
+    place_en, place_fr, _city = rng.choice(PLACES)
+    year = rng.randint(today.year - 2, today.year + 1)
+    national = rng.random() < 0.25
+
+    funding_min = rng.choice([None, 500, 1000, 2500, 5000, 10000, 25000])
+    funding_max = (funding_min or 0) + rng.choice([1000, 5000, 20000, 75000, 250000])
+    ongoing = rng.random() < 0.1
+    deadline = None if ongoing or rng.random() < 0.1 else today + timedelta(days=rng.randint(-400, 400))
+    created = datetime.combine(today - timedelta(days=rng.randint(0, 900)), datetime.min.time())
+
+    return {
+        "id": grant_id,
+        "organization_id": rng.choice(org_ids),
+        "name_en": f"{'' if national else place_en + ' '}{qual_en}{program_en} {year}",
+        "name_fr": f"{program_fr} {qual_fr}{'' if national else place_fr + ' '}{year}".replace("  ", " "),
+        "description_en": " ".join(rng.sample(DESCRIPTIONS_EN, 2)),
+        "description_fr": " ".join(rng.sample(DESCRIPTIONS_FR, 2)),
+        "eligibility_en": rng.choice(ELIGIBILITY_EN),
+        "eligibility_fr": rng.choice(ELIGIBILITY_FR),
+        "category": rng.choice(CATEGORIES),
+        "province": None if national else place_en,
+        "region_scope": "National" if national else rng.choice(["Provincial", "Municipal"]),
+        "country": "Canada",
+        "team_scope": "National" if national else rng.choice(["Regional", None]),
+        "individual_type": rng.choice(["individual", "organization", "both", None]),
+        "funding_min": funding_min,
+        "funding_max": funding_max,
+        "currency": "CAD",
+        "deadline_date": deadline,
+        "ongoing_flag": ongoing,
+        "language": rng.choices(["EN", "FR", "Bilingual"], weights=[55, 15, 30])[0],
+        "is_ngo_only": rng.random() < 0.2,
+        "source_url": f"https://grants.example.org/{seed}/{grant_id}",
+        "external_id": f"synthetic-{seed}-{grant_id}",
+        "created_at": created,
+        "updated_at": created,
+    }
+
+
+def _statuses(rng, grant_ids, region_ids, rate, start_id, today):
+    rows = []
+    next_status_id = start_id
+    for grant_id in grant_ids:
+        if rng.random() >= rate:
+            continue
+        for region_id in rng.sample(region_ids, k=min(len(region_ids), rng.randint(1, 3))):
+            rows.append({
+                "id": next_status_id,
+                "grant_id": grant_id,
+                "region_id": region_id,
+                "status": rng.choices(STATUSES, weights=STATUS_WEIGHTS)[0],
+                "notes": rng.choice([None, "Lead assigned.", "Waiting on budget.", "Draft shared with team."]),
+                "budget_allocated": rng.choice([None, 1000.0, 5000.0]),
+                "last_updated": datetime.combine(
+                    today - timedelta(days=rng.randint(0, 365)), datetime.min.time()
+                ),
+            })
+            next_status_id += 1
+    return rows
+
+
+def _csv_row(grant):
+    row = {k: grant.get(k) for k in GRANT_CSV_FIELDS}
+    row["province_state"] = grant["province"]
+    row["deadline_date"] = grant["deadline_date"].isoformat() if grant["deadline_date"] else ""
+    row["ongoing_flag"] = 1 if grant["ongoing_flag"] else 0
+    row["is_ngo_only"] = 1 if grant["is_ngo_only"] else 0
+    row["created_at"] = grant["created_at"].isoformat(sep=" ")
+    row["updated_at"] = grant["updated_at"].isoformat(sep=" ")
+    return row
+
+
+def generate_catalogue(
+    n_grants,
+    n_organizations=None,
+    n_regions=0,
+    status_rate=0.4,
+    seed=42,
+    csv_path=None,
+    write_db=True,
+    finalize=True,
+):
+    """
+    Generate ``n_grants`` grants (plus organizations, regions and statuses).
+    The rows go into the change log and status history like any other
+    write; with ``finalize`` the post-ingest steps (dedup, recommendations,
+    saved searches) run on the new grants afterwards. Returns a dict of
+    row counts.
+    """
+    rng = random.Random(seed)
+    today = date.today()
+    n_organizations = n_organizations or max(1, n_grants // 50)
+    counts = {"organizations": 0, "regions": 0, "grants": 0, "statuses": 0}
+    started = time.perf_counter()
+
+    csv_file = open(csv_path, "w", newline="", encoding="utf-8") if csv_path else None
+    writer = None
+    if csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=GRANT_CSV_FIELDS)
+        writer.writeheader()
+
+    try:
+        with db.engine.begin() as conn:
+            if write_db:
+                fast_sqlite_pragmas(conn)
+                org_start = next_id(conn, Organization.__table__)
+                region_start = next_id(conn, Region.__table__)
+                grant_id = next_id(conn, Grant.__table__)
+                status_id = next_id(conn, GrantStatus.__table__)
+                first_grant_id, first_status_id = grant_id, status_id
+            else:
+                org_start = region_start = grant_id = status_id = 1
+
+            orgs = _organizations(rng, n_organizations, org_start)
+            org_ids = [o["id"] for o in orgs]
+            regions = _regions(rng, n_regions, region_start)
+
+            if write_db:
+                counts["organizations"] = bulk_insert(conn, Organization.__table__, orgs)
+                counts["regions"] = bulk_insert(conn, Region.__table__, regions)
+                bump_versions(conn, ["organizations", "regions"])
+                region_ids = list(conn.execute(select(Region.id)).scalars())
+            else:
+                region_ids = [r["id"] for r in regions]
+
+            remaining = n_grants
+            while remaining > 0:
+                size = min(CHUNK_SIZE, remaining)
+                grants = [_grant(rng, grant_id + i, org_ids, seed, today) for i in range(size)]
+                grant_id += size
+                remaining -= size
+
+                if writer:
+                    writer.writerows(_csv_row(g) for g in grants)
+                if write_db:
+                    counts["grants"] += bulk_insert(conn, Grant.__table__, grants)
+                    if region_ids:
+                        statuses = _statuses(
+                            rng, [g["id"] for g in grants], region_ids, status_rate, status_id, today
+                        )
+                        status_id += len(statuses)
+                        counts["statuses"] += bulk_insert(conn, GrantStatus.__table__, statuses)
+                else:
+                    counts["grants"] += size
+
+                elapsed = time.perf_counter() - started
+                print(f"  {counts['grants']:>10} grants ({counts['grants'] / elapsed:,.0f} rows/s)")
+
+            if write_db:
+                for table in (Organization, Region, Grant, GrantStatus):
+                    fix_sequence(conn, table.__table__)
+                # Last, so the events' ids follow the commit (see changes.py)
+                log_bulk_statuses(conn, first_status_id)
+                log_bulk_inserts(conn, first_grant_id, first_status_id)
+    finally:
+        if csv_file:
+            csv_file.close()
+
+    if write_db and finalize and counts["grants"]:
+        counts["finalize"] = finalize_ingest(range(first_grant_id, grant_id), verbose=True)
+
+    counts["seconds"] = round(time.perf_counter() - started, 2)
+    return counts